@@ -0,0 +1,324 @@
+"""
+Semantic answer cache in front of the agent graph.
+
+Most users ask the same handful of EDA questions. Before running the LLM +
+tool loop, the question is embedded and compared with previously answered
+questions; if one is at least ANSWER_CACHE_THRESHOLD similar (cosine), its
+stored answer and grounding sources are returned right away.
+
+Entries are scoped by (KB index version, embedding model, LLM model), so a
+rebuilt index or a different model never serves old answers. Only answers
+that depend on nothing but the question and the knowledge base are cached:
+runs that called a data tool (profile_csv, detect_outliers, ...) are never
+stored, and questions that mention a data file skip the cache entirely, since
+their answer depends on which file it is and what it contains. They live in a
+local SQLite file, which processes with different models may share: answers
+of an older index version are dropped on write, and beyond
+ANSWER_CACHE_MAX_ENTRIES the least recently used ones are evicted. The vectors of the current scope are kept in memory, so a
+hit costs one query encode (skipped for exact repeats) and a dot product.
+
+    python -m agent.answer_cache ask "How do I handle missing values?"
+    python -m agent.answer_cache stats
+    python -m agent.answer_cache clear
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import argparse
+import threading
+
+import numpy as np
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from rag import resources
+from rag.config import EMBED_MODEL_ID
+from rag.query_cache import LRUCache, normalize_query
+from agent.config import (
+    ANSWER_CACHE_PATH,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_MAX_ENTRIES,
+    LLM_MODEL,
+)
+from agent.tools import grounding_sources
+from agent import tracing
+
+# tools whose output depends only on their query and the KB index (covered by the scope)
+KB_TOOLS = frozenset({"search_eda_kb", "search_eda_kb_batch"})
+_DATA_FILE_RE = re.compile(r"\S+\.(?:csv|tsv|txt|json|jsonl|parquet|xlsx?)\b", re.IGNORECASE)
+
+
+def mentions_data_file(question: str) -> bool:
+    """True if `question` names a data file ("profile data/a.csv"); such answers are never cached."""
+    return bool(_DATA_FILE_RE.search(question or ""))
+
+
+def _scope_version(scope: str) -> str:
+    try:
+        return json.loads(scope)[0]
+    except (ValueError, TypeError, IndexError):
+        return "0"
+
+
+def _version_rank(version: str) -> int:
+    """Index versions are hex time_ns stamps (rag.resources.bump_index_version); "0" = none yet."""
+    try:
+        return int(version, 16)
+    except (ValueError, TypeError):
+        return -1
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        path: str = ANSWER_CACHE_PATH,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        llm_model: str = LLM_MODEL,
+        embed_model: str = EMBED_MODEL_ID,
+        encode_fn=None,
+    ):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.llm_model = llm_model
+        self.embed_model = embed_model
+        self.encode_fn = encode_fn or resources.encode
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " scope TEXT NOT NULL,"
+            " norm TEXT NOT NULL,"
+            " question TEXT NOT NULL,"
+            " vec BLOB NOT NULL,"
+            " answer TEXT NOT NULL,"
+            " sources TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_scope ON answers (scope, norm)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_lru ON answers (last_used)")
+        self._conn.commit()
+
+        self._embeddings = LRUCache(256)  # normalized question -> unit vector
+        self._scope = None
+        self._ids = []
+        self._mat = np.zeros((0, 0), dtype=np.float32)
+        self._by_norm = {}
+
+        self.lookups = 0
+        self.hits = 0
+        self.semantic_hits = 0
+
+    # ---- scope / in-memory index ----
+    def scope(self) -> str:
+        return json.dumps([resources.index_version(), self.embed_model, self.llm_model])
+
+    def _ensure_loaded(self, scope: str):
+        if scope == self._scope:
+            return
+        rows = self._conn.execute("SELECT id, norm, vec FROM answers WHERE scope = ? ORDER BY id", (scope,)).fetchall()
+        self._ids = [r[0] for r in rows]
+        self._by_norm = {r[1]: i for i, r in enumerate(rows)}
+        vecs = [np.frombuffer(r[2], dtype=np.float32) for r in rows]
+        self._mat = np.vstack(vecs) if vecs else np.zeros((0, 0), dtype=np.float32)
+        self._scope = scope
+
+    def embed(self, question: str) -> np.ndarray:
+        norm = normalize_query(question)
+        vec = self._embeddings.get(norm)
+        if vec is None:
+            vec = np.asarray(self.encode_fn([question]), dtype=np.float32)[0]
+            vec = vec / max(float(np.linalg.norm(vec)), 1e-12)
+            self._embeddings.put(norm, vec)
+        return vec
+
+    # ---- API ----
+    def lookup(self, question: str):
+        """Return {"answer", "sources", "score", "matched_question", "lookup_ms"} or None."""
+        start = time.perf_counter()
+        if mentions_data_file(question):
+            tracing.record_span("cache", "answer_cache.bypass", start, time.perf_counter() - start)
+            return None
+        norm = normalize_query(question)
+        scope = self.scope()
+        with self._lock:
+            self.lookups += 1
+            self._ensure_loaded(scope)
+            row = self._by_norm.get(norm)
+            score = 1.0
+            if row is None and self._ids:
+                sims = self._mat @ self.embed(question)
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    row, score = best, float(sims[best])
+                    self.semantic_hits += 1
+            if row is None:
+                tracing.record_span("cache", "answer_cache.miss", start, time.perf_counter() - start)
+                return None
+
+            entry_id = self._ids[row]
+            question_hit, answer, sources = self._conn.execute(
+                "SELECT question, answer, sources FROM answers WHERE id = ?", (entry_id,)
+            ).fetchone()
+            self._conn.execute("UPDATE answers SET hits = hits + 1, last_used = ? WHERE id = ?", (time.time(), entry_id))
+            self._conn.commit()
+            self.hits += 1
+
+        seconds = time.perf_counter() - start
+        tracing.record_span("cache", "answer_cache.hit", start, seconds)
+        return {
+            "answer": answer,
+            "sources": json.loads(sources),
+            "score": round(score, 4),
+            "matched_question": question_hit,
+            "lookup_ms": round(seconds * 1000, 3),
+        }
+
+    def put(self, question: str, answer: str, sources=()):
+        if mentions_data_file(question):
+            return
+        norm = normalize_query(question)
+        vec = self.embed(question)
+        scope = self.scope()
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM answers WHERE scope = ? AND norm = ?", (scope, norm))
+            self._conn.execute(
+                "INSERT INTO answers (scope, norm, question, vec, answer, sources, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (scope, norm, question, vec.astype(np.float32).tobytes(), answer, json.dumps(list(sources)), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+            self._scope = None  # reload the in-memory index on next lookup
+
+    def _evict(self):
+        # answers built on an older index can never be served again; scopes of other models
+        # (another process sharing this file) stay and only compete in the LRU bound below
+        version = _version_rank(_scope_version(self.scope()))
+        stale = [scope for (scope,) in self._conn.execute("SELECT DISTINCT scope FROM answers")
+                 if _version_rank(_scope_version(scope)) < version]
+        self._conn.executemany("DELETE FROM answers WHERE scope = ?", [(scope,) for scope in stale])
+        (n,) = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+        if n > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_used LIMIT ?)",
+                (n - self.max_entries,),
+            )
+
+    def stats(self) -> dict:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+            (stored_hits,) = self._conn.execute("SELECT COALESCE(SUM(hits), 0) FROM answers").fetchone()
+        return {
+            "entries": entries,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "stored_hits_total": stored_hits,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+            self._scope = None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# -----------------------------
+# Cached graph runs
+# -----------------------------
+def _result_from_messages(messages) -> dict:
+    from agent.graph import get_last_assistant_text
+
+    sources, tools = set(), set()
+    for m in messages:
+        if isinstance(m, ToolMessage) and isinstance(m.content, str):
+            sources.update(grounding_sources(m.content))
+        if isinstance(m, AIMessage):
+            tools.update(tc["name"] for tc in m.tool_calls or [])
+    answer = get_last_assistant_text(messages)
+    return {"answer": answer, "sources": sorted(sources), "tools": sorted(tools), "messages": messages}
+
+
+def is_cacheable(result: dict) -> bool:
+    """A final answer from a run that used no tools besides the KB search ones."""
+    if not result["answer"] or result["answer"] == "(No final answer text produced.)":
+        return False
+    return set(result.get("tools") or ()) <= KB_TOOLS
+
+
+def ask(app, question: str, cache: AnswerCache = None) -> dict:
+    """Answer one question, from the cache when possible. Result has "cached": bool."""
+    if cache is not None:
+        hit = cache.lookup(question)
+        if hit is not None:
+            return {**hit, "cached": True}
+
+    out = app.invoke({"messages": [HumanMessage(content=question)]})
+    result = {**_result_from_messages(out["messages"]), "cached": False}
+    if cache is not None and is_cacheable(result):
+        cache.put(question, result["answer"], result["sources"])
+    return result
+
+
+async def aask(app, question: str, cache: AnswerCache = None) -> dict:
+    """Async ask() for the serving mode; cache I/O and the encode run in a worker thread."""
+    import asyncio
+
+    if cache is not None:
+        hit = await asyncio.to_thread(cache.lookup, question)
+        if hit is not None:
+            return {**hit, "cached": True}
+
+    out = await app.ainvoke({"messages": [HumanMessage(content=question)]})
+    result = {**_result_from_messages(out["messages"]), "cached": False}
+    if cache is not None and is_cacheable(result):
+        await asyncio.to_thread(cache.put, question, result["answer"], result["sources"])
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Semantic answer cache for the agent")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_ask = sub.add_parser("ask", help="answer a question (cached if possible)")
+    p_ask.add_argument("question")
+    sub.add_parser("stats", help="print cache statistics")
+    sub.add_parser("clear", help="drop all cached answers")
+    args = parser.parse_args()
+
+    cache = AnswerCache()
+    if args.command == "ask":
+        from agent.graph import build_graph
+
+        start = time.perf_counter()
+        hit = cache.lookup(args.question)
+        if hit is not None:
+            result = {**hit, "cached": True}
+        else:
+            with tracing.run("answer_cache"):
+                result = ask(build_graph(), args.question, cache=None)
+            if is_cacheable(result):
+                cache.put(args.question, result["answer"], result["sources"])
+        print(result["answer"])
+        print(f"\n(sources: {', '.join(result['sources']) or '-'}; "
+              f"{'cache hit' if result['cached'] else 'computed'} in {(time.perf_counter() - start) * 1000:.1f} ms)")
+    elif args.command == "stats":
+        print(json.dumps(cache.stats(), indent=2))
+    else:
+        cache.clear()
+        print("✅ Answer cache cleared")
+    cache.close()
@@ -0,0 +1,152 @@
+"""
+End-to-end agent throughput benchmark on a scripted LLM.
+
+Drives build_graph() with agent.fake_llm.ScriptedChatModel (fixed simulated
+latency, no Ollama) under several concurrency levels and reports, from the
+per-run traces:
+
+  - runs/sec and per-run latency (p50 / p95)
+  - agent <-> tools loop iterations and LLM calls per run
+  - mean / p95 time per node, tool and retrieval step
+  - "own" overhead: run time minus simulated LLM time, i.e. graph + tools + retrieval
+
+    python -m agent.bench_graph --runs 64 --concurrency 1,4,16 --latency 0.05
+    python -m agent.bench_graph --script outputs/llm_script.json --sync
+
+Retrieval runs against the real index, so build it first (python -m rag.build_index).
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+from collections import defaultdict
+
+import numpy as np
+from langchain_core.messages import HumanMessage
+
+from rag.config import OUTPUT_DIR
+from agent.config import TRACING_ENABLED
+from agent.graph import build_graph
+from agent.fake_llm import ScriptedChatModel
+from agent.serve import EXAMPLE_QUESTIONS
+from agent import tracing
+
+
+def _ms(values, p=None) -> float:
+    if not values:
+        return 0.0
+    return round(float(np.percentile(values, p) if p is not None else np.mean(values)), 3)
+
+
+def _run_once(app, question: str, name: str) -> dict:
+    with tracing.run(name, path=None) as trace:
+        app.invoke({"messages": [HumanMessage(content=question)]})
+    return trace.to_record()
+
+
+async def _arun_once(app, question: str, name: str, sem: asyncio.Semaphore) -> dict:
+    async with sem:
+        with tracing.run(name, path=None) as trace:
+            await app.ainvoke({"messages": [HumanMessage(content=question)]})
+        return trace.to_record()
+
+
+def run_level(app, questions, concurrency: int, sync: bool = False) -> dict:
+    """Run all questions at one concurrency level; returns {"records", "seconds"}."""
+    start = time.perf_counter()
+    if sync:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            records = list(pool.map(lambda iq: _run_once(app, iq[1], f"bench_{iq[0]}"), enumerate(questions)))
+    else:
+        async def _all():
+            sem = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(_arun_once(app, q, f"bench_{i}", sem) for i, q in enumerate(questions)))
+        records = asyncio.run(_all())
+    return {"records": records, "seconds": time.perf_counter() - start}
+
+
+def summarize(records, seconds: float) -> dict:
+    spans = defaultdict(list)
+    llm_ms, own_ms, agent_calls = [], [], []
+    for r in records:
+        llm = 0.0
+        for s in r["spans"]:
+            spans[f"{s['kind']}:{s['name']}"].append(s["ms"])
+            if s["kind"] == "llm":
+                llm += s["ms"]
+        llm_ms.append(llm)
+        own_ms.append(r["total_ms"] - llm)
+        agent_calls.append(sum(1 for s in r["spans"] if s["kind"] == "node" and s["name"] == "agent"))
+
+    totals = [r["total_ms"] for r in records]
+    return {
+        "runs": len(records),
+        "seconds": round(seconds, 3),
+        "runs_per_s": round(len(records) / seconds, 2) if seconds > 0 else 0.0,
+        "run_ms": {"p50": _ms(totals, 50), "p95": _ms(totals, 95)},
+        "llm_ms_per_run": _ms(llm_ms),
+        "own_ms_per_run": {"mean": _ms(own_ms), "p95": _ms(own_ms, 95)},
+        "loop_iterations": _ms([r["loop_iterations"] for r in records]),
+        "llm_calls": _ms(agent_calls),
+        "spans": {
+            name: {"count": len(v), "mean_ms": _ms(v), "p95_ms": _ms(v, 95)}
+            for name, v in sorted(spans.items())
+        },
+    }
+
+
+def main(runs: int = 32, levels=(1, 4, 16), latency_s: float = 0.05, token_latency_s: float = 0.0,
+         script: str = None, sync: bool = False):
+    if not TRACING_ENABLED:
+        raise SystemExit("Tracing is disabled (DATA_INSIGHT_TRACING=0); the benchmark reads its spans.")
+
+    kwargs = {"latency_s": latency_s, "token_latency_s": token_latency_s}
+    llm = ScriptedChatModel.from_file(script, **kwargs) if script else ScriptedChatModel(**kwargs)
+    app = build_graph(llm=llm)
+    questions = (EXAMPLE_QUESTIONS * (runs // len(EXAMPLE_QUESTIONS) + 1))[:runs]
+
+    from rag import resources
+    resources.warm_up()
+    run_level(app, questions[:2], 1, sync=sync)  # warm-up: imports, first encode, caches
+
+    report = {"runs": runs, "latency_s": latency_s, "token_latency_s": token_latency_s,
+              "mode": "sync" if sync else "async", "levels": {}}
+    for c in levels:
+        level = run_level(app, questions, c, sync=sync)
+        report["levels"][str(c)] = summarize(level["records"], level["seconds"])
+
+    out_path = os.path.join(OUTPUT_DIR, "graph_bench.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'conc':>4} {'runs/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'own ms':>8} {'loops':>6} {'llm calls':>9}")
+    for c, r in report["levels"].items():
+        print(f"{c:>4} {r['runs_per_s']:>8} {r['run_ms']['p50']:>9} {r['run_ms']['p95']:>9} "
+              f"{r['own_ms_per_run']['mean']:>8} {r['loop_iterations']:>6} {r['llm_calls']:>9}")
+    first = report["levels"][str(levels[0])]
+    print(f"\nspans at concurrency {levels[0]} (mean / p95 ms):")
+    for name, s in first["spans"].items():
+        print(f"  {name:<36} {s['mean_ms']:>9} {s['p95_ms']:>9}  x{s['count']}")
+    print(f"✅ Wrote benchmark to: {out_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the agent graph on a scripted LLM")
+    parser.add_argument("--runs", type=int, default=32, help="conversations per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per LLM call")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="simulated seconds per output token")
+    parser.add_argument("--script", default=None, help="JSON script (see agent/fake_llm.py)")
+    parser.add_argument("--sync", action="store_true", help="app.invoke in threads instead of app.ainvoke")
+    args = parser.parse_args()
+    main(
+        runs=args.runs,
+        levels=[int(c) for c in args.concurrency.split(",")],
+        latency_s=args.latency,
+        token_latency_s=args.token_latency,
+        script=args.script,
+        sync=args.sync,
+    )
@@ -0,0 +1,68 @@
+"""
+Import-time budget check for the agent.
+
+Imports the given modules in a fresh interpreter and fails if that takes
+longer than IMPORT_BUDGET_S or if any heavy dependency (torch, the embedding
+model, chromadb, the Ollama client) was loaded as a side effect. Those must
+only load on first use.
+
+    python -m agent.check_import_time
+    python -m agent.check_import_time --budget 1.0 agent.graph rag.retrieve
+
+tests/test_import_time.py runs the same probe under pytest, so the budget is
+enforced with the rest of the test suite.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if __package__ in (None, ""):  # run as `python agent/check_import_time.py`
+    sys.path.insert(0, ROOT)
+
+from agent.config import IMPORT_BUDGET_S
+
+DEFAULT_MODULES = ["agent.graph", "agent.tools", "rag.retrieve", "rag.build_index", "rag.ingest_data"]
+HEAVY_MODULES = ["torch", "sentence_transformers", "onnxruntime", "chromadb", "langchain_ollama", "bs4"]
+
+_PROBE = """
+import sys, json, time, importlib
+t0 = time.perf_counter()
+for name in {modules!r}:
+    importlib.import_module(name)
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(modules, heavy=HEAVY_MODULES) -> dict:
+    code = _PROBE.format(modules=list(modules), heavy=list(heavy))
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=ROOT)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(modules, budget: float) -> int:
+    result = measure(modules)
+    ok = True
+
+    print(f"import {', '.join(modules)}: {result['seconds']:.3f}s (budget {budget:.2f}s)")
+    if result["seconds"] > budget:
+        print(f"❌ over budget by {result['seconds'] - budget:.3f}s")
+        ok = False
+    if result["loaded"]:
+        print(f"❌ heavy modules loaded at import time: {', '.join(result['loaded'])}")
+        ok = False
+
+    if ok:
+        print("✅ import time within budget, no heavy modules loaded")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check import time of the agent / RAG entry points")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_S, help="seconds")
+    args = parser.parse_args()
+    sys.exit(main(args.modules, args.budget))
@@ -0,0 +1,54 @@
+import os
+
+from rag.config import OUTPUT_DIR, CACHE_DIR
+
+# Per-run agent traces (one JSON object per graph run)
+TRACING_ENABLED = os.environ.get("DATA_INSIGHT_TRACING", "1") != "0"
+TRACE_PATH = os.environ.get("DATA_INSIGHT_TRACE_PATH", os.path.join(OUTPUT_DIR, "agent_traces.jsonl"))
+
+# Chat model (built on demand by agent.graph.make_llm, not at import time)
+LLM_MODEL = os.environ.get("DATA_INSIGHT_LLM_MODEL", "qwen2.5-coder:7b")
+LLM_BASE_URL = os.environ.get("DATA_INSIGHT_LLM_BASE_URL", "http://127.0.0.1:11434")
+LLM_TEMPERATURE = float(os.environ.get("DATA_INSIGHT_LLM_TEMPERATURE", "0.2"))
+
+# `import agent.graph` must stay under this many seconds (see agent/check_import_time.py,
+# enforced by tests/test_import_time.py; 0 skips the timing check)
+IMPORT_BUDGET_S = float(os.environ.get("DATA_INSIGHT_IMPORT_BUDGET_S", "2.0"))
+
+# Async serving (agent/serve.py): conversations running at once; the rest wait in line
+SERVE_MAX_CONCURRENCY = int(os.environ.get("DATA_INSIGHT_SERVE_CONCURRENCY", "8"))
+
+# Context budget (agent/context.py): older tool outputs are compacted once the
+# message history (excluding the system prompt) exceeds CONTEXT_BUDGET_TOKENS.
+CONTEXT_BUDGET_TOKENS = int(os.environ.get("DATA_INSIGHT_CONTEXT_BUDGET", "3000"))
+CONTEXT_KEEP_RECENT = 4          # trailing messages that are never compacted
+CONTEXT_SNIPPET_CHARS = 200      # grounding snippets in old tool outputs are cut to this
+CONTEXT_OLD_TOOL_CHARS = 600     # other old tool outputs are cut to this
+
+# Default grounding payload per search_eda_kb query, in characters. Overlapping chunks
+# are merged and near-duplicates skipped to fill it (see rag/select.py).
+GROUNDING_BUDGET_CHARS = 2400
+
+# Semantic answer cache in front of the graph (agent/answer_cache.py)
+ANSWER_CACHE_ENABLED = os.environ.get("DATA_INSIGHT_ANSWER_CACHE", "1") != "0"
+ANSWER_CACHE_PATH = os.environ.get("DATA_INSIGHT_ANSWER_CACHE_PATH", os.path.join(CACHE_DIR, "answers.sqlite3"))
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("DATA_INSIGHT_ANSWER_CACHE_THRESHOLD", "0.92"))  # cosine similarity
+ANSWER_CACHE_MAX_ENTRIES = 2000  # least recently used answers are evicted beyond this
+
+# CSV profiling (agent/profiling.py): one streaming pass, memory bounded by one chunk
+PROFILE_CHUNK_ROWS = int(os.environ.get("DATA_INSIGHT_PROFILE_CHUNK_ROWS", "50000"))
+PROFILE_SKETCH_K = 2048          # quantile sketch items per level (rank error ~1/k, ~0.05%)
+PROFILE_HLL_P = 12               # HyperLogLog registers = 2**p (~1.6% distinct-count error)
+PROFILE_MAX_CORR_COLUMNS = 50    # numeric columns included in the correlation matrix
+MISSING_TOKENS = ("", "na", "nan", "null", "none", "n/a")  # compared after strip + lower
+PROFILE_WORKERS = int(os.environ.get("DATA_INSIGHT_PROFILE_WORKERS", "0"))  # processes; 0 = one per CPU, 1 = serial
+PROFILE_PARALLEL_MIN_BYTES = 64 * 1024 * 1024  # smaller files are profiled serially
+
+# Columnar dataset cache (agent/dataset_cache.py): CSVs converted once to memory-mapped columns
+DATASET_CACHE_ENABLED = os.environ.get("DATA_INSIGHT_DATASET_CACHE", "1") != "0"
+DATASET_CACHE_DIR = os.environ.get("DATA_INSIGHT_DATASET_CACHE_DIR", os.path.join(CACHE_DIR, "datasets"))
+DATASET_CACHE_MAX_BYTES = int(os.environ.get("DATA_INSIGHT_DATASET_CACHE_MAX_BYTES", str(4 * 1024 ** 3)))  # LRU beyond this
+
+# Tools step (agent/tool_exec.py): concurrent tool calls + per-conversation memo of results
+TOOL_MAX_WORKERS = int(os.environ.get("DATA_INSIGHT_TOOL_WORKERS", "4"))  # tool calls run concurrently per turn
+TOOL_MEMO_ENABLED = os.environ.get("DATA_INSIGHT_TOOL_MEMO", "1") != "0"  # also collapses duplicate calls in a turn
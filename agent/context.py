@@ -0,0 +1,159 @@
+"""
+Context-budget manager for GraphState.messages.
+
+add_messages only ever appends, so every agent <-> tools iteration resends
+all earlier grounding results and plans to the LLM. The "compact" node runs
+after each tool step and rewrites older ToolMessages in place (same message
+id, so add_messages replaces them):
+
+  1. dedupe:   a grounding chunk (matched by its id=...) that appears again in a
+               newer tool result is reduced to a one-line reference (always, lossless)
+  2. truncate: if the history is over CONTEXT_BUDGET_TOKENS, old tool outputs
+               are cut (grounding snippets to CONTEXT_SNIPPET_CHARS, anything
+               else to CONTEXT_OLD_TOOL_CHARS), oldest first
+  3. elide:    if still over budget, old tool outputs are replaced by a stub
+
+Steps 2-3 never touch the last CONTEXT_KEEP_RECENT messages. Human messages
+and tool-call messages are never changed and no message is removed, so every
+tool call still has its ToolMessage. Token counts
+are estimates (CHARS_PER_TOKEN), which is enough to enforce a budget.
+"""
+import re
+import json
+import time
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from agent.config import (
+    CONTEXT_BUDGET_TOKENS,
+    CONTEXT_KEEP_RECENT,
+    CONTEXT_SNIPPET_CHARS,
+    CONTEXT_OLD_TOOL_CHARS,
+)
+from rag.config import CHARS_PER_TOKEN
+from agent import tracing
+
+# "3) (eda_guideline, topic=outliers, source=x, id=x.md_4) snippet ..."
+_HIT_RE = re.compile(r"^(\d+\) \([^)]*\bid=([^)\s]+)\))(.*)$")
+_REPEATED = " [repeated chunk, see later result]"
+
+
+# -----------------------------
+# Token estimates
+# -----------------------------
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _content(msg) -> str:
+    c = msg.content
+    return c if isinstance(c, str) else json.dumps(c, default=str)
+
+
+def message_tokens(msg) -> int:
+    n = estimate_tokens(_content(msg)) + 4  # per-message role/formatting overhead
+    if isinstance(msg, AIMessage) and msg.tool_calls:
+        n += estimate_tokens(json.dumps([tc.get("args", {}) for tc in msg.tool_calls], default=str))
+    return n
+
+
+def count_tokens(messages) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+
+# -----------------------------
+# Compaction steps
+# -----------------------------
+def _dedupe(text: str, seen: set):
+    """Reduce grounding hits whose chunk id is in `seen`; add the rest to `seen`."""
+    out, n = [], 0
+    for line in text.split("\n"):
+        m = _HIT_RE.match(line)
+        if m:
+            head, chunk_id, rest = m.groups()
+            ids = chunk_id.split("+")  # merged passages list all their chunk ids
+            if all(i in seen for i in ids):
+                if rest != _REPEATED:
+                    line = head + _REPEATED
+                    n += 1
+            else:
+                seen.update(ids)
+        out.append(line)
+    return "\n".join(out), n
+
+
+def _truncate(text: str, snippet_chars: int, max_chars: int) -> str:
+    lines = text.split("\n")
+    if any(_HIT_RE.match(line) for line in lines):
+        out = []
+        for line in lines:
+            m = _HIT_RE.match(line)
+            if m and len(m.group(3)) > snippet_chars + 4:  # +4: already cut (" ...")
+                line = m.group(1) + m.group(3)[:snippet_chars].rstrip() + " ..."
+            out.append(line)
+        return "\n".join(out)
+    if len(text) > max_chars:
+        return text[:max_chars].rstrip() + f" ...[{len(text) - max_chars} chars truncated]"
+    return text
+
+
+def compact_messages(
+    messages,
+    budget: int = CONTEXT_BUDGET_TOKENS,
+    keep_recent: int = CONTEXT_KEEP_RECENT,
+    snippet_chars: int = CONTEXT_SNIPPET_CHARS,
+    old_tool_chars: int = CONTEXT_OLD_TOOL_CHARS,
+):
+    """
+    Returns (replacements, stats). `replacements` are copies of changed ToolMessages
+    (same ids), ready to be returned from a node; `stats` has token counts before/after.
+    """
+    contents = [_content(m) for m in messages]
+    tokens = [message_tokens(m) for m in messages]
+    before = sum(tokens)
+    stats = {"tokens_before": before, "deduped_chunks": 0, "truncated": 0, "elided": 0}
+    changed = set()
+
+    def _set(i, text):
+        contents[i] = text
+        tokens[i] = estimate_tokens(text) + 4
+        changed.add(i)
+
+    # 1) dedupe, newest first so the latest copy of a chunk stays intact
+    seen = set()
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], ToolMessage):
+            text, n = _dedupe(contents[i], seen)
+            if n:
+                stats["deduped_chunks"] += n
+                _set(i, text)
+
+    # 2) + 3) budget: compact old tool outputs, oldest first
+    old = [i for i in range(max(0, len(messages) - keep_recent)) if isinstance(messages[i], ToolMessage)]
+    for step in ("truncated", "elided"):
+        for i in old:
+            if sum(tokens) <= budget:
+                break
+            if step == "truncated":
+                text = _truncate(contents[i], snippet_chars, old_tool_chars)
+            else:
+                text = f"[{messages[i].name or 'tool'} output elided to fit the context budget]"
+            if text != contents[i]:
+                stats[step] += 1
+                _set(i, text)
+
+    replacements = [messages[i].model_copy(update={"content": contents[i]}) for i in sorted(changed)]
+    stats["tokens_after"] = sum(tokens)
+    stats["tokens_saved"] = before - stats["tokens_after"]
+    return replacements, stats
+
+
+# -----------------------------
+# Graph node
+# -----------------------------
+def compact_node(state):
+    start = time.perf_counter()
+    replacements, stats = compact_messages(state["messages"])
+    tracing.record_span("context", "compact", start, time.perf_counter() - start, **stats)
+    tracing.record_context_savings(stats["tokens_saved"])
+    return {"messages": replacements}
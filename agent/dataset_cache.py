@@ -0,0 +1,381 @@
+"""
+Columnar on-disk cache of CSV datasets.
+
+In an agent loop the same file is analyzed again and again (profile, then
+outliers, then correlations). Parsing CSV text dominates each of those calls,
+so the first call converts the file once into a typed columnar layout and
+later calls memory-map only the columns they need:
+
+    DATASET_CACHE_DIR/<key>/
+        manifest.json              source path / mtime / size, rows, column kinds
+        c<i>.npy                   "float" columns: float64, NaN = missing
+        c<i>.codes.npy             "string" columns: int32 codes, -1 = missing
+        c<i>.dict.bin / .offs.npy  their dictionary: UTF-8 blob + int64 offsets
+
+The key is derived from (absolute path, mtime, size), so an edited file is
+converted again. A column is stored as "float" while every non-missing value
+parses as a finite number; otherwise it is dictionary-encoded (values are
+stripped, missing tokens become -1). Until a column is known to be numeric its
+stripped text is kept in a side file as well, so a column that turns out to be
+text late (zip codes, ids like "02134" ... "A1B 2C3") keeps its original
+spelling instead of the parsed numbers. Entries are evicted least recently used
+first once the cache exceeds DATASET_CACHE_MAX_BYTES on disk.
+
+    python -m agent.dataset_cache convert data.csv
+    python -m agent.dataset_cache info
+    python -m agent.dataset_cache clear
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+
+import numpy as np
+
+from agent.config import DATASET_CACHE_DIR, DATASET_CACHE_MAX_BYTES, PROFILE_CHUNK_ROWS
+from agent.profiling import iter_csv_chunks, _parse_floats, _MISSING
+from agent import tracing
+
+MANIFEST = "manifest.json"
+_lock = threading.Lock()  # one conversion at a time per process
+
+
+def dataset_key(path: str) -> str:
+    st = os.stat(path)
+    raw = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+# -----------------------------
+# Writing (CSV -> columns)
+# -----------------------------
+class _ColumnWriter:
+    """Appends one column chunk by chunk: raw float64 while numeric, dictionary codes otherwise."""
+
+    def __init__(self, root: str, index: int):
+        self.root = root
+        self.stem = f"c{index}"
+        self.kind = "float"
+        self.rows = 0
+        self.lookup = {}   # string -> code
+        self.values = []   # code -> string
+        self._f = open(self._raw_path(), "wb")
+        # text of the float run: UTF-8 blob + int64 byte lengths, for a switch to strings
+        self._text = open(self._text_path(".txt.raw"), "wb")
+        self._text_lens = open(self._text_path(".len.raw"), "wb")
+
+    def _raw_path(self) -> str:
+        return os.path.join(self.root, self.stem + (".f8.raw" if self.kind == "float" else ".i4.raw"))
+
+    def _text_path(self, suffix: str) -> str:
+        return os.path.join(self.root, self.stem + suffix)
+
+    def _spill_text(self, stripped: np.ndarray):
+        encoded = np.char.encode(stripped, "utf-8")
+        np.char.str_len(encoded).astype(np.int64).tofile(self._text_lens)
+        self._text.write(b"".join(encoded.tolist()))
+
+    def _drop_text(self):
+        self._text.close()
+        self._text_lens.close()
+        for suffix in (".txt.raw", ".len.raw"):
+            os.remove(self._text_path(suffix))
+
+    def _iter_text(self, step: int = 1 << 20):
+        """The spilled strings of the float run, `step` rows at a time."""
+        lens = np.fromfile(self._text_path(".len.raw"), dtype=np.int64)
+        with open(self._text_path(".txt.raw"), "rb") as f:
+            for start in range(0, len(lens), step):
+                block = lens[start:start + step]
+                blob = f.read(int(block.sum()))
+                ends = np.cumsum(block)
+                spans = zip((ends - block).tolist(), ends.tolist())
+                yield start, np.asarray([blob[a:b].decode("utf-8") for a, b in spans], dtype=str)
+
+    def _encode(self, strings: np.ndarray) -> np.ndarray:
+        uniq, inv = np.unique(strings, return_inverse=True)
+        mapping = np.empty(len(uniq), dtype=np.int32)
+        for i, u in enumerate(uniq.tolist()):
+            code = self.lookup.get(u)
+            if code is None:
+                code = self.lookup[u] = len(self.values)
+                self.values.append(u)
+            mapping[i] = code
+        return mapping[inv.reshape(-1)]
+
+    def _to_strings(self):
+        """Switch a float column to dictionary codes of the original text of the rows seen so far."""
+        self._f.close()
+        self._text.close()
+        self._text_lens.close()
+        old = self._raw_path()
+        present = ~np.isnan(np.fromfile(old, dtype=np.float64))
+        os.remove(old)
+        self.kind = "string"
+        self._f = open(self._raw_path(), "wb")
+        for start, strings in self._iter_text():
+            codes = np.full(len(strings), -1, dtype=np.int32)
+            mask = present[start:start + len(strings)]
+            if mask.any():
+                codes[mask] = self._encode(strings[mask])
+            codes.tofile(self._f)
+        self._drop_text()
+
+    def append(self, raw: np.ndarray):
+        stripped = np.char.strip(raw)
+        present = ~np.isin(np.char.lower(stripped), _MISSING)
+        if self.kind == "float":
+            values, ok = _parse_floats(stripped, present)
+            if np.array_equal(ok, present):
+                values.tofile(self._f)
+                self._spill_text(stripped)
+                self.rows += len(raw)
+                return
+            self._to_strings()
+        codes = np.full(len(raw), -1, dtype=np.int32)
+        if present.any():
+            codes[present] = self._encode(stripped[present])
+        codes.tofile(self._f)
+        self.rows += len(raw)
+
+    def finish(self) -> dict:
+        """Turn the raw file into .npy (+ dictionary files); returns the manifest entry."""
+        self._f.close()
+        if self.kind == "float":
+            self._drop_text()
+        raw = self._raw_path()
+        dtype = np.float64 if self.kind == "float" else np.int32
+        npy = os.path.join(self.root, self.stem + (".npy" if self.kind == "float" else ".codes.npy"))
+        out = np.lib.format.open_memmap(npy, mode="w+", dtype=dtype, shape=(self.rows,))
+        step = 1 << 20
+        with open(raw, "rb") as f:
+            for start in range(0, self.rows, step):
+                block = np.fromfile(f, dtype=dtype, count=min(step, self.rows - start))
+                out[start:start + len(block)] = block
+        out.flush()
+        del out
+        os.remove(raw)
+
+        entry = {"kind": self.kind, "file": os.path.basename(npy)}
+        if self.kind == "string":
+            blobs = [v.encode("utf-8") for v in self.values]
+            offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+            np.cumsum([len(b) for b in blobs], out=offsets[1:])
+            with open(os.path.join(self.root, self.stem + ".dict.bin"), "wb") as f:
+                f.write(b"".join(blobs))
+            np.save(os.path.join(self.root, self.stem + ".offs.npy"), offsets)
+            entry.update(dict_file=self.stem + ".dict.bin", offsets_file=self.stem + ".offs.npy",
+                         cardinality=len(self.values))
+        return entry
+
+
+def _unique_names(header):
+    names, seen = [], set()
+    for i, h in enumerate(header):
+        name = base = h.strip() or f"column_{i}"
+        k = 2
+        while name in seen:
+            name, k = f"{base}_{k}", k + 1
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def convert_csv(path: str, out_dir: str, chunk_rows: int = PROFILE_CHUNK_ROWS) -> dict:
+    """Convert `path` into the columnar layout under `out_dir`. Returns the manifest."""
+    start = time.perf_counter()
+    st = os.stat(path)
+    os.makedirs(out_dir, exist_ok=True)
+    header, writers = None, []
+    for hdr, cols in iter_csv_chunks(path, chunk_rows):
+        if header is None:
+            header = _unique_names(hdr)
+            writers = [_ColumnWriter(out_dir, i) for i in range(len(header))]
+        for w, raw in zip(writers, cols):
+            w.append(raw)
+    header = header or []
+
+    columns = [{"name": name, **w.finish()} for name, w in zip(header, writers)]
+    manifest = {
+        "source": os.path.abspath(path),
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "rows": writers[0].rows if writers else 0,
+        "columns": columns,
+        "convert_seconds": round(time.perf_counter() - start, 3),
+    }
+    with open(os.path.join(out_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# -----------------------------
+# Reading (zero-copy columns)
+# -----------------------------
+class Dataset:
+    """Read-only view of one cached dataset. Columns are loaded lazily as memory maps."""
+
+    def __init__(self, root: str, manifest: dict):
+        self.root = root
+        self.manifest = manifest
+        self.source = manifest["source"]
+        self.rows = manifest["rows"]
+        self._columns = {c["name"]: c for c in manifest["columns"]}
+        self._dicts = {}
+
+    @property
+    def columns(self):
+        return [c["name"] for c in self.manifest["columns"]]
+
+    def kind(self, name: str) -> str:
+        return self._columns[name]["kind"]
+
+    def numeric_columns(self):
+        return [c["name"] for c in self.manifest["columns"] if c["kind"] == "float"]
+
+    def column(self, name: str) -> np.ndarray:
+        """float64 memmap (NaN = missing) for "float" columns, int32 codes (-1 = missing) otherwise."""
+        return np.load(os.path.join(self.root, self._columns[name]["file"]), mmap_mode="r")
+
+    def dictionary(self, name: str):
+        """(distinct strings as a str array, their parsed floats with NaN = not numeric)."""
+        if name not in self._dicts:
+            c = self._columns[name]
+            if c["kind"] != "string":
+                raise ValueError(f"column {name!r} is not dictionary-encoded")
+            offsets = np.load(os.path.join(self.root, c["offsets_file"]))
+            with open(os.path.join(self.root, c["dict_file"]), "rb") as f:
+                blob = f.read()
+            uniq = np.asarray([blob[a:b].decode("utf-8") for a, b in zip(offsets[:-1], offsets[1:])], dtype=str)
+            values, _ = _parse_floats(uniq, np.ones(len(uniq), dtype=bool))
+            self._dicts[name] = (uniq, values)
+        return self._dicts[name]
+
+    def strings(self, name: str, start: int = 0, stop: int = None) -> np.ndarray:
+        """Decoded values of a string column ("" = missing)."""
+        uniq, _ = self.dictionary(name)
+        codes = self.column(name)[start:stop]
+        if len(uniq) == 0:
+            return np.full(len(codes), "", dtype=str)
+        return np.where(codes >= 0, uniq[np.maximum(codes, 0)], "")
+
+    def numbers(self, name: str, start: int = 0, stop: int = None) -> np.ndarray:
+        """Values as floats (NaN = missing or not numeric); zero-copy for "float" columns."""
+        if self.kind(name) == "float":
+            return self.column(name)[start:stop]
+        _, values = self.dictionary(name)
+        codes = np.asarray(self.column(name)[start:stop])
+        if len(values) == 0:
+            return np.full(len(codes), np.nan)
+        return np.where(codes >= 0, values[np.maximum(codes, 0)], np.nan)
+
+
+# -----------------------------
+# Cache management
+# -----------------------------
+def _dir_bytes(root: str) -> int:
+    return sum(e.stat().st_size for e in os.scandir(root) if e.is_file())
+
+
+def _entries(cache_dir: str):
+    """[(last_used, bytes, dir, manifest)] of complete entries."""
+    out = []
+    if not os.path.isdir(cache_dir):
+        return out
+    for e in os.scandir(cache_dir):
+        mpath = os.path.join(e.path, MANIFEST)
+        if not e.is_dir() or ".tmp-" in e.name or not os.path.exists(mpath):
+            continue
+        try:
+            with open(mpath, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            continue
+        out.append((os.stat(mpath).st_mtime, _dir_bytes(e.path), e.path, manifest))
+    return out
+
+
+def evict(cache_dir: str = DATASET_CACHE_DIR, max_bytes: int = DATASET_CACHE_MAX_BYTES, keep: str = None) -> list:
+    """Drop least recently used entries until the cache fits in `max_bytes`. Returns removed dirs."""
+    entries = sorted(_entries(cache_dir))
+    total = sum(e[1] for e in entries)
+    removed = []
+    for _, size, root, _ in entries:
+        if total <= max_bytes:
+            break
+        if root == keep:
+            continue
+        shutil.rmtree(root, ignore_errors=True)
+        total -= size
+        removed.append(root)
+    return removed
+
+
+def open_dataset(path: str, cache_dir: str = DATASET_CACHE_DIR, max_bytes: int = DATASET_CACHE_MAX_BYTES) -> Dataset:
+    """Return the cached columns of `path`, converting the CSV on first use."""
+    source = os.path.abspath(os.path.expanduser(path))
+    root = os.path.join(cache_dir, dataset_key(source))
+    mpath = os.path.join(root, MANIFEST)
+    start = time.perf_counter()
+
+    with _lock:
+        if not os.path.exists(mpath):
+            tmp = f"{root}.tmp-{os.getpid()}"
+            shutil.rmtree(tmp, ignore_errors=True)
+            convert_csv(source, tmp)
+            # older versions of the same file can never be read again
+            for _, _, other, manifest in _entries(cache_dir):
+                if manifest.get("source") == source:
+                    shutil.rmtree(other, ignore_errors=True)
+            os.replace(tmp, root)
+            evict(cache_dir, max_bytes, keep=root)
+            tracing.record_span("dataset_cache", "convert", start, time.perf_counter() - start)
+        else:
+            os.utime(mpath)  # LRU timestamp
+            tracing.record_span("dataset_cache", "hit", start, time.perf_counter() - start)
+
+    with open(mpath, "r", encoding="utf-8") as f:
+        return Dataset(root, json.load(f))
+
+
+def cache_info(cache_dir: str = DATASET_CACHE_DIR) -> dict:
+    entries = _entries(cache_dir)
+    return {
+        "dir": cache_dir,
+        "entries": len(entries),
+        "bytes": sum(e[1] for e in entries),
+        "max_bytes": DATASET_CACHE_MAX_BYTES,
+        "datasets": [
+            {"source": m["source"], "rows": m["rows"], "columns": len(m["columns"]), "bytes": size}
+            for _, size, _, m in sorted(entries, reverse=True)
+        ],
+    }
+
+
+def clear(cache_dir: str = DATASET_CACHE_DIR):
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Columnar cache of CSV datasets")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_conv = sub.add_parser("convert", help="convert a CSV (no-op if already cached)")
+    p_conv.add_argument("path")
+    sub.add_parser("info", help="list cached datasets")
+    sub.add_parser("clear", help="remove all cached datasets")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        t0 = time.perf_counter()
+        ds = open_dataset(args.path)
+        kinds = ", ".join(f"{name}:{ds.kind(name)}" for name in ds.columns)
+        print(f"✅ {ds.rows} rows, {len(ds.columns)} columns in {time.perf_counter() - t0:.2f}s -> {ds.root}")
+        print(f"   {kinds}")
+    elif args.command == "info":
+        print(json.dumps(cache_info(), indent=2))
+    else:
+        clear()
+        print("✅ Dataset cache cleared")
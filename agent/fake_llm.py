@@ -0,0 +1,237 @@
+"""
+Deterministic stand-in for the Ollama chat model.
+
+ScriptedChatModel replays scripted (or recorded) turns instead of calling
+Ollama, with a configurable simulated latency, so graph / tool / retrieval
+overhead can be measured without a live server and without LLM timing noise:
+
+    from agent.graph import build_graph
+    from agent.fake_llm import ScriptedChatModel
+
+    app = build_graph(llm=ScriptedChatModel(latency_s=0.05))
+
+A script is a list of turns; turn i answers the i-th agent step of a
+conversation (the number of AI messages already in the history), so
+concurrent conversations never interfere. Turn kinds:
+
+    {"content": "final answer for {question}"}
+    {"tool_calls": [{"name": "search_eda_kb", "args": {"query": "{question}"}}]}   native tool call
+    {"json_tool_call": {"name": "create_eda_plan", "arguments": {...}}}             tool call printed as JSON text
+
+"{question}" is replaced by the conversation's first user message. Scripts are
+picked by the first regex in `scripts` that matches the question, else `turns`.
+Script files (JSON: {"turns": [...], "scripts": [{"match": ..., "turns": [...]}]})
+can be recorded from the real model:
+
+    python -m agent.fake_llm record --questions questions.txt --out outputs/llm_script.json
+"""
+import re
+import json
+import time
+import asyncio
+import argparse
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from rag.config import CHARS_PER_TOKEN
+from agent import tracing
+
+DEFAULT_TURNS = [
+    {"tool_calls": [{"name": "search_eda_kb", "args": {"query": "{question}", "top_k": 3}}]},
+    {"content": "Based on the knowledge base, here is how to approach it: {question} "
+                "Start by inspecting the data, then apply the recommended checks and summarize the findings."},
+]
+DEFAULT_SCRIPTS = [
+    {
+        # EDA plan requests exercise the JSON-text tool call path (tools_json_prep)
+        "match": r"(?i)\bplan\b",
+        "turns": [
+            {"json_tool_call": {"name": "create_eda_plan",
+                                "arguments": {"dataset_columns": ["age", "salary", "city", "join_date"],
+                                              "goal": "{question}"}}},
+            {"tool_calls": [{"name": "search_eda_kb", "args": {"query": "EDA workflow steps", "top_k": 3}}]},
+            {"content": "Here is an EDA plan for your dataset, grounded in the knowledge base."},
+        ],
+    },
+]
+
+
+def _fill(value, question: str):
+    if isinstance(value, str):
+        return value.replace("{question}", question)
+    if isinstance(value, list):
+        return [_fill(v, question) for v in value]
+    if isinstance(value, dict):
+        return {k: _fill(v, question) for k, v in value.items()}
+    return value
+
+
+def _question(messages: List[BaseMessage]) -> str:
+    for m in messages:
+        if isinstance(m, HumanMessage):
+            return m.content if isinstance(m.content, str) else json.dumps(m.content)
+    return ""
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that replays scripted turns (see module docstring)."""
+
+    turns: List[dict] = DEFAULT_TURNS
+    scripts: List[dict] = DEFAULT_SCRIPTS
+    latency_s: float = 0.0          # simulated time to first token, per call
+    token_latency_s: float = 0.0    # simulated time per output token
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "ScriptedChatModel":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(turns=data.get("turns") or DEFAULT_TURNS, scripts=data.get("scripts", []), **kwargs)
+
+    def bind_tools(self, tools, **kwargs):
+        return self  # the script decides which tools are called
+
+    # ---- turn selection ----
+    def _turn(self, messages: List[BaseMessage]) -> AIMessage:
+        question = _question(messages)
+        turns = next((s["turns"] for s in self.scripts if re.search(s["match"], question)), self.turns)
+        step = sum(isinstance(m, AIMessage) for m in messages)
+        turn = _fill(turns[min(step, len(turns) - 1)], question)
+
+        if "tool_calls" in turn:
+            msg = AIMessage(content=turn.get("content", ""), tool_calls=[
+                {"name": tc["name"], "args": tc.get("args", {}), "id": tc.get("id") or f"call_{step}_{i}"}
+                for i, tc in enumerate(turn["tool_calls"])
+            ])
+        elif "json_tool_call" in turn:
+            msg = AIMessage(content=json.dumps(turn["json_tool_call"]))
+        else:
+            msg = AIMessage(content=turn.get("content", ""))
+
+        prompt_chars = sum(len(m.content) if isinstance(m.content, str) else 0 for m in messages)
+        out_tokens = max(1, len(msg.content) // CHARS_PER_TOKEN)
+        msg.usage_metadata = {"input_tokens": prompt_chars // CHARS_PER_TOKEN, "output_tokens": out_tokens,
+                              "total_tokens": prompt_chars // CHARS_PER_TOKEN + out_tokens}
+        self.calls += 1
+        return msg
+
+    def _delay(self, msg: AIMessage) -> float:
+        return self.latency_s + self.token_latency_s * msg.usage_metadata["output_tokens"]
+
+    # ---- BaseChatModel hooks ----
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs) -> ChatResult:
+        msg = self._turn(messages)
+        start = time.perf_counter()
+        time.sleep(self._delay(msg))
+        tracing.record_span("llm", "scripted", start, time.perf_counter() - start)
+        return ChatResult(generations=[ChatGeneration(message=msg)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Any = None, **kwargs) -> ChatResult:
+        msg = self._turn(messages)
+        start = time.perf_counter()
+        await asyncio.sleep(self._delay(msg))
+        tracing.record_span("llm", "scripted", start, time.perf_counter() - start)
+        return ChatResult(generations=[ChatGeneration(message=msg)])
+
+    def _pieces(self, msg: AIMessage):
+        """Token-sized text pieces; the last chunk carries tool calls and usage."""
+        text = msg.content
+        pieces = [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)] or [""]
+        for i, piece in enumerate(pieces):
+            last = i == len(pieces) - 1
+            chunk = AIMessageChunk(
+                content=piece,
+                id=msg.id,
+                tool_call_chunks=[
+                    {"name": tc["name"], "args": json.dumps(tc["args"]), "id": tc["id"], "index": j}
+                    for j, tc in enumerate(msg.tool_calls)
+                ] if last else [],
+                usage_metadata=msg.usage_metadata if last else None,
+            )
+            yield ChatGenerationChunk(message=chunk)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs):
+        msg = self._turn(messages)
+        start = time.perf_counter()
+        time.sleep(self.latency_s)
+        for chunk in self._pieces(msg):
+            time.sleep(self.token_latency_s)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+        tracing.record_span("llm", "scripted", start, time.perf_counter() - start)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs):
+        msg = self._turn(messages)
+        start = time.perf_counter()
+        await asyncio.sleep(self.latency_s)
+        for chunk in self._pieces(msg):
+            await asyncio.sleep(self.token_latency_s)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+        tracing.record_span("llm", "scripted", start, time.perf_counter() - start)
+
+
+# -----------------------------
+# Recording scripts from the real model
+# -----------------------------
+def turns_from_messages(messages: List[BaseMessage]) -> List[dict]:
+    """Script turns that replay the AI messages of one finished conversation."""
+    from agent.graph import _parse_json_tool_call
+
+    turns = []
+    for m in messages:
+        if not isinstance(m, AIMessage):
+            continue
+        json_call = _parse_json_tool_call(m.content or "")
+        if json_call and (not m.tool_calls or m.tool_calls[0].get("id") == "json_tool_call_1"):
+            # printed as JSON text (tools_json_prep rewrites it in place with tool_calls)
+            turns.append({"json_tool_call": json_call})
+        elif m.tool_calls:
+            turns.append({"content": m.content or "",
+                          "tool_calls": [{"name": tc["name"], "args": tc.get("args", {})} for tc in m.tool_calls]})
+        else:
+            turns.append({"content": m.content or ""})
+    return turns
+
+
+def record_script(questions, out_path: str, app=None) -> dict:
+    """Run `questions` through the real graph and save a replayable script."""
+    from agent.graph import build_graph
+
+    app = app or build_graph()
+    scripts = []
+    for q in questions:
+        out = app.invoke({"messages": [HumanMessage(content=q)]})
+        scripts.append({"match": "^" + re.escape(q) + "$", "turns": turns_from_messages(out["messages"])})
+    data = {"turns": DEFAULT_TURNS, "scripts": scripts}
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    return data
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scripted stand-in for the chat model")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_rec = sub.add_parser("record", help="record replayable turns from the real model (needs Ollama)")
+    p_rec.add_argument("--questions", required=True, help="text file, one question per line")
+    p_rec.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions = [line.strip() for line in f if line.strip()]
+    data = record_script(questions, args.out)
+    n_turns = sum(len(s["turns"]) for s in data["scripts"])
+    print(f"✅ Recorded {n_turns} turns for {len(questions)} questions -> {args.out}")
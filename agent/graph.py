@@ -6,7 +6,6 @@ from typing import TypedDict, List, Literal, Optional, Annotated
 
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode
 
 from langchain_core.messages import (
     BaseMessage,
@@ -14,9 +13,12 @@ from langchain_core.messages import (
     SystemMessage,
     AIMessage,
 )
-from langchain_ollama import ChatOllama
 
+from agent.config import LLM_MODEL, LLM_BASE_URL, LLM_TEMPERATURE
 from agent.tools import TOOLS
+from agent.context import compact_node
+from agent.tool_exec import ToolExecutor, merge_memo
+from agent import tracing
 
 
 # -----------------------------
@@ -24,23 +26,32 @@ from agent.tools import TOOLS
 # -----------------------------
 class GraphState(TypedDict):
     messages: Annotated[List[BaseMessage], add_messages]  # chat history / reasoning trace
+    tool_memo: Annotated[dict, merge_memo]  # tool results of this conversation by name + normalized args
 
 
 # -----------------------------
 # 2) LLM (Ollama)
 # -----------------------------
-llm = ChatOllama(
-    model="qwen2.5-coder:7b",
-    base_url="http://127.0.0.1:11434",
-    temperature=0.2,
-).bind_tools(TOOLS)
+def make_llm():
+    """Build the tool-bound chat model from agent.config (imported here so `import agent.graph` stays cheap)."""
+    from langchain_ollama import ChatOllama
+
+    return ChatOllama(
+        model=LLM_MODEL,
+        base_url=LLM_BASE_URL,
+        temperature=LLM_TEMPERATURE,
+    ).bind_tools(TOOLS)
 
 
 SYSTEM_PROMPT = """You are Data Insight, an autonomous data analysis assistant.
 
 Available tools:
 - search_eda_kb: retrieve grounded EDA guidance from the knowledge base
-- create_eda_plan: generate a step-by-step EDA plan from dataset columns + user goal
+- search_eda_kb_batch: same as search_eda_kb for several sub-questions in one call
+- profile_csv: profile a CSV file (types, missing values, statistics, outliers, correlations)
+- detect_outliers: exact IQR outlier counts for numeric columns of a CSV file
+- correlate_columns: correlation matrix of numeric columns of a CSV file
+- create_eda_plan: generate a step-by-step EDA plan from dataset columns (or a csv_path) + user goal
 
 You may either:
 1) call a tool when needed, OR
@@ -75,30 +86,35 @@ def _parse_json_tool_call(text: str) -> Optional[dict]:
 # -----------------------------
 # 3) Agent Node (LLM thinking)
 # -----------------------------
-def agent_node(state: GraphState) -> GraphState:
-    messages = state["messages"]
-
+def _with_system_prompt(messages: List[BaseMessage]) -> List[BaseMessage]:
     # Ensure system prompt is present once
     if not messages or not isinstance(messages[0], SystemMessage):
         messages = [SystemMessage(content=SYSTEM_PROMPT)] + messages
+    return messages
 
-    response = llm.invoke(messages)
-    return {"messages": [response]}
 
+def make_agent_node(llm):
+    """Return (sync, async) agent node functions bound to `llm`."""
+    def agent_node(state: GraphState) -> GraphState:
+        response = llm.invoke(_with_system_prompt(state["messages"]))
+        tracing.record_llm_usage(response)
+        return {"messages": [response]}
 
-# -----------------------------
-# 4) Tool Node (exec tool calls)
-# -----------------------------
-tool_node = ToolNode(TOOLS)
+    async def aagent_node(state: GraphState) -> GraphState:
+        response = await llm.ainvoke(_with_system_prompt(state["messages"]))
+        tracing.record_llm_usage(response)
+        return {"messages": [response]}
+
+    return agent_node, aagent_node
 
 
 # -----------------------------
-# 5) JSON -> ToolCall converter node
+# 4) JSON -> ToolCall converter node
 # -----------------------------
 def json_toolcall_prep_node(state: GraphState) -> GraphState:
     """
     Converts JSON-in-text tool request into a proper AIMessage with tool_calls
-    so ToolNode can execute it.
+    so the tools node can execute it.
     """
     last = state["messages"][-1]
 
@@ -124,7 +140,7 @@ def json_toolcall_prep_node(state: GraphState) -> GraphState:
 
 
 # -----------------------------
-# 6) Router (conditional edge)
+# 5) Router (conditional edge)
 # -----------------------------
 def router(state: GraphState) -> Literal["tools", "tools_json_prep", "__end__"]:
     """
@@ -137,25 +153,35 @@ def router(state: GraphState) -> Literal["tools", "tools_json_prep", "__end__"]:
     # Case A: Native tool calls (best case)
     tool_calls = getattr(last, "tool_calls", None)
     if tool_calls:
+        tracing.count_loop_iteration()
         return "tools"
 
     # Case B: Tool call was printed as JSON text (common in Ollama)
     json_call = _parse_json_tool_call(getattr(last, "content", "") or "")
     if json_call:
+        tracing.count_loop_iteration()
         return "tools_json_prep"
 
     return END
 
 
 # -----------------------------
-# 7) Build Graph
+# 6) Build Graph
 # -----------------------------
-def build_graph():
+def build_graph(llm=None):
+    """Compile the agent graph. `llm` defaults to make_llm(); pass any tool-bound chat model to override."""
+    if llm is None:
+        llm = make_llm()
+
+    agent_node, aagent_node = make_agent_node(llm)
     g = StateGraph(GraphState)
 
-    g.add_node("agent", agent_node)
-    g.add_node("tools_json_prep", json_toolcall_prep_node)
-    g.add_node("tools", tool_node)
+    # each node execution is timed by the tracing layer (see agent/tracing.py)
+    g.add_node("agent", tracing.traced_node("agent", agent_node, aagent_node))
+    g.add_node("tools_json_prep", tracing.traced_node("tools_json_prep", json_toolcall_prep_node))
+    # independent tool calls run concurrently; repeated calls are answered from tool_memo
+    g.add_node("tools", tracing.traced_node("tools", ToolExecutor(TOOLS)))
+    g.add_node("compact", tracing.traced_node("compact", compact_node))
 
     g.set_entry_point("agent")
 
@@ -172,14 +198,15 @@ def build_graph():
     # If JSON toolcall, convert -> tools
     g.add_edge("tools_json_prep", "tools")
 
-    # After tools run, go back to agent (loop)
-    g.add_edge("tools", "agent")
+    # After tools run, shrink older tool outputs to the context budget, then back to agent (loop)
+    g.add_edge("tools", "compact")
+    g.add_edge("compact", "agent")
 
     return g.compile()
 
 
 # -----------------------------
-# 8) Utility: get last human-readable final answer
+# 7) Utility: get last human-readable final answer
 # -----------------------------
 def get_last_assistant_text(messages: List[BaseMessage]) -> str:
     """
@@ -195,14 +222,40 @@ def get_last_assistant_text(messages: List[BaseMessage]) -> str:
 
 
 # -----------------------------
-# 9) Simple runner (for testing)
+# 8) Simple runner (for testing)
 # -----------------------------
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the Data Insight agent")
+    parser.add_argument("--question", default=None, help="ask one question instead of running the examples")
+    parser.add_argument("--show-graph", action="store_true", help="print the graph structure and exit")
+    parser.add_argument("--stream", action="store_true", help="stream tool events and answer tokens (with --question)")
+    args = parser.parse_args()
+
     app = build_graph()
 
+    if args.show_graph:
+        for edge in app.get_graph().edges:
+            print(f"{edge.source} -> {edge.target}" + (" (conditional)" if edge.conditional else ""))
+        raise SystemExit(0)
+
+    if args.question and args.stream:
+        from agent.streaming import stream_events, print_events
+        with tracing.run("cli"):
+            print_events(stream_events(app, args.question))
+        raise SystemExit(0)
+
+    if args.question:
+        with tracing.run("cli"):
+            out = app.invoke({"messages": [HumanMessage(content=args.question)]})
+        print(get_last_assistant_text(out["messages"]))
+        raise SystemExit(0)
+
     # Example 1: grounding question
     state = {"messages": [HumanMessage(content="How should I handle missing values during EDA?")]}
-    out = app.invoke(state)
+    with tracing.run("example_1"):
+        out = app.invoke(state)
 
     print("\n=== FINAL ANSWER (Example 1) ===")
     print(get_last_assistant_text(out["messages"]))
@@ -216,7 +269,8 @@ if __name__ == "__main__":
             )
         ]
     }
-    out2 = app.invoke(state2)
+    with tracing.run("example_2"):
+        out2 = app.invoke(state2)
 
     print("\n=== FINAL ANSWER (Example 2) ===")
     print(get_last_assistant_text(out2["messages"]))
@@ -0,0 +1,188 @@
+"""
+Async serving of the agent graph.
+
+Runs many conversations concurrently in one process on top of app.ainvoke /
+app.astream. At most SERVE_MAX_CONCURRENCY conversations run at once; the
+rest wait for a slot. While a session waits on the LLM, others make
+progress, and their search_eda_kb encodes are merged into shared batches
+by rag.encode_batcher.
+
+    python -m agent.serve --concurrency 8 --questions questions.txt
+    python -m agent.serve --repeat 4          # built-in example questions x4
+
+Use AgentServer(llm=...) to run against any chat model (e.g. a fake one in tests).
+With AgentServer(cache=AnswerCache()) repeated questions are answered from the
+semantic answer cache without taking a concurrency slot, and identical
+questions that arrive while one is still running share its answer.
+"""
+import time
+import asyncio
+import argparse
+
+from langchain_core.messages import HumanMessage
+
+from rag.query_cache import normalize_query
+
+from agent.config import SERVE_MAX_CONCURRENCY, ANSWER_CACHE_ENABLED
+from agent.graph import build_graph
+from agent.answer_cache import AnswerCache, aask, is_cacheable
+from agent import tracing
+
+EXAMPLE_QUESTIONS = [
+    "How should I handle missing values during EDA?",
+    "How do I detect outliers in numeric columns?",
+    "Explain correlation analysis and how to interpret correlation strength.",
+    "My dataset columns are: age, salary, city, join_date. Goal: find patterns and outliers. Make an EDA plan.",
+]
+
+
+class AgentServer:
+    """Bounded-concurrency scheduler around one compiled graph."""
+
+    def __init__(self, app=None, llm=None, max_concurrency: int = SERVE_MAX_CONCURRENCY, cache=None):
+        self.app = app if app is not None else build_graph(llm=llm)
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.cache_hits = 0
+        self._inflight = {}  # normalized question -> future with the shared answer
+
+    async def _acquire(self, run_name: str) -> float:
+        queued = time.perf_counter()
+        await self._sem.acquire()
+        wait = time.perf_counter() - queued
+        tracing.record_span("serve", "queue_wait", queued, wait, run=run_name)
+        self.active += 1
+        return wait
+
+    def _release(self, ok: bool):
+        self.active -= 1
+        if ok:
+            self.completed += 1
+        else:
+            self.failed += 1
+        self._sem.release()
+
+    async def ask(self, question: str, run_name: str = "serve") -> dict:
+        """Run one conversation to completion; returns the answer, sources and timing."""
+        start = time.perf_counter()
+        with tracing.run(run_name):
+            if self.cache is None:
+                return await self._run(question, run_name)
+
+            norm = normalize_query(question)
+            hit = await asyncio.to_thread(self.cache.lookup, question)
+            if hit is None and norm in self._inflight:
+                # the same question is already running for another session: share its answer
+                hit = await asyncio.shield(self._inflight[norm])
+            if hit is not None:
+                self.cache_hits += 1
+                return {"question": question, **hit, "cached": True, "messages": [],
+                        "queue_wait_s": 0.0, "seconds": time.perf_counter() - start}
+
+            shared = self._inflight.setdefault(norm, asyncio.get_running_loop().create_future())
+            result = None
+            try:
+                result = await self._run(question, run_name)
+                if is_cacheable(result):
+                    await asyncio.to_thread(self.cache.put, question, result["answer"], result["sources"])
+                return result
+            finally:
+                if self._inflight.get(norm) is shared:
+                    del self._inflight[norm]
+                if not shared.done():
+                    # waiters get None on failure and run the question themselves
+                    shared.set_result({"answer": result["answer"], "sources": result["sources"]}
+                                      if result is not None and is_cacheable(result) else None)
+
+    async def _run(self, question: str, run_name: str) -> dict:
+        wait = await self._acquire(run_name)
+        start = time.perf_counter()
+        ok = False
+        try:
+            result = await aask(self.app, question)  # no cache here: the lookup in ask() missed
+            ok = True
+        finally:
+            self._release(ok)
+        return {"question": question, **result, "queue_wait_s": wait, "seconds": time.perf_counter() - start}
+
+    async def astream(self, question: str, run_name: str = "serve"):
+        """Yield graph updates ({node: state delta}) as the conversation progresses."""
+        with tracing.run(run_name):
+            await self._acquire(run_name)
+            ok = False
+            try:
+                async for update in self.app.astream(
+                    {"messages": [HumanMessage(content=question)]}, stream_mode="updates"
+                ):
+                    yield update
+                ok = True
+            finally:
+                self._release(ok)
+
+    async def ask_many(self, questions, run_name: str = "serve") -> list:
+        """Submit all questions at once; the semaphore keeps at most max_concurrency running."""
+        return await asyncio.gather(*(self.ask(q, run_name=f"{run_name}_{i}") for i, q in enumerate(questions)))
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cache_hits": self.cache_hits,
+        }
+
+
+async def run_batch(questions, max_concurrency: int = SERVE_MAX_CONCURRENCY, llm=None, cache=None) -> dict:
+    """Serve `questions` concurrently and report answers, throughput and encode batching."""
+    from rag.encode_batcher import get_batcher
+
+    server = AgentServer(llm=llm, max_concurrency=max_concurrency, cache=cache)
+    start = time.perf_counter()
+    results = await server.ask_many(questions)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "results": results,
+        "seconds": elapsed,
+        "throughput_qps": len(questions) / elapsed if elapsed > 0 else 0.0,
+        "server": server.stats(),
+        "encode_batching": get_batcher().stats(),
+    }
+
+
+def _load_questions(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve several agent conversations concurrently")
+    parser.add_argument("--questions", default=None, help="text file, one question per line")
+    parser.add_argument("--repeat", type=int, default=1, help="repeat the question list N times")
+    parser.add_argument("--concurrency", type=int, default=SERVE_MAX_CONCURRENCY)
+    parser.add_argument("--no-answer-cache", action="store_true", help="always run the graph")
+    args = parser.parse_args()
+
+    from rag import resources
+    resources.warm_up()  # load model + store before the clock starts
+
+    questions = (_load_questions(args.questions) if args.questions else EXAMPLE_QUESTIONS) * max(1, args.repeat)
+    cache = AnswerCache() if ANSWER_CACHE_ENABLED and not args.no_answer_cache else None
+    report = asyncio.run(run_batch(questions, max_concurrency=args.concurrency, cache=cache))
+
+    for r in report["results"]:
+        answer = r["answer"].replace("\n", " ")
+        origin = "cache" if r["cached"] else f"waited {r['queue_wait_s']:.2f}s"
+        print(f"\n[{r['seconds']:.2f}s, {origin}] {r['question']}\n  {answer[:300]}")
+
+    b = report["encode_batching"]
+    print(f"\n✅ {len(questions)} conversations in {report['seconds']:.2f}s "
+          f"({report['throughput_qps']:.2f}/s, concurrency={args.concurrency})")
+    print(f"   encode requests={b['requests']} batches={b['batches']} mean batch={b['mean_batch']}")
+    if cache is not None:
+        print(f"   answer cache: {cache.stats()}")
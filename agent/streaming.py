@@ -0,0 +1,264 @@
+"""
+Streaming output for the agent graph.
+
+Turns app.stream(stream_mode=["messages", "updates"]) into a flat sequence of
+events, so a UI (or the CLI below) can show progress through the tool loop
+and print the answer token by token as Ollama produces it:
+
+    {"type": "token", "text": "..."}                          LLM text as it arrives
+    {"type": "tool_start", "name": ..., "args": {...}, "id": ...}
+    {"type": "tool_end", "name": ..., "id": ..., "sources": [...], "preview": "..."}
+    {"type": "node", "name": "agent" | "tools" | "tools_json_prep" | "compact"}
+    {"type": "final", "text": ..., "ttft_ms": ..., "total_ms": ...}
+
+Python API:
+
+    for event in stream_events(app, "How do I detect outliers?"):
+        ...
+    async for event in astream_events(app, "How do I detect outliers?"):
+        ...
+
+CLI:
+
+    python -m agent.streaming "How should I handle missing values?"
+    python -m agent.streaming --jsonl "..."      # one JSON event per line
+
+Some Ollama models print tool calls as JSON text instead of native tool calls
+(see agent.graph._parse_json_tool_call). Those must not reach the user as
+tokens, so text that starts with "{" is held back until the JSON object
+closes and then either dropped (it was a tool call) or released. Prose is
+never buffered.
+"""
+import sys
+import json
+import time
+import argparse
+
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+
+from agent.graph import _parse_json_tool_call, get_last_assistant_text
+from agent.tools import grounding_sources
+from agent import tracing
+
+STREAM_MODES = ["messages", "updates"]
+
+
+# -----------------------------
+# Incremental JSON tool-call detection
+# -----------------------------
+class JsonToolCallSniffer:
+    """
+    Fed the text of one LLM message chunk by chunk. feed() returns the text that
+    can be shown right away; finish() returns (remaining text, parsed tool call or None).
+    """
+
+    def __init__(self, max_hold: int = 4096):
+        self.max_hold = max_hold
+        self.mode = None   # None = undecided, "text" = pass-through, "json" = holding back
+        self.buf = ""
+        self._pos = 0      # next char of buf to scan
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._closed = False
+
+    def _release(self) -> str:
+        self.mode = "text"
+        out, self.buf = self.buf, ""
+        return out
+
+    def feed(self, text: str) -> str:
+        if self.mode == "text":
+            return text
+        self.buf += text
+
+        if self.mode is None:
+            stripped = self.buf.lstrip()
+            if not stripped:
+                return ""
+            if stripped[0] != "{":
+                return self._release()
+            self.mode = "json"
+
+        # scan new chars: track brace depth outside of strings
+        for i in range(self._pos, len(self.buf)):
+            c = self.buf[i]
+            if self._closed:
+                if not c.isspace():
+                    return self._release()  # text after the object -> not a bare tool call
+                continue
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+            elif c == '"':
+                self._in_str = True
+            elif c == "{":
+                self._depth += 1
+            elif c == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._closed = True
+        self._pos = len(self.buf)
+
+        if len(self.buf) > self.max_hold:
+            return self._release()
+        return ""
+
+    def finish(self):
+        if self.mode != "json":
+            return self._release(), None
+        data = _parse_json_tool_call(self.buf)
+        if data:
+            self.buf = ""
+            return "", data
+        return self._release(), None
+
+
+# -----------------------------
+# stream chunks -> events
+# -----------------------------
+def _tool_end_event(msg: ToolMessage) -> dict:
+    content = msg.content if isinstance(msg.content, str) else json.dumps(msg.content, default=str)
+    return {
+        "type": "tool_end",
+        "name": msg.name,
+        "id": msg.tool_call_id,
+        "sources": grounding_sources(content),
+        "preview": content[:200],
+    }
+
+
+class _EventTranslator:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.ttft = None
+        self._msg_id = None
+        self._sniffer = None
+        self.final_messages = []
+
+    def _token(self, text: str):
+        if not text:
+            return []
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.t0
+            tracing.record_span("stream", "time_to_first_token", self.t0, self.ttft)
+        return [{"type": "token", "text": text}]
+
+    def _end_message(self):
+        if self._sniffer is None:
+            return []
+        text, _ = self._sniffer.finish()  # a JSON tool call is reported by tools_json_prep
+        self._sniffer = None
+        self._msg_id = None
+        return self._token(text)
+
+    def feed(self, mode: str, chunk) -> list:
+        events = []
+        if mode == "messages":
+            msg, meta = chunk
+            if meta.get("langgraph_node") != "agent" or not isinstance(msg, AIMessage):
+                return events
+            if msg.id != self._msg_id:
+                events += self._end_message()
+                self._msg_id = msg.id
+                self._sniffer = JsonToolCallSniffer()
+            if isinstance(msg.content, str) and msg.content:
+                events += self._token(self._sniffer.feed(msg.content))
+            return events
+
+        # mode == "updates": {node_name: state delta}
+        for node, delta in chunk.items():
+            if node == "agent":
+                events += self._end_message()
+            for msg in (delta or {}).get("messages", []):
+                if isinstance(msg, AIMessage) and msg.tool_calls:
+                    for tc in msg.tool_calls:
+                        events.append({"type": "tool_start", "name": tc["name"], "args": tc.get("args", {}), "id": tc.get("id")})
+                elif isinstance(msg, ToolMessage) and node == "tools":  # "compact" re-emits old ones
+                    events.append(_tool_end_event(msg))
+                if isinstance(msg, AIMessage):
+                    self.final_messages.append(msg)
+            events.append({"type": "node", "name": node})
+        return events
+
+    def finish(self) -> list:
+        events = self._end_message()
+        total = time.perf_counter() - self.t0
+        events.append({
+            "type": "final",
+            "text": get_last_assistant_text(self.final_messages),
+            "ttft_ms": round(self.ttft * 1000, 3) if self.ttft is not None else None,
+            "total_ms": round(total * 1000, 3),
+        })
+        return events
+
+
+def _inputs(question_or_state):
+    if isinstance(question_or_state, str):
+        return {"messages": [HumanMessage(content=question_or_state)]}
+    return question_or_state
+
+
+def stream_events(app, question_or_state, config=None):
+    """Generator of agent events (see module docstring) for one conversation."""
+    tr = _EventTranslator()
+    for mode, chunk in app.stream(_inputs(question_or_state), config=config, stream_mode=STREAM_MODES):
+        yield from tr.feed(mode, chunk)
+    yield from tr.finish()
+
+
+async def astream_events(app, question_or_state, config=None):
+    """Async twin of stream_events() built on app.astream."""
+    tr = _EventTranslator()
+    async for mode, chunk in app.astream(_inputs(question_or_state), config=config, stream_mode=STREAM_MODES):
+        for event in tr.feed(mode, chunk):
+            yield event
+    for event in tr.finish():
+        yield event
+
+
+# -----------------------------
+# CLI
+# -----------------------------
+def print_events(events, out=sys.stdout, err=sys.stderr):
+    """Render events for a terminal: tokens to `out`, progress lines to `err`."""
+    final = None
+    for ev in events:
+        kind = ev["type"]
+        if kind == "token":
+            out.write(ev["text"])
+            out.flush()
+        elif kind == "tool_start":
+            err.write(f"\n[tool] {ev['name']}({json.dumps(ev['args'], default=str)[:160]})\n")
+        elif kind == "tool_end":
+            sources = ", ".join(ev["sources"]) or "-"
+            err.write(f"[tool] {ev['name']} done (sources: {sources})\n")
+        elif kind == "final":
+            final = ev
+    out.write("\n")
+    if final is not None:
+        ttft = f"{final['ttft_ms']:.0f} ms" if final["ttft_ms"] is not None else "n/a"
+        err.write(f"(first token after {ttft}, total {final['total_ms']:.0f} ms)\n")
+    return final
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ask the agent a question and stream the answer")
+    parser.add_argument("question")
+    parser.add_argument("--jsonl", action="store_true", help="print raw events, one JSON object per line")
+    args = parser.parse_args()
+
+    from agent.graph import build_graph
+    app = build_graph()
+
+    with tracing.run("stream"):
+        events = stream_events(app, args.question)
+        if args.jsonl:
+            for ev in events:
+                print(json.dumps(ev, default=str), flush=True)
+        else:
+            print_events(events)
@@ -0,0 +1,179 @@
+"""
+Tools step of the agent graph: parallel execution + per-conversation memoization.
+
+Replaces ToolNode(TOOLS) in build_graph with the same contract (one ToolMessage
+per tool call of the last AIMessage, in call order, errors returned as
+"Error: ..." messages) plus:
+
+  - memo:     results are stored in GraphState.tool_memo, keyed by tool name +
+              normalized args (validated against the tool's args schema, so
+              defaults are filled in, key order and whitespace don't matter).
+              A call repeated in a later loop iteration of the same
+              conversation is answered from the memo without running the tool.
+              Tools that read a file include its resolved path, mtime and
+              size in the key.
+  - dedupe:   identical calls inside one turn run once and share the result.
+  - parallel: the remaining distinct calls run concurrently, on a bounded
+              thread pool (invoke) or as bounded asyncio tasks (ainvoke), so an
+              iteration takes about as long as its slowest call.
+
+Errors are never memoized. Each memo hit / collapsed duplicate is recorded as a
+"memo" span in the run trace.
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from agent.config import TOOL_MAX_WORKERS, TOOL_MEMO_ENABLED
+from agent import tracing
+
+_INVALID_TOOL = "Error: {name} is not a valid tool, try one of [{available}]."
+_TOOL_ERROR = "Error: {error}\n Please fix your mistakes."
+_PATH_ARGS = ("path", "csv_path")
+
+
+def merge_memo(old: dict, new: dict) -> dict:
+    """GraphState reducer for tool_memo (nodes return only new entries)."""
+    return {**(old or {}), **(new or {})}
+
+
+# -----------------------------
+# Memo keys
+# -----------------------------
+def _normalize(value):
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip()
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    return value
+
+
+def memo_key(tool, args: dict):
+    """"name:{normalized args}", or None if the args don't validate (the tool reports that error)."""
+    schema = getattr(tool, "args_schema", None)
+    try:
+        if isinstance(schema, type) and hasattr(schema, "model_validate"):
+            args = schema.model_validate(args).model_dump()
+    except Exception:
+        return None
+    args = _normalize(args)
+    for name in _PATH_ARGS:
+        path = args.get(name)
+        if isinstance(path, str) and path:
+            # resolved like the tools do (agent.tools.get_profile), so "~/a.csv" / "./a.csv" share a key
+            path = args[name] = os.path.abspath(os.path.expanduser(path))
+            try:
+                st = os.stat(path)
+                args[f"{name}@"] = [st.st_mtime_ns, st.st_size]
+            except OSError:
+                return None  # missing file: let the tool return its error every time
+    return f"{tool.name}:{json.dumps(args, sort_keys=True, default=str)}"
+
+
+# -----------------------------
+# Execution
+# -----------------------------
+def _error_message(call: dict, content: str) -> ToolMessage:
+    return ToolMessage(content=content, name=call["name"], tool_call_id=call["id"], status="error")
+
+
+def _as_message(call: dict, result) -> ToolMessage:
+    """Re-address a result (ToolMessage from tool.invoke) to `call`."""
+    return ToolMessage(content=result.content, name=call["name"], tool_call_id=call["id"],
+                       status=getattr(result, "status", "success"))
+
+
+def _run_tool(tool, call: dict, config) -> ToolMessage:
+    try:
+        return tool.invoke({**call, "type": "tool_call"}, config)
+    except Exception as e:
+        return _error_message(call, _TOOL_ERROR.format(error=repr(e)))
+
+
+async def _arun_tool(tool, call: dict, config, sem: asyncio.Semaphore) -> ToolMessage:
+    async with sem:
+        try:
+            return await tool.ainvoke({**call, "type": "tool_call"}, config)
+        except Exception as e:
+            return _error_message(call, _TOOL_ERROR.format(error=repr(e)))
+
+
+class ToolExecutor:
+    """Graph node running the last AIMessage's tool calls (see module docstring)."""
+
+    def __init__(self, tools, max_workers: int = TOOL_MAX_WORKERS, memo: bool = TOOL_MEMO_ENABLED):
+        self.tools = {t.name: t for t in tools}
+        self.max_workers = max(1, max_workers)
+        self.memo = memo
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")  # threads start lazily
+
+    def _plan(self, state: dict):
+        """
+        Split the pending calls into answered messages (memo hits, invalid tools)
+        and distinct calls to run: returns (calls, answered, todo, keys) where
+        todo maps a key to the first call with it and keys[i] is call i's key.
+        """
+        last = state["messages"][-1]
+        calls = list(getattr(last, "tool_calls", None) or []) if isinstance(last, AIMessage) else []
+        memo = (state.get("tool_memo") or {}) if self.memo else {}
+        answered, todo, keys = {}, {}, []
+        for i, call in enumerate(calls):
+            tool = self.tools.get(call["name"])
+            if tool is None:
+                answered[i] = _error_message(call, _INVALID_TOOL.format(
+                    name=call["name"], available=", ".join(self.tools)))
+                keys.append(None)
+                continue
+            key = memo_key(tool, call.get("args", {})) if self.memo else None
+            keys.append(key if key is not None else f"#{i}")  # unkeyed calls always run
+            if key is not None and key in memo:
+                answered[i] = ToolMessage(content=memo[key], name=call["name"], tool_call_id=call["id"])
+                tracing.record_span("memo", f"{call['name']}.hit", time.perf_counter(), 0.0)
+            elif keys[-1] in todo:
+                tracing.record_span("memo", f"{call['name']}.dedupe", time.perf_counter(), 0.0)
+            else:
+                todo[keys[-1]] = call
+        return calls, answered, todo, keys
+
+    def _collect(self, calls, answered, results, keys) -> dict:
+        messages, new_memo = [], {}
+        for i, call in enumerate(calls):
+            if i in answered:
+                messages.append(answered[i])
+                continue
+            result = results[keys[i]]
+            messages.append(result if result.tool_call_id == call["id"] else _as_message(call, result))
+            if self.memo and not keys[i].startswith("#") and result.status != "error" \
+                    and isinstance(result.content, str):
+                new_memo[keys[i]] = result.content
+        update = {"messages": messages}
+        if new_memo:
+            update["tool_memo"] = new_memo
+        return update
+
+    def invoke(self, state: dict, config=None) -> dict:
+        calls, answered, todo, keys = self._plan(state)
+        if len(todo) <= 1 or self.max_workers == 1:
+            results = {k: _run_tool(self.tools[c["name"]], c, config) for k, c in todo.items()}
+        else:
+            # copy the context per task so tracing spans land in this run's trace
+            futures = {
+                k: self._pool.submit(contextvars.copy_context().run, _run_tool, self.tools[c["name"]], c, config)
+                for k, c in todo.items()
+            }
+            results = {k: f.result() for k, f in futures.items()}
+        return self._collect(calls, answered, results, keys)
+
+    async def ainvoke(self, state: dict, config=None) -> dict:
+        calls, answered, todo, keys = self._plan(state)
+        sem = asyncio.Semaphore(self.max_workers)
+        done = await asyncio.gather(*(_arun_tool(self.tools[c["name"]], c, config, sem) for c in todo.values()))
+        return self._collect(calls, answered, dict(zip(todo, done)), keys)
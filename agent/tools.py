@@ -1,15 +1,22 @@
 # agent/tools.py
 from __future__ import annotations
 
+import os
+import re
 from typing import Optional, Dict, Any, List
+
+import numpy as np
 from pydantic import BaseModel, Field
 
-import chromadb
-from sentence_transformers import SentenceTransformer
-from langchain_core.tools import tool
+from langchain_core.tools import tool, StructuredTool
+
+# Shared model / vector store (loaded once per process)
+from rag import resources
+from rag.retrieve import run_queries, arun_queries
+from rag.query_cache import LRUCache
 
-# Reuse your existing settings (adjust imports if your paths differ)
-from rag.config import CHROMA_DIR, COLLECTION_NAME, EMBED_MODEL_NAME
+from agent.config import GROUNDING_BUDGET_CHARS, DATASET_CACHE_ENABLED, PROFILE_CHUNK_ROWS
+from agent import tracing, profiling, dataset_cache
 
 
 # -----------------------------
@@ -18,69 +25,298 @@ from rag.config import CHROMA_DIR, COLLECTION_NAME, EMBED_MODEL_NAME
 class GroundingInput(BaseModel):
     """Input schema for querying the EDA knowledge base."""
     query: str = Field(..., min_length=3, description="User question to search in EDA knowledge base.")
-    top_k: int = Field(3, ge=1, le=8, description="Number of retrieved chunks to return.")
+    top_k: int = Field(3, ge=1, le=8, description="Number of chunks to return when budget_chars=0 (otherwise the minimum number of candidates).")
     topic: Optional[str] = Field(
         None,
         description="Optional metadata filter. Examples: 'missing_values', 'correlation', 'workflow', 'visualization', 'eda_general'."
     )
+    budget_chars: Optional[int] = Field(
+        None,
+        ge=0,
+        le=8000,
+        description=f"Characters of grounding text to return (default {GROUNDING_BUDGET_CHARS}). Overlapping chunks are "
+                    "merged and near-duplicates skipped to fill it. 0 = exactly top_k raw chunks."
+    )
+
+
+def _format_grounding(hits) -> str:
+    """Compact, LLM-friendly grounded context."""
+    if not hits:
+        return "No relevant grounding found in KB."
+
+    out_lines = ["GROUNDING RESULTS:"]
+    for i, h in enumerate(hits, start=1):
+        m = h.get("meta") or {}
+        doc_type = m.get("doc_type", "unknown")
+        tpc = m.get("topic", "unknown")
+        src = m.get("source", "unknown")
+        snippet = (h.get("text") or "").strip().replace("\n", " ")
+        # chunk id lets the context manager drop chunks repeated across tool calls
+        out_lines.append(f"{i}) ({doc_type}, topic={tpc}, source={src}, id={h.get('id')}) {snippet}")
+
+    return "\n".join(out_lines)
+
 
+_SOURCE_RE = re.compile(r"source=([^)\s,]+)")
 
-@tool("search_eda_kb", args_schema=GroundingInput)
-def search_eda_kb(query: str, top_k: int = 3, topic: Optional[str] = None) -> str:
+
+def grounding_sources(text: str) -> List[str]:
+    """Source names cited in a _format_grounding() block (sorted, unique)."""
+    return sorted(set(_SOURCE_RE.findall(text or "")))
+
+
+def _trace_retrieval(tool_name: str, timings: dict):
+    for step in ("lexical", "encode", "query"):
+        if step in timings:
+            start, seconds = timings[step]
+            tracing.record_span("retrieval", f"{tool_name}.{step}", start, seconds)
+
+
+def _grounding_query(query: str, top_k: int, topic: Optional[str], budget_chars: Optional[int]) -> dict:
+    budget = GROUNDING_BUDGET_CHARS if budget_chars is None else budget_chars
+    return {
+        "query": query,
+        "where": {"topic": topic} if topic else None,
+        "k": top_k,
+        "budget": budget or None,  # 0 -> plain top_k
+    }
+
+
+# Each retrieval tool has a sync implementation (app.invoke) and an async one
+# (app.ainvoke, agent/serve.py) whose encodes go through the shared micro-batcher.
+@tracing.traced_tool("search_eda_kb")
+def _search_eda_kb(query: str, top_k: int = 3, topic: Optional[str] = None, budget_chars: Optional[int] = None) -> str:
     """
     Use this tool when you need grounded EDA guidance (steps, best practices, definitions)
     from the project's curated knowledge base. Supports optional topic filtering.
     Returns the most relevant chunks as text.
     """
-    client = chromadb.PersistentClient(path=CHROMA_DIR)
-    collection = client.get_collection(name=COLLECTION_NAME)
+    store = resources.get_store()
+
+    timings = {}
+    hits = run_queries(store, [_grounding_query(query, top_k, topic, budget_chars)], timings=timings)[0]
+    _trace_retrieval("search_eda_kb", timings)
+    return _format_grounding(hits)
+
+
+@tracing.traced_tool("search_eda_kb")
+async def _asearch_eda_kb(query: str, top_k: int = 3, topic: Optional[str] = None,
+                          budget_chars: Optional[int] = None) -> str:
+    store = resources.get_store()
 
-    model = SentenceTransformer(EMBED_MODEL_NAME)
-    q_emb = model.encode([query]).tolist()
+    timings = {}
+    hits = (await arun_queries(store, [_grounding_query(query, top_k, topic, budget_chars)], timings=timings))[0]
+    _trace_retrieval("search_eda_kb", timings)
+    return _format_grounding(hits)
 
-    where = {"topic": topic} if topic else None
 
-    res = collection.query(
-        query_embeddings=q_emb,
-        n_results=top_k,
-        where=where
+search_eda_kb = StructuredTool.from_function(
+    func=_search_eda_kb,
+    coroutine=_asearch_eda_kb,
+    name="search_eda_kb",
+    args_schema=GroundingInput,
+)
+
+
+class BatchGroundingInput(BaseModel):
+    """Input schema for querying the EDA knowledge base with several sub-questions at once."""
+    queries: List[GroundingInput] = Field(
+        ...,
+        min_length=1,
+        max_length=16,
+        description="Sub-questions to ground, each with its own optional top_k and topic filter."
     )
 
-    docs = res.get("documents", [[]])[0]
-    metas = res.get("metadatas", [[]])[0]
 
-    if not docs:
-        return "No relevant grounding found in KB."
+def _batch_queries(queries) -> List[dict]:
+    batch = []
+    for q in queries:
+        q = q if isinstance(q, GroundingInput) else GroundingInput(**q)
+        batch.append(_grounding_query(q.query, q.top_k, q.topic, q.budget_chars))
+    return batch
 
-    # Return a compact, LLM-friendly grounded context
-    out_lines = ["GROUNDING RESULTS:"]
-    for i, (d, m) in enumerate(zip(docs, metas), start=1):
-        doc_type = (m or {}).get("doc_type", "unknown")
-        tpc = (m or {}).get("topic", "unknown")
-        src = (m or {}).get("source", "unknown")
-        snippet = (d or "").strip().replace("\n", " ")
-        out_lines.append(f"{i}) ({doc_type}, topic={tpc}, source={src}) {snippet}")
 
-    return "\n".join(out_lines)
+def _format_batch(batch, results) -> str:
+    blocks = []
+    for i, (q, hits) in enumerate(zip(batch, results), start=1):
+        blocks.append(f"### Query {i}: {q['query']}\n{_format_grounding(hits)}")
+    return "\n\n".join(blocks)
+
+
+@tracing.traced_tool("search_eda_kb_batch")
+def _search_eda_kb_batch(queries: List[GroundingInput]) -> str:
+    """
+    Same as search_eda_kb, but grounds several sub-questions in one call.
+    Prefer this when you need guidance on multiple EDA topics at once.
+    Returns one block of grounding results per sub-question.
+    """
+    store = resources.get_store()
+    batch = _batch_queries(queries)
+
+    timings = {}
+    results = run_queries(store, batch, timings=timings)
+    _trace_retrieval("search_eda_kb_batch", timings)
+    return _format_batch(batch, results)
+
+
+@tracing.traced_tool("search_eda_kb_batch")
+async def _asearch_eda_kb_batch(queries: List[GroundingInput]) -> str:
+    store = resources.get_store()
+    batch = _batch_queries(queries)
+
+    timings = {}
+    results = await arun_queries(store, batch, timings=timings)
+    _trace_retrieval("search_eda_kb_batch", timings)
+    return _format_batch(batch, results)
+
+
+search_eda_kb_batch = StructuredTool.from_function(
+    func=_search_eda_kb_batch,
+    coroutine=_asearch_eda_kb_batch,
+    name="search_eda_kb_batch",
+    args_schema=BatchGroundingInput,
+)
 
 
 # -----------------------------
-# Tool 2: Action Tool (Example)
+# Tool 2: CSV profiling (one streaming pass, see agent/profiling.py)
+# -----------------------------
+_PROFILES = LRUCache(16)  # (path, mtime, size, max_rows) -> full profile
+
+
+def get_profile(path: str, max_rows: Optional[int] = None) -> Dict[str, Any]:
+    """Profile `path`, reusing the last result while the file is unchanged."""
+    path = os.path.abspath(os.path.expanduser(path))
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size, max_rows)
+    summary = _PROFILES.get(key)
+    if summary is None:
+        if DATASET_CACHE_ENABLED and max_rows is None:
+            summary = profiling.profile_dataset(dataset_cache.open_dataset(path))
+        else:
+            summary = profiling.profile_csv(path, max_rows=max_rows)
+        _PROFILES.put(key, summary)
+    return summary
+
+
+class ProfileInput(BaseModel):
+    """Input schema to profile a CSV file."""
+    path: str = Field(..., min_length=1, description="Path to a CSV file (first row = header).")
+    max_rows: Optional[int] = Field(None, ge=1, description="Only profile the first N rows (default: all).")
+
+
+@tool("profile_csv", args_schema=ProfileInput)
+@tracing.traced_tool("profile_csv")
+def profile_csv(path: str, max_rows: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Use this tool to profile a CSV dataset: column types, missing values, summary statistics,
+    quantiles and IQR outlier counts, approximate distinct counts and the strongest correlations.
+    """
+    try:
+        return profiling.compact_summary(get_profile(path, max_rows=max_rows))
+    except (OSError, UnicodeError) as e:
+        return {"error": f"Could not read {path}: {e}"}
+
+
+# -----------------------------
+# Tools 3-4: column analyses on the cached columnar dataset (only the requested columns are read)
+# -----------------------------
+class ColumnsInput(BaseModel):
+    """Input schema for column-level analyses of a CSV file."""
+    path: str = Field(..., min_length=1, description="Path to a CSV file (first row = header).")
+    columns: List[str] = Field(default_factory=list, description="Columns to analyze (default: all numeric columns).")
+
+
+def _numeric_columns(ds, columns: List[str]):
+    """(numeric columns to use, error message or None)."""
+    unknown = [c for c in columns if c not in ds.columns]
+    if unknown:
+        return [], f"Unknown columns: {', '.join(unknown)}. Available: {', '.join(ds.columns)}"
+    return (columns or ds.numeric_columns()), None
+
+
+@tool("detect_outliers", args_schema=ColumnsInput)
+@tracing.traced_tool("detect_outliers")
+def detect_outliers(path: str, columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Use this tool to count IQR outliers (below Q1 - 1.5*IQR or above Q3 + 1.5*IQR) in numeric
+    columns of a CSV file, with the fences and the most extreme values.
+    """
+    try:
+        ds = dataset_cache.open_dataset(path)
+    except (OSError, UnicodeError) as e:
+        return {"error": f"Could not read {path}: {e}"}
+    names, error = _numeric_columns(ds, columns or [])
+    if error:
+        return {"error": error}
+
+    report = []
+    for name in names:
+        x = ds.numbers(name)
+        x = np.asarray(x[~np.isnan(x)])
+        if len(x) == 0:
+            report.append({"column": name, "error": "no numeric values"})
+            continue
+        q1, q3 = np.percentile(x, [25, 75])
+        lo, hi = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+        out = x[(x < lo) | (x > hi)]
+        extremes = out[np.argsort(-np.abs(out - np.median(x)))[:5]]
+        report.append({
+            "column": name,
+            "q1": round(float(q1), 4), "q3": round(float(q3), 4),
+            "lower_fence": round(float(lo), 4), "upper_fence": round(float(hi), 4),
+            "outliers": int(len(out)), "outlier_pct": round(100.0 * len(out) / len(x), 2),
+            "most_extreme": [round(float(v), 4) for v in extremes],
+        })
+    return {"path": ds.source, "rows": ds.rows, "columns": report}
+
+
+@tool("correlate_columns", args_schema=ColumnsInput)
+@tracing.traced_tool("correlate_columns")
+def correlate_columns(path: str, columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Use this tool to compute the Pearson correlation matrix (pairwise-complete) of numeric
+    columns of a CSV file and list the most strongly correlated pairs.
+    """
+    try:
+        ds = dataset_cache.open_dataset(path)
+    except (OSError, UnicodeError) as e:
+        return {"error": f"Could not read {path}: {e}"}
+    names, error = _numeric_columns(ds, columns or [])
+    if error:
+        return {"error": error}
+    if len(names) < 2:
+        return {"error": "Need at least two numeric columns."}
+
+    acc = profiling.CorrelationAccumulator(names)
+    for lo in range(0, ds.rows, PROFILE_CHUNK_ROWS):
+        acc.update(np.column_stack([ds.numbers(n, lo, lo + PROFILE_CHUNK_ROWS) for n in names]))
+    r = acc.matrix()
+    pairs = sorted(
+        ((names[i], names[j], float(r[i, j])) for i in range(len(names)) for j in range(i + 1, len(names))
+         if np.isfinite(r[i, j])),
+        key=lambda t: -abs(t[2]),
+    )
+    return {
+        "path": ds.source,
+        "columns": names,
+        "matrix": [[None if not np.isfinite(v) else round(float(v), 4) for v in row] for row in r],
+        "top_pairs": [{"a": a, "b": b, "r": round(v, 4)} for a, b, v in pairs[:10]],
+    }
+
+
+# -----------------------------
+# Tool 5: Action Tool
 # -----------------------------
 class EDAPlanInput(BaseModel):
     """Input schema to create a structured EDA plan."""
-    dataset_columns: List[str] = Field(..., min_length=1, description="List of dataset column names.")
+    dataset_columns: List[str] = Field(default_factory=list, description="List of dataset column names.")
     goal: str = Field(..., min_length=3, description="What the user wants to learn from EDA (e.g., trends, anomalies, relationships).")
+    csv_path: Optional[str] = Field(None, description="Optional CSV path; the plan is then built from its profile.")
 
 
-@tool("create_eda_plan", args_schema=EDAPlanInput)
-def create_eda_plan(dataset_columns: List[str], goal: str) -> Dict[str, Any]:
-    """
-    Use this tool to generate a clean step-by-step EDA plan (tasks + recommended plots)
-    given dataset columns and a user goal. This is a project-specific action tool.
-    """
-    # Simple deterministic plan (keeps it reliable for viva)
-    plan = {
+def _static_plan(dataset_columns: List[str], goal: str) -> Dict[str, Any]:
+    return {
         "goal": goal,
         "steps": [
             "Check dataset shape, data types, and basic schema validation",
@@ -101,8 +337,95 @@ def create_eda_plan(dataset_columns: List[str], goal: str) -> Dict[str, Any]:
         ],
         "columns_seen": dataset_columns[:]
     }
-    return plan
+
+
+def _names(columns, limit: int = 8) -> str:
+    names = [c if isinstance(c, str) else c["name"] for c in columns]
+    return ", ".join(names[:limit]) + (f" (+{len(names) - limit} more)" if len(names) > limit else "")
+
+
+def _profiled_plan(profile: Dict[str, Any], goal: str) -> Dict[str, Any]:
+    cols = profile["columns"]
+    numeric = [c for c in cols if c["type"] in ("integer", "float")]
+    categorical = [c for c in cols if c["type"] in ("categorical", "boolean")]
+    dates = [c for c in cols if c["type"] == "datetime"]
+    missing = sorted((c for c in cols if c["missing"]), key=lambda c: -c["missing_pct"])
+    outliers = sorted((c for c in numeric if c.get("outliers_iqr", c.get("outliers_iqr_approx"))),
+                      key=lambda c: -c["outlier_pct"])
+    constant = [c for c in cols if c["distinct_approx"] <= 1 and c["type"] != "empty"]
+    pairs = profile.get("correlations", {}).get("top_pairs", [])
+    strong = [p for p in pairs if abs(p["r"]) >= 0.5]
+
+    types = ", ".join(f"{c['name']}={c['type']}" for c in cols[:12])
+    steps = [f"Confirm shape ({profile['rows']} rows x {profile['n_columns']} columns) and types: {types}"]
+    if missing:
+        top = ", ".join(f"{c['name']} ({c['missing_pct']}%)" for c in missing[:6])
+        steps.append(f"Decide how to handle missing values in {top}")
+    else:
+        steps.append("No missing values detected; validate sentinel values (e.g. 0, -1, 'unknown') instead")
+    if constant:
+        steps.append(f"Drop or justify constant columns: {_names(constant)}")
+    if numeric:
+        steps.append(f"Review summary statistics and skew (mean vs median) for {_names(numeric)}")
+    if outliers:
+        top = ", ".join(f"{c['name']} ({c['outlier_pct']}%)" for c in outliers[:6])
+        steps.append(f"Inspect IQR outliers in {top} and decide whether to cap, transform or keep them")
+    if categorical:
+        steps.append(f"Check category frequencies and rare levels in {_names(categorical)}")
+    if dates:
+        steps.append(f"Parse {_names(dates)} as dates and look for trends / seasonality")
+    if strong:
+        top = ", ".join(f"{p['a']}~{p['b']} (r={p['r']})" for p in strong[:5])
+        steps.append(f"Examine strongly correlated pairs {top} (redundancy / multicollinearity)")
+    elif len(numeric) > 1:
+        steps.append("No strong linear correlations found; check non-linear relationships")
+    steps.append(f"Relate findings to the goal: {goal}")
+    steps.append("Summarize insights and potential data quality issues")
+
+    plots = []
+    if missing:
+        plots.append(f"Missing values bar chart ({_names(missing, 6)})")
+    if numeric:
+        plots.append(f"Histograms for {_names(numeric, 6)}")
+    if outliers:
+        plots.append(f"Boxplots for {_names(outliers, 6)}")
+    if len(numeric) > 1:
+        plots.append("Correlation heatmap")
+    plots += [f"Scatter plot {p['a']} vs {p['b']}" for p in (strong or pairs)[:3]]
+    if categorical:
+        plots.append(f"Bar charts of category counts for {_names(categorical, 6)}")
+    if dates and numeric:
+        plots.append(f"Line chart of {numeric[0]['name']} over {dates[0]['name']}")
+
+    return {
+        "goal": goal,
+        "steps": steps,
+        "recommended_plots": plots,
+        "columns_seen": [c["name"] for c in cols],
+        "profile": {"path": profile["path"], "rows": profile["rows"], "seconds": profile["seconds"]},
+    }
+
+
+@tool("create_eda_plan", args_schema=EDAPlanInput)
+@tracing.traced_tool("create_eda_plan")
+def create_eda_plan(goal: str, dataset_columns: Optional[List[str]] = None, csv_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Use this tool to generate a clean step-by-step EDA plan (tasks + recommended plots)
+    given dataset columns and a user goal. With csv_path the plan is built from the
+    file's profile (real types, missing values, outliers and correlations).
+    """
+    dataset_columns = dataset_columns or []
+    if csv_path:
+        try:
+            return _profiled_plan(get_profile(csv_path), goal)
+        except (OSError, UnicodeError) as e:
+            if not dataset_columns:
+                return {"error": f"Could not read {csv_path}: {e}"}
+    if not dataset_columns:
+        return {"error": "Provide dataset_columns or csv_path."}
+    # Simple deterministic plan (keeps it reliable for viva)
+    return _static_plan(dataset_columns, goal)
 
 
 # Export tool list for graph.py
-TOOLS = [search_eda_kb, create_eda_plan]
\ No newline at end of file
+TOOLS = [search_eda_kb, search_eda_kb_batch, profile_csv, detect_outliers, correlate_columns, create_eda_plan]
\ No newline at end of file
@@ -0,0 +1,331 @@
+"""
+Lightweight tracing for the LangGraph agent.
+
+Records, per graph run:
+  - wall time of every node execution and every tool call (spans)
+  - the encode vs. vector-query split inside search_eda_kb
+  - LLM prompt / completion token counts
+  - number of agent <-> tools loop iterations
+  - estimated prompt tokens removed by context compaction (agent/context.py)
+
+Each finished run is appended as one JSON line to TRACE_PATH. All spans are
+also aggregated into in-process histograms that can be exported in the
+Prometheus text format (export_prometheus()), or rebuilt offline from the
+JSONL file:
+
+    python -m agent.tracing --prometheus outputs/agent_traces.jsonl
+
+Overhead per span is a couple of perf_counter() calls and a dict append, and
+the trace file is written once per run, so it is fine to leave on.
+"""
+import os
+import json
+import time
+import uuid
+import inspect
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+
+from agent.config import TRACING_ENABLED, TRACE_PATH
+
+# seconds
+SPAN_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+ITERATION_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+
+_current_run = contextvars.ContextVar("data_insight_trace_run", default=None)
+
+
+# -----------------------------
+# Aggregated metrics
+# -----------------------------
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, b in enumerate(self.buckets):
+            if value <= b:
+                self.counts[i] += 1
+                break
+
+
+class Registry:
+    """Histograms + counters, exportable in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans = {}  # (kind, name) -> _Histogram
+        self.iterations = _Histogram(ITERATION_BUCKETS)
+        self.counters = {"llm_prompt_tokens": 0, "llm_completion_tokens": 0, "context_tokens_saved": 0, "runs": 0}
+
+    def observe_span(self, kind: str, name: str, seconds: float):
+        with self._lock:
+            h = self.spans.get((kind, name))
+            if h is None:
+                h = self.spans[(kind, name)] = _Histogram(SPAN_BUCKETS)
+            h.observe(seconds)
+
+    def observe_run(self, record: dict):
+        with self._lock:
+            self.counters["runs"] += 1
+            self.counters["llm_prompt_tokens"] += record.get("prompt_tokens", 0)
+            self.counters["llm_completion_tokens"] += record.get("completion_tokens", 0)
+            self.counters["context_tokens_saved"] += record.get("context_tokens_saved", 0)
+            self.iterations.observe(record.get("loop_iterations", 0))
+
+    def export_prometheus(self, prefix: str = "data_insight") -> str:
+        lines = []
+        with self._lock:
+            name = f"{prefix}_span_seconds"
+            lines.append(f"# HELP {name} Wall time of agent graph nodes, tool calls and retrieval steps.")
+            lines.append(f"# TYPE {name} histogram")
+            for (kind, span), h in sorted(self.spans.items()):
+                labels = f'kind="{kind}",name="{span}"'
+                _histogram_lines(lines, name, labels, h)
+
+            name = f"{prefix}_loop_iterations"
+            lines.append(f"# HELP {name} Agent <-> tools loop iterations per run.")
+            lines.append(f"# TYPE {name} histogram")
+            _histogram_lines(lines, name, "", self.iterations)
+
+            for counter, help_text in [
+                ("llm_prompt_tokens", "LLM prompt tokens."),
+                ("llm_completion_tokens", "LLM completion tokens."),
+                ("context_tokens_saved", "Estimated tokens removed from the message history by compaction."),
+                ("runs", "Traced graph runs."),
+            ]:
+                name = f"{prefix}_{counter}_total"
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name} {self.counters[counter]}")
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(lines, name, labels, h):
+    sep = "," if labels else ""
+    cumulative = 0
+    for b, c in zip(h.buckets, h.counts):
+        cumulative += c
+        lines.append(f'{name}_bucket{{{labels}{sep}le="{b}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {h.count}')
+    lines.append(f"{name}_sum{{{labels}}} {h.sum:.6f}" if labels else f"{name}_sum {h.sum:.6f}")
+    lines.append(f"{name}_count{{{labels}}} {h.count}" if labels else f"{name}_count {h.count}")
+
+
+REGISTRY = Registry()
+_write_lock = threading.Lock()
+
+
+# -----------------------------
+# Per-run trace
+# -----------------------------
+class RunTrace:
+    def __init__(self, name: str = "graph", run_id: str = None):
+        self.run_id = run_id or uuid.uuid4().hex
+        self.name = name
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.spans = []
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.loop_iterations = 0
+        self.context_tokens_saved = 0
+        self._lock = threading.Lock()
+
+    def add_span(self, kind: str, name: str, start: float, seconds: float, **attrs):
+        span = {"kind": kind, "name": name, "start_ms": round((start - self._t0) * 1000, 3), "ms": round(seconds * 1000, 3)}
+        if attrs:
+            span.update(attrs)
+        with self._lock:
+            self.spans.append(span)
+
+    def to_record(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "total_ms": round((time.perf_counter() - self._t0) * 1000, 3),
+            "loop_iterations": self.loop_iterations,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "context_tokens_saved": self.context_tokens_saved,
+            "spans": self.spans,
+        }
+
+
+def current_run():
+    return _current_run.get()
+
+
+@contextmanager
+def run(name: str = "graph", run_id: str = None, path: str = TRACE_PATH):
+    """Trace one graph run; the record is appended to `path` when the block exits."""
+    if not TRACING_ENABLED:
+        yield None
+        return
+
+    trace = RunTrace(name=name, run_id=run_id)
+    token = _current_run.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_run.reset(token)
+        record = trace.to_record()
+        REGISTRY.observe_run(record)
+        if path:
+            _append_jsonl(path, record)
+
+
+def _append_jsonl(path: str, record: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    line = json.dumps(record) + "\n"
+    with _write_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+
+# -----------------------------
+# Recording helpers
+# -----------------------------
+def record_span(kind: str, name: str, start: float, seconds: float, **attrs):
+    """Record an already-measured span (start = perf_counter() value)."""
+    if not TRACING_ENABLED:
+        return
+    REGISTRY.observe_span(kind, name, seconds)
+    trace = _current_run.get()
+    if trace is not None:
+        trace.add_span(kind, name, start, seconds, **attrs)
+
+
+@contextmanager
+def span(name: str, kind: str = "step", **attrs):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(kind, name, start, time.perf_counter() - start, **attrs)
+
+
+def record_llm_usage(message):
+    """Add token counts from an AIMessage's usage_metadata (if the provider reports them)."""
+    trace = _current_run.get()
+    usage = getattr(message, "usage_metadata", None) or {}
+    if trace is None or not usage:
+        return
+    with trace._lock:
+        trace.prompt_tokens += int(usage.get("input_tokens", 0) or 0)
+        trace.completion_tokens += int(usage.get("output_tokens", 0) or 0)
+
+
+def count_loop_iteration():
+    trace = _current_run.get()
+    if trace is not None:
+        with trace._lock:
+            trace.loop_iterations += 1
+
+
+def record_context_savings(tokens: int):
+    trace = _current_run.get()
+    if trace is not None and tokens:
+        with trace._lock:
+            trace.context_tokens_saved += int(tokens)
+
+
+def traced_node(name: str, fn, afn=None):
+    """
+    Wrap a graph node so each execution is timed. `fn` is a plain function or an
+    object with invoke/ainvoke such as ToolExecutor; `afn` is an optional async
+    twin of a plain function (used by app.ainvoke / app.astream instead of
+    running `fn` in a thread).
+    """
+    if hasattr(fn, "invoke"):
+        # Runnables need the graph's config (tool callbacks and runtime come from it)
+        def runnable_wrapper(state, config: RunnableConfig):
+            with span(name, kind="node"):
+                return fn.invoke(state, config)
+
+        async def arunnable_wrapper(state, config: RunnableConfig):
+            with span(name, kind="node"):
+                return await fn.ainvoke(state, config)
+
+        return RunnableLambda(runnable_wrapper, afunc=arunnable_wrapper, name=name)
+
+    @wraps(fn)
+    def wrapper(state):
+        with span(name, kind="node"):
+            return fn(state)
+
+    if afn is None:
+        return wrapper
+
+    async def awrapper(state):
+        with span(name, kind="node"):
+            return await afn(state)
+
+    return RunnableLambda(wrapper, afunc=awrapper, name=name)
+
+
+def traced_tool(name: str):
+    """Decorator for tool functions (sync or async): records one "tool" span per call."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, kind="tool"):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, kind="tool"):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def export_prometheus() -> str:
+    return REGISTRY.export_prometheus()
+
+
+def aggregate_file(path: str = TRACE_PATH) -> Registry:
+    """Rebuild histograms from a JSONL trace file (e.g. for offline export)."""
+    reg = Registry()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            for s in record.get("spans", []):
+                reg.observe_span(s["kind"], s["name"], s["ms"] / 1000.0)
+            reg.observe_run(record)
+    return reg
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate agent traces")
+    parser.add_argument("path", nargs="?", default=TRACE_PATH)
+    parser.add_argument("--prometheus", action="store_true", help="print Prometheus text format")
+    args = parser.parse_args()
+
+    reg = aggregate_file(args.path)
+    if args.prometheus:
+        print(reg.export_prometheus(), end="")
+    else:
+        for (kind, name), h in sorted(reg.spans.items()):
+            mean_ms = h.sum / h.count * 1000 if h.count else 0.0
+            print(f"{kind:<9} {name:<28} n={h.count:<6} mean={mean_ms:9.2f} ms")
+        print(f"runs={reg.counters['runs']} prompt_tokens={reg.counters['llm_prompt_tokens']} "
+              f"completion_tokens={reg.counters['llm_completion_tokens']} "
+              f"context_tokens_saved={reg.counters['context_tokens_saved']}")
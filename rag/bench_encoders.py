@@ -0,0 +1,126 @@
+"""
+Compare embedding backends on parity and throughput.
+
+The ONNX backends must be exported first (`python -m rag.encoders export`).
+Texts are the chunks of chunks_preview.jsonl (document encodes, as in
+build_index) plus short query-like prefixes of them (as in search_eda_kb).
+
+For every backend the script reports:
+  - sentences/sec per batch size, with and without length-sorted batching
+  - cosine similarity to the PyTorch vectors of the same texts (mean / min)
+  - recall@k of query -> chunk nearest neighbours vs. the PyTorch results
+
+    python -m rag.bench_encoders --texts 512 --batch-sizes 16,32,64 --threads 4
+"""
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+
+from rag.config import OUTPUT_DIR, EMBED_THREADS
+from rag.encoders import BACKENDS, make_encoder
+from rag.pipeline import iter_jsonl
+from rag.bench_vector_store import recall_at_k
+
+
+def load_texts(n: int):
+    """(documents, queries): chunk texts and their first ~80 chars."""
+    docs = [row["text"] for row in iter_jsonl(os.path.join(OUTPUT_DIR, "chunks_preview.jsonl"))]
+    if not docs:
+        raise SystemExit("No chunks found; run `python -m rag.ingest_data` first.")
+    docs = (docs * (n // len(docs) + 1))[:n]
+    return docs, [d[:80] for d in docs]
+
+
+def throughput(encoder, texts, batch_size: int, repeats: int = 2) -> float:
+    """Best-of-`repeats` sentences/sec."""
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        encoder.encode(texts, batch_size=batch_size)
+        best = min(best, time.perf_counter() - t0)
+    return round(len(texts) / best, 1)
+
+
+def top_k(query_vecs, doc_vecs, k: int):
+    scores = query_vecs @ doc_vecs.T
+    return [list(row) for row in np.argsort(-scores, axis=1)[:, :k]]
+
+
+def main(n_texts: int = 512, batch_sizes=(16, 32, 64), threads: int = EMBED_THREADS, k: int = 5, backends=BACKENDS):
+    docs, queries = load_texts(n_texts)
+    report = {"n_texts": len(docs), "threads": threads, "k": k, "backends": {}}
+    reference = None
+
+    for backend in backends:
+        try:
+            t0 = time.perf_counter()
+            encoder = make_encoder(backend, threads=threads)
+            load_s = time.perf_counter() - t0
+        except (ImportError, OSError, ValueError) as e:
+            report["backends"][backend] = {"error": str(e)}
+            continue
+
+        encoder.encode(queries[:8])  # warm-up
+        doc_vecs = np.asarray(encoder.encode(docs), dtype=np.float32)
+        row = {"load_s": round(load_s, 3), "sentences_per_s": {}}
+        if encoder.last_stats:
+            row["padding_waste_sorted"] = encoder.last_stats.get("padding_waste")
+        query_vecs = np.asarray(encoder.encode(queries), dtype=np.float32)
+
+        for bs in batch_sizes:
+            row["sentences_per_s"][f"bs{bs}"] = throughput(encoder, docs, bs)
+            if backend != "torch":  # sentence-transformers always sorts by length
+                encoder.sort_by_length = False
+                row["sentences_per_s"][f"bs{bs}_unsorted"] = throughput(encoder, docs, bs)
+                if bs == batch_sizes[-1] and encoder.last_stats:
+                    row["padding_waste_unsorted"] = encoder.last_stats.get("padding_waste")
+                encoder.sort_by_length = True
+
+        neighbours = top_k(query_vecs, doc_vecs, k)
+        if reference is None:
+            reference = {"backend": backend, "docs": doc_vecs, "queries": query_vecs, "neighbours": neighbours}
+        else:
+            cos = np.concatenate([
+                np.sum(doc_vecs * reference["docs"], axis=1),
+                np.sum(query_vecs * reference["queries"], axis=1),
+            ])
+            row["parity_vs"] = reference["backend"]
+            row["cosine_mean"] = round(float(cos.mean()), 6)
+            row["cosine_min"] = round(float(cos.min()), 6)
+            row[f"recall@{k}"] = recall_at_k(neighbours, reference["neighbours"])
+        report["backends"][backend] = row
+
+    out_path = os.path.join(OUTPUT_DIR, "encoder_bench.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    bs = f"bs{batch_sizes[-1]}"
+    print(f"{'backend':<10} {'sent/s':>8} {'unsorted':>9} {'cos mean':>9} {'cos min':>9} {'recall@' + str(k):>9}")
+    for name, r in report["backends"].items():
+        if "error" in r:
+            print(f"{name:<10} skipped: {r['error']}")
+            continue
+        sps = r["sentences_per_s"]
+        print(f"{name:<10} {sps[bs]:>8} {sps.get(bs + '_unsorted', '-')!s:>9} {r.get('cosine_mean', '-')!s:>9} "
+              f"{r.get('cosine_min', '-')!s:>9} {r.get(f'recall@{k}', '-')!s:>9}")
+    print(f"✅ Wrote benchmark to: {out_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends (parity + throughput)")
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--batch-sizes", default="16,32,64")
+    parser.add_argument("--threads", type=int, default=EMBED_THREADS, help="0 = library default")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    args = parser.parse_args()
+    main(
+        n_texts=args.texts,
+        batch_sizes=[int(b) for b in args.batch_sizes.split(",")],
+        threads=args.threads,
+        k=args.k,
+        backends=args.backends.split(","),
+    )
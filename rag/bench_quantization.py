@@ -0,0 +1,81 @@
+"""
+Compare full-precision vs float16 / int8 NumPy store search.
+
+Needs a built NumPy store (`python -m rag.build_index --backend numpy`).
+Each mode is written to a temporary copy of the store, then cold-opened and
+queried. Reports in-RAM search footprint, load time, latency and recall@k
+against the float32 exact results.
+
+    python -m rag.bench_quantization --k 5 --oversample 4
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+from rag import resources
+from rag.config import NUMPY_STORE_DIR, OUTPUT_DIR, QUANT_OVERSAMPLE
+from rag.vector_store import NumpyStore
+from rag.bench_vector_store import load_bench_queries, percentile_ms, time_queries, recall_at_k
+
+MODES = ["none", "float16", "int8"]
+
+
+def main(n_queries: int = 200, k: int = 5, oversample: int = QUANT_OVERSAMPLE):
+    if not os.path.exists(os.path.join(NUMPY_STORE_DIR, "manifest.json")):
+        raise SystemExit("No NumPy store found; run `python -m rag.build_index --backend numpy` first.")
+
+    query_embs = resources.encode(load_bench_queries(n_queries), batch_size=64).tolist()
+
+    report = {"n_queries": len(query_embs), "k": k, "oversample": oversample, "modes": {}}
+    truth = None
+    tmp_root = tempfile.mkdtemp(prefix="quant_bench_")
+    try:
+        for mode in MODES:
+            path = os.path.join(tmp_root, mode)
+            shutil.copytree(NUMPY_STORE_DIR, path)
+            NumpyStore(path, quantization="none").rebuild(mode)
+
+            t0 = time.perf_counter()
+            store = NumpyStore(path, quantization=mode, oversample=oversample)
+            load_s = time.perf_counter() - t0
+
+            store.query(query_embeddings=[query_embs[0]], n_results=k)  # warm-up
+            latencies, results = time_queries(store, query_embs, k)
+            if mode == "none":
+                truth = results
+
+            report["modes"][mode] = {
+                "count": store.count(),
+                "search_bytes": store.memory_bytes(),
+                "load_ms": round(load_s * 1000, 3),
+                "p50_ms": percentile_ms(latencies, 50),
+                "p95_ms": percentile_ms(latencies, 95),
+                "mean_ms": round(float(np.mean(latencies)) * 1000, 3),
+                f"recall@{k}": recall_at_k(results, truth),
+            }
+    finally:
+        shutil.rmtree(tmp_root, ignore_errors=True)
+
+    out_path = os.path.join(OUTPUT_DIR, "quantization_bench.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'mode':<8} {'search MB':>10} {'load ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'recall@' + str(k):>9}")
+    for mode, r in report["modes"].items():
+        mb = r["search_bytes"] / (1024 * 1024)
+        print(f"{mode:<8} {mb:>10.3f} {r['load_ms']:>9} {r['p50_ms']:>8} {r['p95_ms']:>8} {r[f'recall@{k}']!s:>9}")
+    print(f"✅ Wrote benchmark to: {out_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark quantized NumPy store search")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--oversample", type=int, default=QUANT_OVERSAMPLE)
+    args = parser.parse_args()
+    main(n_queries=args.queries, k=args.k, oversample=args.oversample)
@@ -0,0 +1,100 @@
+"""
+Compare vector store backends on query latency and recall.
+
+Both indexes must already be built from the same chunks:
+    python -m rag.build_index --backend chroma
+    python -m rag.build_index --backend numpy
+    python -m rag.bench_vector_store
+
+The NumPy store does exact search, so its top-k is used as ground truth for
+recall@k of the (approximate, HNSW) Chroma backend.
+"""
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+
+from rag import resources
+from rag.config import OUTPUT_DIR
+from rag.pipeline import iter_jsonl
+
+
+def percentile_ms(samples, p):
+    return round(float(np.percentile(samples, p)) * 1000, 3) if samples else None
+
+
+def time_queries(store, query_embs, k, where=None):
+    latencies, results = [], []
+    for emb in query_embs:
+        t0 = time.perf_counter()
+        res = store.query(query_embeddings=[emb], n_results=k, where=where)
+        latencies.append(time.perf_counter() - t0)
+        results.append(res["ids"][0])
+    return latencies, results
+
+
+def recall_at_k(results, truth):
+    scores = []
+    for got, exp in zip(results, truth):
+        if exp:
+            scores.append(len(set(got) & set(exp)) / len(exp))
+    return round(float(np.mean(scores)), 4) if scores else None
+
+
+def load_bench_queries(n_queries: int):
+    """Query texts taken from the chunk preview (first ~200 chars), so no network/data is needed."""
+    texts = []
+    for row in iter_jsonl(os.path.join(OUTPUT_DIR, "chunks_preview.jsonl")):
+        texts.append(row["text"][:200])
+    if not texts:
+        raise SystemExit("No chunks found; run `python -m rag.ingest_data` first.")
+    return (texts * (n_queries // len(texts) + 1))[:n_queries]
+
+
+def main(n_queries: int = 200, k: int = 5, topic: str = None):
+    texts = load_bench_queries(n_queries)
+    query_embs = resources.encode(texts, batch_size=64).tolist()
+    where = {"topic": topic} if topic else None
+
+    report = {"n_queries": len(texts), "k": k, "where": where, "backends": {}}
+    truth = None
+
+    for backend in ["numpy", "chroma"]:
+        t0 = time.perf_counter()
+        store = resources.get_store(backend)
+        open_s = time.perf_counter() - t0
+
+        store.query(query_embeddings=[query_embs[0]], n_results=k, where=where)  # warm-up
+        latencies, results = time_queries(store, query_embs, k, where)
+
+        if backend == "numpy":
+            truth = results
+
+        report["backends"][backend] = {
+            "count": store.count(),
+            "open_ms": round(open_s * 1000, 3),
+            "p50_ms": percentile_ms(latencies, 50),
+            "p95_ms": percentile_ms(latencies, 95),
+            "mean_ms": round(float(np.mean(latencies)) * 1000, 3),
+            f"recall@{k}": recall_at_k(results, truth),
+        }
+
+    out_path = os.path.join(OUTPUT_DIR, "vector_store_bench.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'backend':<8} {'count':>6} {'open ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'recall@' + str(k):>9}")
+    for name, r in report["backends"].items():
+        print(f"{name:<8} {r['count']:>6} {r['open_ms']:>9} {r['p50_ms']:>8} {r['p95_ms']:>8} {r[f'recall@{k}']!s:>9}")
+    print(f"✅ Wrote benchmark to: {out_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Chroma vs NumPy vector store")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--topic", default=None, help="optional topic filter, e.g. 'workflow'")
+    args = parser.parse_args()
+    main(n_queries=args.queries, k=args.k, topic=args.topic)
@@ -0,0 +1,366 @@
+"""
+Offline retrieval benchmark + recall regression check.
+
+Runs a query set (rag/bench_queries.json by default, optional per-query topic
+filter) against the configured vector store and reports:
+
+  - encode / search / end-to-end latency (p50 / p95 / p99)
+  - QPS under concurrency (thread pool)
+  - recall@k against brute-force exact search over the stored embeddings
+  - the same latency + recall@k per retrieval path (vector / lexical BM25 / hybrid RRF
+    / auto-routed, see rag.retrieve), if build_index wrote the lexical index; for
+    the lexical path recall@k is agreement with exact vector search, not relevance
+  - index build time (cold = no embedding cache, warm = cached) into a temp store
+  - peak RSS of the process
+
+Results go to outputs/benchmark/latest.json. If a baseline exists
+(outputs/benchmark/baseline.json) every metric is compared against it and
+regressions beyond the tolerances below are listed.
+
+    python -m rag.benchmark                     # run + compare
+    python -m rag.benchmark --save-baseline     # run + store as new baseline
+    python -m rag.benchmark --fail-on-regression
+"""
+import os
+
+# never hit the network for model files during a benchmark
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from rag import resources
+from rag.config import BASE_DIR, OUTPUT_DIR, VECTOR_STORE_BACKEND, EMBED_MODEL_ID
+from rag.embed_cache import EmbeddingCache
+from rag.pipeline import iter_jsonl, index_rows
+from rag.retrieve import run_queries
+from rag.vector_store import NumpyStore, top_k, where_mask
+
+BENCH_DIR = os.path.join(OUTPUT_DIR, "benchmark")
+DEFAULT_QUERIES = os.path.join(BASE_DIR, "rag", "bench_queries.json")
+ROUTES = ("vector", "lexical", "hybrid", "auto")
+
+# metric -> (direction, relative tolerance); "lower"/"higher" is the better direction
+TOLERANCES = {
+    "latency.end_to_end.p50_ms": ("lower", 0.15),
+    "latency.end_to_end.p95_ms": ("lower", 0.25),
+    "latency.search.p50_ms": ("lower", 0.15),
+    "latency.search.p95_ms": ("lower", 0.25),
+    "latency.encode.p50_ms": ("lower", 0.15),
+    "recall_at_k": ("higher", 0.01),
+    "routes.auto.latency.p50_ms": ("lower", 0.15),
+    "routes.auto.recall_at_k": ("higher", 0.02),
+    "build.cold_s": ("lower", 0.25),
+    "build.warm_s": ("lower", 0.25),
+    "peak_rss_mb": ("lower", 0.20),
+}
+
+
+def _pct(samples, p):
+    return round(float(np.percentile(samples, p)) * 1000, 3) if samples else None
+
+
+def _latency_summary(samples):
+    return {
+        "p50_ms": _pct(samples, 50),
+        "p95_ms": _pct(samples, 95),
+        "p99_ms": _pct(samples, 99),
+        "mean_ms": round(float(np.mean(samples)) * 1000, 3) if samples else None,
+    }
+
+
+def _peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+def load_query_set(path: str = DEFAULT_QUERIES):
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    return [
+        {"query": it["query"], "where": {"topic": it["topic"]} if it.get("topic") else None}
+        for it in items
+    ]
+
+
+# -----------------------------
+# Ground truth
+# -----------------------------
+def exact_results(store, query_embs, queries, k):
+    """Brute-force top-k ids over every stored embedding (ground truth for recall)."""
+    ids, matrix, metas = store.export()
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = matrix / norms
+
+    q = np.asarray(query_embs, dtype=np.float32)
+    q = q / np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+
+    truth = []
+    for qi, query in enumerate(queries):
+        scores = matrix @ q[qi]
+        if query["where"]:
+            scores[~where_mask(metas, query["where"])] = -np.inf
+        n_valid = int(np.isfinite(scores).sum())
+        kk = min(k, n_valid)
+        if kk <= 0:
+            truth.append([])
+            continue
+        rows, _ = top_k(scores[None, :], kk)
+        truth.append([ids[r] for r in rows[0]])
+    return truth
+
+
+def recall_at_k(results, truth):
+    scores = [len(set(got) & set(exp)) / len(exp) for got, exp in zip(results, truth) if exp]
+    return round(float(np.mean(scores)), 4) if scores else None
+
+
+# -----------------------------
+# Measurements
+# -----------------------------
+def measure_latency(store, queries, k, repeats):
+    encode_s, search_s, e2e_s, results = [], [], [], []
+    for _ in range(repeats):
+        results = []
+        for q in queries:
+            t0 = time.perf_counter()
+            emb = resources.encode([q["query"]]).tolist()
+            t1 = time.perf_counter()
+            res = store.query(query_embeddings=emb, n_results=k, where=q["where"])
+            t2 = time.perf_counter()
+            encode_s.append(t1 - t0)
+            search_s.append(t2 - t1)
+            e2e_s.append(t2 - t0)
+            results.append(res["ids"][0])
+    return {
+        "encode": _latency_summary(encode_s),
+        "search": _latency_summary(search_s),
+        "end_to_end": _latency_summary(e2e_s),
+    }, results
+
+
+def measure_routes(store, queries, k, repeats, truth):
+    """
+    Uncached run_queries() latency and recall@k for each retrieval mode; "auto" is
+    also split by the path the router picked for each query.
+    """
+    lexical = resources.get_lexical_index(store)
+    if lexical is None:
+        return {}
+    picked = [lexical.route(q["query"]) for q in queries]
+    out = {}
+    for mode in ROUTES:
+        samples, results = [[] for _ in queries], []
+        for _ in range(repeats):
+            results = []
+            for qi, q in enumerate(queries):
+                t0 = time.perf_counter()
+                hits = run_queries(store, [{"query": q["query"], "where": q["where"], "k": k, "mode": mode}],
+                                   use_cache=False)[0]
+                samples[qi].append(time.perf_counter() - t0)
+                results.append([h["id"] for h in hits])
+        out[mode] = {
+            "latency": _latency_summary([x for per_query in samples for x in per_query]),
+            "recall_at_k": recall_at_k(results, truth),
+        }
+        if mode == "auto":
+            out[mode]["by_route"] = {
+                route: {
+                    "queries": picked.count(route),
+                    "latency": _latency_summary([x for qi in range(len(queries)) if picked[qi] == route
+                                                 for x in samples[qi]]),
+                    "recall_at_k": recall_at_k([r for r, p in zip(results, picked) if p == route],
+                                               [t for t, p in zip(truth, picked) if p == route]),
+                }
+                for route in sorted(set(picked))
+            }
+    return out
+
+
+def measure_qps(store, queries, k, concurrency, duration_s):
+    """Queries/sec of uncached run_queries() calls from `concurrency` threads."""
+    stop = time.perf_counter() + duration_s
+    counter = {"n": 0}
+    lock = threading.Lock()
+
+    def worker(offset):
+        i = offset
+        while time.perf_counter() < stop:
+            q = queries[i % len(queries)]
+            run_queries(store, [{"query": q["query"], "where": q["where"], "k": k}], use_cache=False)
+            i += 1
+            with lock:
+                counter["n"] += 1
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    return round(counter["n"] / elapsed, 2)
+
+
+def measure_build(chunks_path):
+    """Time a full build into a temporary NumPy store, cold (empty embedding cache) then warm."""
+    tmp = tempfile.mkdtemp(prefix="bench_build_")
+    out = {}
+    try:
+        cache = EmbeddingCache(path=os.path.join(tmp, "emb.sqlite3"))
+        try:
+            for label in ["cold", "warm"]:
+                store = NumpyStore(path=os.path.join(tmp, f"store_{label}"))
+                t0 = time.perf_counter()
+                stats = index_rows(iter_jsonl(chunks_path), store, cache)
+                store.flush()
+                out[f"{label}_s"] = round(time.perf_counter() - t0, 4)
+                out["chunks"] = stats["seen"]
+        finally:
+            cache.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return out
+
+
+# -----------------------------
+# Baseline comparison
+# -----------------------------
+def _get(d, dotted):
+    for part in dotted.split("."):
+        if not isinstance(d, dict) or part not in d:
+            return None
+        d = d[part]
+    return d
+
+
+def compare(current: dict, baseline: dict) -> dict:
+    """Per-metric delta vs baseline; `regressions` lists metrics worse than their tolerance."""
+    out = {"metrics": {}, "regressions": []}
+    mismatched = [
+        key for key in ("backend", "model", "k", "n_queries")
+        if current.get("config", {}).get(key) != baseline.get("config", {}).get(key)
+    ]
+    if mismatched:
+        # numbers are still reported, but they are not comparable like-for-like
+        out["config_mismatch"] = mismatched
+    for metric, (direction, tol) in TOLERANCES.items():
+        cur, base = _get(current, metric), _get(baseline, metric)
+        if cur is None or base is None:
+            continue
+        delta = (cur - base) / base if base else 0.0
+        worse = delta > tol if direction == "lower" else delta < -tol
+        out["metrics"][metric] = {"baseline": base, "current": cur, "delta_pct": round(delta * 100, 2)}
+        if worse:
+            out["regressions"].append(metric)
+    return out
+
+
+def main(
+    queries_path: str = DEFAULT_QUERIES,
+    backend: str = VECTOR_STORE_BACKEND,
+    k: int = 5,
+    repeats: int = 5,
+    concurrency=(1, 4, 8),
+    qps_seconds: float = 3.0,
+    build: bool = True,
+    save_baseline: bool = False,
+):
+    queries = load_query_set(queries_path)
+
+    t0 = time.perf_counter()
+    resources.warm_up(collection=False)
+    store = resources.get_store(backend)
+    warm_up_s = time.perf_counter() - t0
+
+    latency, results = measure_latency(store, queries, k, repeats)
+    query_embs = resources.encode([q["query"] for q in queries])
+    truth = exact_results(store, query_embs, queries, k)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "env": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "config": {"backend": backend, "model": EMBED_MODEL_ID, "k": k, "n_queries": len(queries), "repeats": repeats},
+        "index_size": store.count(),
+        "warm_up_s": round(warm_up_s, 4),
+        "latency": latency,
+        "recall_at_k": recall_at_k(results, truth),
+        "routes": measure_routes(store, queries, k, repeats, truth),
+        "qps": {str(c): measure_qps(store, queries, k, c, qps_seconds) for c in concurrency},
+    }
+    if build:
+        report["build"] = measure_build(os.path.join(OUTPUT_DIR, "chunks_preview.jsonl"))
+    report["peak_rss_mb"] = _peak_rss_mb()
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    baseline_path = os.path.join(BENCH_DIR, "baseline.json")
+    if os.path.exists(baseline_path) and not save_baseline:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f))
+
+    with open(os.path.join(BENCH_DIR, "latest.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    if save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    e2e = report["latency"]["end_to_end"]
+    print(f"backend={backend} chunks={report['index_size']} queries={len(queries)} k={k}")
+    print(f"end-to-end p50/p95/p99 ms: {e2e['p50_ms']} / {e2e['p95_ms']} / {e2e['p99_ms']}")
+    print(f"recall@{k}: {report['recall_at_k']}   qps: {report['qps']}   peak RSS MB: {report['peak_rss_mb']}")
+    for mode, r in report["routes"].items():
+        print(f"  {mode:<8} p50/p95 ms: {r['latency']['p50_ms']} / {r['latency']['p95_ms']}   recall@{k}: {r['recall_at_k']}")
+        for route, b in r.get("by_route", {}).items():
+            print(f"    -> {route:<8} x{b['queries']:<3} p50 ms: {b['latency']['p50_ms']}   recall@{k}: {b['recall_at_k']}")
+    if "build" in report:
+        print(f"build s (cold / warm): {report['build']['cold_s']} / {report['build']['warm_s']}")
+
+    if report.get("comparison", {}).get("config_mismatch"):
+        print(f"⚠️  Baseline was recorded with a different {', '.join(report['comparison']['config_mismatch'])}")
+    regressions = report.get("comparison", {}).get("regressions", [])
+    if regressions:
+        print("❌ Regressions vs baseline:")
+        for m in regressions:
+            r = report["comparison"]["metrics"][m]
+            print(f"  {m}: {r['baseline']} -> {r['current']} ({r['delta_pct']:+}%)")
+    elif "comparison" in report:
+        print("✅ No regressions vs baseline")
+    print(f"✅ Wrote results to: {os.path.join(BENCH_DIR, 'latest.json')}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark and recall regression check")
+    parser.add_argument("--queries", default=DEFAULT_QUERIES, help="JSON list of {query, topic}")
+    parser.add_argument("--backend", choices=["chroma", "numpy", "snapshot"], default=VECTOR_STORE_BACKEND)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--concurrency", default="1,4,8", help="comma-separated thread counts for the QPS test")
+    parser.add_argument("--qps-seconds", type=float, default=3.0)
+    parser.add_argument("--no-build", action="store_true", help="skip the index build timing")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    rep = main(
+        queries_path=args.queries,
+        backend=args.backend,
+        k=args.k,
+        repeats=args.repeats,
+        concurrency=tuple(int(c) for c in args.concurrency.split(",") if c),
+        qps_seconds=args.qps_seconds,
+        build=not args.no_build,
+        save_baseline=args.save_baseline,
+    )
+    if args.fail_on_regression and rep.get("comparison", {}).get("regressions"):
+        sys.exit(1)
@@ -1,37 +1,123 @@
-import os, json
-import chromadb
-from sentence_transformers import SentenceTransformer
-from rag.config import OUTPUT_DIR, CHROMA_DIR, COLLECTION_NAME, EMBED_MODEL_NAME
+import os, argparse
+from rag import resources
+from rag.config import (
+    OUTPUT_DIR, CHROMA_DIR, COLLECTION_NAME, KB_DIR, VECTOR_STORE_BACKEND,
+    EMBED_BATCH_SIZE, WRITE_BATCH_SIZE, PIPELINE_QUEUE_SIZE, INGEST_WORKERS, LEXICAL_INDEX_DIR,
+    SNAPSHOT_ON_BUILD, SNAPSHOT_BUILD_BACKEND,
+)
+from rag.embed_cache import EmbeddingCache
+from rag.lexical import LexicalIndexBuilder
+from rag.pipeline import iter_chunks, iter_jsonl, index_rows
 
-def main():
-    os.makedirs(CHROMA_DIR, exist_ok=True)
 
-    client = chromadb.PersistentClient(path=CHROMA_DIR)
-    collection = client.get_or_create_collection(name=COLLECTION_NAME)
+def main(
+    full: bool = False,
+    from_kb: bool = False,
+    embed_batch_size: int = EMBED_BATCH_SIZE,
+    write_batch_size: int = WRITE_BATCH_SIZE,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    workers: int = INGEST_WORKERS,
+    backend: str = VECTOR_STORE_BACKEND,
+    snapshot: bool = SNAPSHOT_ON_BUILD,
+):
+    if backend == "snapshot":
+        # snapshots are read-only: build the staging store, then publish it below
+        backend, snapshot = SNAPSHOT_BUILD_BACKEND, True
 
-    model = SentenceTransformer(EMBED_MODEL_NAME)
+    if backend == "chroma":
+        os.makedirs(CHROMA_DIR, exist_ok=True)
 
-    file_path = os.path.join(OUTPUT_DIR, "chunks_preview.jsonl")
+    if backend == "chroma" and not full:
+        col = resources.get_collection(create=True)
+        if (col.metadata or {}).get("hnsw:space") != "cosine":
+            # collections built before the space was set use L2; distances must match the NumPy store
+            print("⚠️  Chroma collection uses L2 distance; rebuilding it with cosine distance")
+            full = True
 
-    docs, ids, metas = [], [], []
+    if full and backend == "chroma":
+        # Drop and recreate so stale ids / embeddings can't survive a full rebuild
+        client = resources.get_client()
+        try:
+            client.delete_collection(name=COLLECTION_NAME)
+        except Exception:
+            pass
+        resources.reset_collection_cache()
 
-    with open(file_path, "r", encoding="utf-8") as f:
-        for line in f:
-            row = json.loads(line)
-            docs.append(row["text"])
-            ids.append(row["id"])
-            metas.append(row["metadata"])
+    store = resources.get_store(backend, create=True)
+    if full:
+        store.reset()
 
-    embeddings = model.encode(docs, show_progress_bar=True).tolist()
+    # Only (id -> hash) of what is already indexed is held in memory, never the texts
+    indexed = store.indexed_hashes()
 
-    collection.add(
-        documents=docs,
-        embeddings=embeddings,
-        ids=ids,
-        metadatas=metas
-    )
+    if from_kb:
+        rows = iter_chunks(KB_DIR, workers=workers)
+    else:
+        rows = iter_jsonl(os.path.join(OUTPUT_DIR, "chunks_preview.jsonl"))
+
+    # the BM25 index sees every streamed chunk (changed or not), so it always matches the vector ids
+    lexical = LexicalIndexBuilder()
+    rows = lexical.tap(rows)
+
+    cache = EmbeddingCache()
+    try:
+        stats = index_rows(
+            rows,
+            store,
+            cache,
+            indexed=indexed,
+            embed_batch_size=embed_batch_size,
+            write_batch_size=write_batch_size,
+            queue_size=queue_size,
+        )
+    finally:
+        cache.close()
+
+    stale_ids = [cid for cid in indexed if cid not in stats["seen_ids"]]
+    for i in range(0, len(stale_ids), write_batch_size):
+        store.delete(stale_ids[i:i + write_batch_size])
+    store.flush()
+    lex_stats = lexical.save(LEXICAL_INDEX_DIR)
 
-    print("✅ Chroma DB built successfully")
+    snap = None
+    if snapshot:
+        from rag import snapshot as snapshots
+        # readers of the "snapshot" backend switch to it atomically on their next query
+        snap = snapshots.publish(store)
+
+    if full or stats["upserted"] or stale_ids or (snap and snap["published"]):
+        # lets long-running readers drop cached results for the old index
+        resources.bump_index_version()
+
+    print(
+        f"✅ {backend} index up to date: {stats['upserted']} upserted ({stats['encoded']} encoded, "
+        f"{stats['upserted'] - stats['encoded']} from cache), {len(stale_ids)} deleted, "
+        f"{stats['seen'] - stats['upserted']} unchanged"
+    )
+    if snap:
+        state = "published" if snap["published"] else "unchanged"
+        print(f"✅ snapshot {snap['version']} {state} ({snap['count']} chunks, {len(snap['removed'])} old removed)")
+    print(f"✅ lexical index: {lex_stats['count']} chunks, {lex_stats['terms']} terms, {lex_stats['postings']} postings")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build / update the vector index")
+    parser.add_argument("--full", action="store_true", help="drop the index and rebuild it from scratch")
+    parser.add_argument("--from-kb", action="store_true", help="stream chunks straight from knowledge_base/ instead of chunks_preview.jsonl")
+    parser.add_argument("--embed-batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--write-batch-size", type=int, default=WRITE_BATCH_SIZE)
+    parser.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE, help="max encoded batches waiting for the writer")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="ingest processes when using --from-kb")
+    parser.add_argument("--backend", choices=["chroma", "numpy", "snapshot"], default=VECTOR_STORE_BACKEND,
+                        help=f"store to build; snapshot = build {SNAPSHOT_BUILD_BACKEND} and publish it")
+    parser.add_argument("--no-snapshot", action="store_true", help="don't publish a snapshot of the built store")
+    args = parser.parse_args()
+    main(
+        full=args.full,
+        from_kb=args.from_kb,
+        embed_batch_size=args.embed_batch_size,
+        write_batch_size=args.write_batch_size,
+        queue_size=args.queue_size,
+        workers=args.workers,
+        backend=args.backend,
+        snapshot=not args.no_snapshot,
+    )
@@ -13,10 +13,94 @@ CHROMA_DIR = os.path.join(BASE_DIR, "chroma_store")
 
 COLLECTION_NAME = "eda_knowledge"
 
+# Vector store backend used by build_index / retrieve / agent tools: "chroma", "numpy" or
+# "snapshot" (read-only: serves the current snapshot published by build_index, see rag/snapshot.py)
+VECTOR_STORE_BACKEND = os.environ.get("DATA_INSIGHT_VECTOR_STORE", "chroma")
+
+# In-process exact-search store (memory-mapped NumPy matrix)
+NUMPY_STORE_DIR = os.path.join(BASE_DIR, "numpy_store")
+
+# Optional compressed search copy of the vectors: "none", "float16" or "int8".
+# Candidates found on the compact copy are re-scored at full precision from disk.
+NUMPY_STORE_QUANTIZATION = "none"
+QUANT_OVERSAMPLE = 4  # candidates re-scored = top_k * QUANT_OVERSAMPLE
+
 # Free local embedding model
 EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 
 # Chunk settings
 MAX_CHARS = 1200
 OVERLAP_CHARS = 200
-MIN_CHUNK_CHARS = 200
\ No newline at end of file
+MIN_CHUNK_CHARS = 200
+
+# Store chunk text in Chroma. If False, only char offsets are stored and the
+# text is read back from knowledge_base/ at query time.
+STORE_CHUNK_TEXT = True
+
+# Local caches (embeddings keyed by chunk hash, etc.)
+CACHE_DIR = os.path.join(BASE_DIR, ".cache")
+EMBED_CACHE_PATH = os.path.join(CACHE_DIR, "embeddings.sqlite3")
+
+# Per-file / per-chunk content hashes written by ingest_data
+MANIFEST_PATH = os.path.join(OUTPUT_DIR, "index_manifest.json")
+
+# Streaming index pipeline
+EMBED_BATCH_SIZE = 64        # chunks per model.encode call
+WRITE_BATCH_SIZE = 256       # chunks per Chroma upsert
+PIPELINE_QUEUE_SIZE = 4      # encoded batches allowed to wait for the writer (backpressure)
+
+# Parallel ingestion (1 = serial; >1 = process pool for parsing + chunking)
+INGEST_WORKERS = 1
+
+# Retrieval caches (query embeddings / query results)
+QUERY_EMBED_CACHE_SIZE = 1024
+QUERY_RESULT_CACHE_SIZE = 512
+QUERY_CACHE_TTL_S = 3600
+
+# Bumped by build_index whenever the collection changes (invalidates result caches)
+INDEX_VERSION_PATH = os.path.join(CHROMA_DIR, "INDEX_VERSION")
+
+# Warm worker daemon (python -m rag.warm_worker start) that keeps the encoder loaded.
+# "auto" = use it when its socket exists, "never" = always load the model in-process,
+# "always" = require it (falls back to in-process loading if it can't be reached).
+USE_WARM_WORKER = os.environ.get("DATA_INSIGHT_WARM_WORKER", "auto")
+WARM_WORKER_SOCKET = os.environ.get("DATA_INSIGHT_WARM_WORKER_SOCKET", os.path.join(CACHE_DIR, "warm_worker.sock"))
+WARM_WORKER_TIMEOUT_S = 30.0
+
+# Async serving: query encodes from concurrent sessions arriving within this window
+# are merged into one encode call (see rag/encode_batcher.py)
+ENCODE_BATCH_WINDOW_MS = 5.0
+ENCODE_MAX_BATCH = 64
+
+# Post-retrieval selection (rag/select.py): when a character budget is given, this many
+# candidates are fetched, overlapping chunks of one file are merged and MMR picks the rest
+SELECT_CANDIDATES = 12
+MMR_LAMBDA = 0.7                 # 1.0 = relevance only, 0.0 = diversity only
+CHARS_PER_TOKEN = 4              # rough token estimate (no tokenizer dependency)
+
+# Embedding backend (rag/encoders.py): "torch" (SentenceTransformer), "onnx" or "onnx-int8".
+# The ONNX backends need a one-time export: python -m rag.encoders export
+EMBED_BACKEND = os.environ.get("DATA_INSIGHT_EMBED_BACKEND", "torch")
+EMBED_THREADS = int(os.environ.get("DATA_INSIGHT_EMBED_THREADS", "0"))  # 0 = library default
+EMBED_SORT_BY_LENGTH = True      # batch texts of similar token length (less padding)
+ONNX_MODEL_DIR = os.path.join(CACHE_DIR, "onnx", EMBED_MODEL_NAME.replace("/", "__"))
+# Vectors differ slightly between backends, so caches of embeddings / answers are keyed by this.
+# Rebuild the index after switching backends so documents and queries come from the same encoder.
+EMBED_MODEL_ID = EMBED_MODEL_NAME if EMBED_BACKEND == "torch" else f"{EMBED_MODEL_NAME}@{EMBED_BACKEND}"
+
+# Lexical retrieval (rag/lexical.py): BM25 inverted index written by build_index next to the vectors.
+# "auto" answers short keyword queries from BM25 alone (no encode) and fuses BM25 + vector results
+# with reciprocal rank fusion otherwise; "vector", "lexical" and "hybrid" force one path.
+LEXICAL_INDEX_DIR = os.path.join(BASE_DIR, "lexical_index")
+RETRIEVAL_MODE = os.environ.get("DATA_INSIGHT_RETRIEVAL_MODE", "auto")
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60                       # rank damping of reciprocal rank fusion
+LEXICAL_ROUTE_MAX_TERMS = 3      # longer queries (or questions) always take the hybrid path
+
+# Versioned index snapshots (rag/snapshot.py): build_index publishes an immutable single-file
+# copy of the built store and switches SNAPSHOT_DIR/CURRENT to it; "snapshot" readers hot-reload.
+SNAPSHOT_DIR = os.environ.get("DATA_INSIGHT_SNAPSHOT_DIR", os.path.join(BASE_DIR, "snapshots"))
+SNAPSHOT_KEEP = int(os.environ.get("DATA_INSIGHT_SNAPSHOT_KEEP", "3"))  # newest snapshots kept on publish
+SNAPSHOT_ON_BUILD = True
+SNAPSHOT_BUILD_BACKEND = "numpy"  # store build_index writes when VECTOR_STORE_BACKEND="snapshot"
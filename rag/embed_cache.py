@@ -0,0 +1,68 @@
+"""
+Persistent embedding cache keyed by (model name, chunk content hash).
+
+Used by build_index so that re-indexing after a small KB edit only encodes
+the chunks whose text actually changed.
+"""
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+from rag.config import EMBED_CACHE_PATH, EMBED_MODEL_ID
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = EMBED_CACHE_PATH, model_name: str = EMBED_MODEL_ID):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " hash TEXT NOT NULL,"
+            " dim INTEGER NOT NULL,"
+            " vec BLOB NOT NULL,"
+            " PRIMARY KEY (model, hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, hashes):
+        """Return {hash: float32 vector} for the hashes present in the cache."""
+        found = {}
+        hashes = list(dict.fromkeys(hashes))
+        with self._lock:
+            # stay well below SQLite's bound-parameter limit
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT hash, dim, vec FROM embeddings WHERE model = ? AND hash IN ({marks})",
+                    [self.model_name, *batch],
+                )
+                for h, dim, blob in rows:
+                    vec = np.frombuffer(blob, dtype=np.float32)
+                    if vec.shape[0] == dim:
+                        found[h] = vec
+        return found
+
+    def put_many(self, hashes, vectors):
+        """Store vectors (any float array-like, one row per hash)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rows = [
+            (self.model_name, h, int(v.shape[0]), v.tobytes())
+            for h, v in zip(hashes, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, dim, vec) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
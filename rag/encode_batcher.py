@@ -0,0 +1,116 @@
+"""
+Asyncio micro-batcher for query encodes.
+
+When several agent sessions are served from one event loop, each
+search_eda_kb call would otherwise run its own model.encode() and queue up
+behind the encode lock. The batcher collects encode requests that arrive
+within a short window (ENCODE_BATCH_WINDOW_MS) and runs them as one batch in
+a worker thread, so the event loop never blocks and the encoder sees a few
+large batches instead of many single-query calls.
+
+    batcher = get_batcher()                     # one per event loop
+    vectors = await batcher.encode(["how to detect outliers?"])
+"""
+import time
+import asyncio
+import weakref
+
+from rag.config import ENCODE_BATCH_WINDOW_MS, ENCODE_MAX_BATCH
+
+
+class EncodeBatcher:
+    def __init__(self, encode_fn=None, window_ms: float = ENCODE_BATCH_WINDOW_MS, max_batch: int = ENCODE_MAX_BATCH):
+        if encode_fn is None:
+            from rag import resources
+            encode_fn = resources.encode
+        self.encode_fn = encode_fn
+        self.window_s = window_ms / 1000.0
+        self.max_batch = max_batch
+
+        self._pending = []   # (texts, future)
+        self._pending_texts = 0
+        self._timer = None
+        self._tasks = set()  # in-flight batches (the loop only keeps weak references to tasks)
+
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self.encode_seconds = 0.0
+
+    async def encode(self, texts):
+        """Encode `texts` (list of str); returns a list of embedding lists in the same order."""
+        texts = list(texts)
+        if not texts:
+            return []
+
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((texts, fut))
+        self._pending_texts += len(texts)
+        self.requests += 1
+
+        if self._pending_texts >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_s, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        pending, self._pending, self._pending_texts = self._pending, [], 0
+        task = asyncio.get_running_loop().create_task(self._run(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, pending):
+        """Encode one batch; every waiter gets its vectors, the error, or is cancelled with the batch."""
+        all_texts = [t for texts, _ in pending for t in texts]
+        start = time.perf_counter()
+        try:
+            vectors = await asyncio.to_thread(self.encode_fn, all_texts)
+            vectors = vectors.tolist() if hasattr(vectors, "tolist") else [list(v) for v in vectors]
+            if len(vectors) != len(all_texts):
+                raise ValueError(f"encoder returned {len(vectors)} vectors for {len(all_texts)} texts")
+        except asyncio.CancelledError:
+            for _, fut in pending:
+                fut.cancel()
+            raise
+        except Exception as e:
+            for _, fut in pending:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        self.encode_seconds += time.perf_counter() - start
+        self.batches += 1
+        self.texts += len(all_texts)
+
+        offset = 0
+        for texts, fut in pending:
+            if not fut.done():
+                fut.set_result(vectors[offset: offset + len(texts)])
+            offset += len(texts)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "texts": self.texts,
+            "mean_batch": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "encode_seconds": round(self.encode_seconds, 4),
+        }
+
+
+_batchers = weakref.WeakKeyDictionary()  # event loop -> EncodeBatcher
+
+
+def get_batcher() -> EncodeBatcher:
+    """Shared batcher of the running event loop (futures can't cross loops)."""
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(loop)
+    if batcher is None:
+        batcher = _batchers[loop] = EncodeBatcher()
+    return batcher
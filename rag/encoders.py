@@ -0,0 +1,252 @@
+"""
+Embedding backends behind one encode() interface.
+
+    torch       stock SentenceTransformer (PyTorch)
+    onnx        the same model exported to ONNX, run with ONNX Runtime
+    onnx-int8   the ONNX export with dynamically int8-quantized weights
+
+The ONNX backends only need onnxruntime + tokenizers at query time (no torch),
+and run mean pooling + L2 normalization in NumPy, like the model's own
+sentence-transformers pipeline. Export once (needs torch + sentence-transformers):
+
+    python -m rag.encoders export            # writes ONNX_MODEL_DIR (fp32 + int8)
+    DATA_INSIGHT_EMBED_BACKEND=onnx-int8 python -m rag.retrieve
+
+All backends encode in length-sorted batches (sentence-transformers does this
+internally for torch), so each batch is padded to a similar length instead of
+the longest text of the whole call. Compare parity and throughput with
+`python -m rag.bench_encoders`.
+"""
+import os
+import json
+import argparse
+
+import numpy as np
+
+from rag.config import (
+    EMBED_MODEL_NAME,
+    EMBED_BACKEND,
+    EMBED_BATCH_SIZE,
+    EMBED_THREADS,
+    EMBED_SORT_BY_LENGTH,
+    ONNX_MODEL_DIR,
+)
+
+BACKENDS = ["torch", "onnx", "onnx-int8"]
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model.int8.onnx"}
+META_FILE = "encoder.json"
+
+
+class Encoder:
+    """Common settings + the SentenceTransformer-compatible encode() signature."""
+
+    backend = "base"
+
+    def __init__(self, model_name: str = EMBED_MODEL_NAME, batch_size: int = EMBED_BATCH_SIZE,
+                 threads: int = EMBED_THREADS, sort_by_length: bool = EMBED_SORT_BY_LENGTH):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.threads = threads
+        self.sort_by_length = sort_by_length
+        self.last_stats = {}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        raise NotImplementedError
+
+    def encode(self, texts, batch_size: int = None, normalize_embeddings: bool = True,
+               show_progress_bar: bool = False, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        """float32 array (n, dim) of unit vectors; a single string gives a 1-D vector."""
+        raise NotImplementedError
+
+
+class TorchEncoder(Encoder):
+    """The stock SentenceTransformer (it sorts by length internally)."""
+
+    backend = "torch"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        from sentence_transformers import SentenceTransformer
+
+        if self.threads:
+            import torch
+            torch.set_num_threads(self.threads)
+        self.model = SentenceTransformer(self.model_name, device="cpu")
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size: int = None, normalize_embeddings: bool = True,
+               show_progress_bar: bool = False, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=batch_size or self.batch_size,
+            normalize_embeddings=normalize_embeddings,
+            show_progress_bar=show_progress_bar,
+            convert_to_numpy=True,
+        )
+
+
+class OnnxEncoder(Encoder):
+    """ONNX Runtime session + fast tokenizer + NumPy mean pooling."""
+
+    def __init__(self, backend: str = "onnx", model_dir: str = ONNX_MODEL_DIR, **kwargs):
+        super().__init__(**kwargs)
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.backend = backend
+        path = os.path.join(model_dir, ONNX_FILES[backend])
+        meta_path = os.path.join(model_dir, META_FILE)
+        if not os.path.exists(path) or not os.path.exists(meta_path):
+            raise FileNotFoundError(f"No {backend} export in {model_dir}; run `python -m rag.encoders export` first.")
+        with open(meta_path, "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta["model"] != self.model_name:
+            raise ValueError(f"{model_dir} holds {self.meta['model']!r}, not {self.model_name!r}")
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads:
+            opts.intra_op_num_threads = self.threads
+            opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.meta["max_seq_length"])
+        self.tokenizer.no_padding()
+        self.pad_id = self.meta.get("pad_token_id", 0)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.meta["dim"]
+
+    def _run(self, encodings) -> np.ndarray:
+        lengths = [len(e.ids) for e in encodings]
+        width = max(lengths)
+        ids = np.full((len(encodings), width), self.pad_id, dtype=np.int64)
+        mask = np.zeros((len(encodings), width), dtype=np.int64)
+        types = np.zeros((len(encodings), width), dtype=np.int64)
+        for row, (e, n) in enumerate(zip(encodings, lengths)):
+            ids[row, :n] = e.ids
+            mask[row, :n] = 1
+            types[row, :n] = e.type_ids
+        feeds = {"input_ids": ids, "attention_mask": mask, "token_type_ids": types}
+        hidden = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+
+        # mean pooling over real tokens (what the model's Pooling module does)
+        m = mask[:, :, None].astype(np.float32)
+        return (hidden * m).sum(axis=1) / np.maximum(m.sum(axis=1), 1e-9)
+
+    def encode(self, texts, batch_size: int = None, normalize_embeddings: bool = True,
+               show_progress_bar: bool = False, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        if isinstance(texts, str):
+            return self.encode([texts], batch_size=batch_size, normalize_embeddings=normalize_embeddings)[0]
+        texts = list(texts)
+        out = np.zeros((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        if not texts:
+            return out
+
+        encodings = self.tokenizer.encode_batch(texts)
+        lengths = np.array([len(e.ids) for e in encodings])
+        order = np.argsort(-lengths, kind="stable") if self.sort_by_length else np.arange(len(texts))
+        bs = batch_size or self.batch_size
+        padded = 0
+        for start in range(0, len(order), bs):
+            idx = order[start:start + bs]
+            out[idx] = self._run([encodings[i] for i in idx])
+            padded += int(lengths[idx].max()) * len(idx)
+
+        if normalize_embeddings or self.meta.get("normalize", True):
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        self.last_stats = {"tokens": int(lengths.sum()), "padded_tokens": padded,
+                           "padding_waste": round(1.0 - float(lengths.sum()) / padded, 4) if padded else 0.0}
+        return out
+
+
+def make_encoder(backend: str = EMBED_BACKEND, **kwargs) -> Encoder:
+    if backend == "torch":
+        return TorchEncoder(**kwargs)
+    if backend in ONNX_FILES:
+        return OnnxEncoder(backend=backend, **kwargs)
+    raise ValueError(f"Unknown embedding backend: {backend!r} (expected one of {BACKENDS})")
+
+
+# -----------------------------
+# Export (torch -> ONNX -> int8)
+# -----------------------------
+def export_onnx(model_name: str = EMBED_MODEL_NAME, out_dir: str = ONNX_MODEL_DIR,
+                quantize: bool = True, opset: int = 17) -> dict:
+    """Export the SentenceTransformer's transformer to ONNX (+ a dynamic int8 copy)."""
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+
+    st = SentenceTransformer(model_name, device="cpu")
+    transformer, pooling = st[0], st[1]
+    if not isinstance(pooling, models.Pooling) or not pooling.pooling_mode_mean_tokens:
+        raise ValueError(f"{model_name} does not use mean pooling; the ONNX backend only implements that")
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = transformer.tokenizer
+    tokenizer.save_pretrained(out_dir)  # writes tokenizer.json (fast tokenizer)
+
+    sample = tokenizer(["an example sentence to trace the graph"], return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    hf_model = transformer.auto_model.eval()
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *args):
+            return self.model(**dict(zip(names, args)), return_dict=False)[0]
+
+    fp32_path = os.path.join(out_dir, ONNX_FILES["onnx"])
+    axes = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            _LastHiddenState(hf_model),
+            tuple(sample[n] for n in names),
+            fp32_path,
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={**{n: axes for n in names}, "last_hidden_state": axes},
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+
+    files = {"onnx": os.path.basename(fp32_path)}
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        int8_path = os.path.join(out_dir, ONNX_FILES["onnx-int8"])
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        files["onnx-int8"] = os.path.basename(int8_path)
+
+    meta = {
+        "model": model_name,
+        "dim": st.get_sentence_embedding_dimension(),
+        "max_seq_length": st.max_seq_length,
+        "pad_token_id": tokenizer.pad_token_id or 0,
+        "normalize": any(isinstance(m, models.Normalize) for m in st),
+        "opset": opset,
+        "files": files,
+    }
+    with open(os.path.join(out_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedding backends")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_exp = sub.add_parser("export", help="export the embedding model to ONNX (fp32 + int8)")
+    p_exp.add_argument("--out", default=ONNX_MODEL_DIR)
+    p_exp.add_argument("--no-quantize", action="store_true")
+    p_exp.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    meta = export_onnx(out_dir=args.out, quantize=not args.no_quantize, opset=args.opset)
+    sizes = ", ".join(f"{b}={os.path.getsize(os.path.join(args.out, f)) / 1e6:.1f} MB" for b, f in meta["files"].items())
+    print(f"✅ Exported {meta['model']} (dim={meta['dim']}, max_seq_length={meta['max_seq_length']}) to {args.out}: {sizes}")
@@ -1,42 +1,30 @@
 import os
 import json
+import argparse
 from tqdm import tqdm
-from rag.config import KB_DIR, OUTPUT_DIR
-from rag.utils_text import clean_text, chunk_text, infer_metadata
+from rag.config import KB_DIR, OUTPUT_DIR, MANIFEST_PATH, INGEST_WORKERS
+from rag.pipeline import iter_chunks
 
-def main():
+def main(workers: int = INGEST_WORKERS):
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-    all_chunks = []
-
-    for root, _, files in os.walk(KB_DIR):
-        for file in files:
-            if file.endswith(".txt"):
-                path = os.path.join(root, file)
-
-                with open(path, "r", encoding="utf-8") as f:
-                    raw = f.read()
-
-                cleaned = clean_text(raw)
-                chunks = chunk_text(cleaned)
-
-                meta = infer_metadata(file)
-
-                for i, chunk in enumerate(chunks):
-                    item = {
-                        "id": f"{file}_{i}",
-                        "text": chunk,
-                        "metadata": meta
-                    }
-                    all_chunks.append(item)
-
+    manifest = {"files": {}}
     out_path = os.path.join(OUTPUT_DIR, "chunks_preview.jsonl")
 
+    # Rows are streamed straight to disk; only per-file hashes are kept in memory
+    n_chunks = 0
     with open(out_path, "w", encoding="utf-8") as f:
-        for row in all_chunks:
+        for row in tqdm(iter_chunks(KB_DIR, manifest=manifest, workers=workers), desc="Chunking", unit="chunk"):
             f.write(json.dumps(row) + "\n")
+            n_chunks += 1
+
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
 
-    print(f"✅ Created {len(all_chunks)} chunks")
+    print(f"✅ Created {n_chunks} chunks")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Chunk the knowledge base into outputs/chunks_preview.jsonl")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="processes used for parsing + chunking (1 = serial)")
+    args = parser.parse_args()
+    main(workers=args.workers)
@@ -0,0 +1,289 @@
+"""
+BM25 inverted index over the chunk texts (the lexical side of retrieval).
+
+build_index feeds every chunk it streams into a LexicalIndexBuilder (same ids
+as the vector store) and writes the index to LEXICAL_INDEX_DIR:
+
+    terms.json     sorted vocabulary; term id = position
+    offsets.npy    int64 (V + 1): postings of term t are [offsets[t], offsets[t + 1])
+    docs.npy       int32 row numbers, ascending within each term
+    tfs.npy        uint16 term frequency of each posting
+    doc_len.npy    int32 analyzed tokens per row
+    rows.jsonl     one {"id", "metadata"} per row (hit metadata + `where` filters)
+    manifest.json  count / avgdl / vocabulary size, written last
+
+Postings are flat arrays (CSR layout), memory-mapped on load, so scoring a
+query is a few array slices plus vectorized BM25 into one dense score array.
+route() decides whether a query is keyword-style enough to be answered from
+this index alone; rag.retrieve fuses it with vector search otherwise.
+
+rag.snapshot copies the postings into each published snapshot (re-keyed to the
+snapshot's rows), so a snapshot reader always searches the BM25 index of the
+same build it serves vectors from (LexicalIndex.from_arrays).
+"""
+import os
+import re
+import json
+import math
+from collections import Counter
+
+import numpy as np
+
+from rag.config import LEXICAL_INDEX_DIR, BM25_K1, BM25_B, LEXICAL_ROUTE_MAX_TERMS, RRF_K
+from rag.vector_store import top_k, where_mask
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")  # "missing_values" -> missing, values
+_STOPWORDS = frozenset(
+    "a an and are as at be by do does for from how i in is it my of on or should the to vs what when "
+    "which why with".split()
+)
+_QUESTION_WORDS = frozenset("how what why when which who should does do is are can could explain give tell".split())
+
+
+def _stem(token: str) -> str:
+    """Plural folding only (outliers -> outlier); enough for a curated handbook."""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def analyze(text: str):
+    """Lowercased, stemmed terms of `text` without stopwords."""
+    return [_stem(t) for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+# -----------------------------
+# Build
+# -----------------------------
+class LexicalIndexBuilder:
+    """Collects (id, text, metadata) rows in stream order and writes the index files."""
+
+    def __init__(self):
+        self.ids = []
+        self.metas = []
+        self._vocab = {}
+        self._terms, self._docs, self._tfs = [], [], []
+        self._doc_len = []
+
+    def add(self, cid: str, text: str, metadata: dict = None):
+        row = len(self.ids)
+        self.ids.append(cid)
+        self.metas.append(metadata or {})
+        counts = Counter(analyze(text))
+        self._doc_len.append(sum(counts.values()))
+        for term, tf in counts.items():
+            self._terms.append(self._vocab.setdefault(term, len(self._vocab)))
+            self._docs.append(row)
+            self._tfs.append(min(tf, 65535))
+
+    def tap(self, rows):
+        """Pass `rows` through unchanged while indexing each one (used around index_rows)."""
+        for row in rows:
+            self.add(row["id"], row["text"], row.get("metadata"))
+            yield row
+
+    def save(self, path: str = LEXICAL_INDEX_DIR) -> dict:
+        os.makedirs(path, exist_ok=True)
+        vocab = sorted(self._vocab)
+        remap = np.zeros(len(vocab), dtype=np.int64)
+        for new_id, term in enumerate(vocab):
+            remap[self._vocab[term]] = new_id
+
+        terms = remap[np.asarray(self._terms, dtype=np.int64)]
+        order = np.argsort(terms, kind="stable")  # stable -> rows stay ascending within a term
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocab)), out=offsets[1:])
+        doc_len = np.asarray(self._doc_len, dtype=np.int32)
+
+        def atomic(name, write_fn):
+            tmp = os.path.join(path, name + ".tmp")
+            write_fn(tmp)
+            os.replace(tmp, os.path.join(path, name))
+
+        def write_array(arr):
+            def write(tmp):
+                with open(tmp, "wb") as f:
+                    np.save(f, arr)
+            return write
+
+        def write_json(obj):
+            def write(tmp):
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(obj, f)
+            return write
+
+        def write_rows(tmp):
+            with open(tmp, "w", encoding="utf-8") as f:
+                for cid, m in zip(self.ids, self.metas):
+                    f.write(json.dumps({"id": cid, "metadata": m}) + "\n")
+
+        manifest = {
+            "count": len(self.ids),
+            "terms": len(vocab),
+            "postings": int(len(terms)),
+            "avgdl": float(doc_len.mean()) if len(doc_len) else 0.0,
+        }
+        atomic("terms.json", write_json(vocab))
+        atomic("offsets.npy", write_array(offsets))
+        atomic("docs.npy", write_array(np.asarray(self._docs, dtype=np.int32)[order]))
+        atomic("tfs.npy", write_array(np.asarray(self._tfs, dtype=np.uint16)[order]))
+        atomic("doc_len.npy", write_array(doc_len))
+        atomic("rows.jsonl", write_rows)
+        atomic("manifest.json", write_json(manifest))  # last: marks the write complete
+        return manifest
+
+
+# -----------------------------
+# Query
+# -----------------------------
+def read_index(path: str = LEXICAL_INDEX_DIR) -> dict:
+    """The raw index files of `path`: manifest, vocab, ids, metas and the (memory-mapped) arrays."""
+    with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    with open(os.path.join(path, "terms.json"), "r", encoding="utf-8") as f:
+        vocab = json.load(f)
+    ids, metas = [], []
+    with open(os.path.join(path, "rows.jsonl"), "r", encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            ids.append(row["id"])
+            metas.append(row.get("metadata") or {})
+    return {
+        "manifest": manifest,
+        "vocab": vocab,
+        "ids": ids,
+        "metas": metas,
+        "offsets": np.load(os.path.join(path, "offsets.npy"), mmap_mode="r"),
+        "docs": np.load(os.path.join(path, "docs.npy"), mmap_mode="r"),
+        "tfs": np.load(os.path.join(path, "tfs.npy"), mmap_mode="r"),
+        "doc_len": np.load(os.path.join(path, "doc_len.npy")),
+    }
+
+
+class LexicalIndex:
+    """Read side: BM25 top-k with Chroma-style `where` filters, plus the query router."""
+
+    def __init__(self, path: str = LEXICAL_INDEX_DIR, k1: float = BM25_K1, b: float = BM25_B):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._loaded_mtime = None
+        self._data = None
+        self.load()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _manifest_mtime(self):
+        try:
+            return os.stat(self._file("manifest.json")).st_mtime_ns
+        except OSError:
+            return None
+
+    @classmethod
+    def from_arrays(cls, vocab, ids, metas, offsets, docs, tfs, doc_len, avgdl: float,
+                    k1: float = BM25_K1, b: float = BM25_B) -> "LexicalIndex":
+        """Read-only index over arrays held elsewhere (a snapshot's mapped sections); refresh() is a no-op."""
+        index = cls.__new__(cls)
+        index.path = None
+        index.k1 = k1
+        index.b = b
+        index._loaded_mtime = None
+        index._data = index._make_data(vocab, ids, metas, offsets, docs, tfs, doc_len, avgdl)
+        return index
+
+    def _make_data(self, vocab, ids, metas, offsets, docs, tfs, doc_len, avgdl: float) -> dict:
+        return {
+            "ids": ids,
+            "metas": metas,
+            "term_id": {t: i for i, t in enumerate(vocab)},
+            "offsets": offsets,
+            "docs": docs,
+            "tfs": tfs,
+            # per-row BM25 length normalization, k1 * (1 - b + b * dl / avgdl)
+            "norm": (self.k1 * (1.0 - self.b + self.b * np.asarray(doc_len) / (avgdl or 1.0))).astype(np.float32),
+            "masks": {},
+        }
+
+    def load(self):
+        mtime = self._manifest_mtime()
+        if mtime is None:
+            return
+        raw = read_index(self.path)
+        # everything a query needs is swapped in as one object, so concurrent readers see old or new
+        self._data = self._make_data(raw["vocab"], raw["ids"], raw["metas"], raw["offsets"], raw["docs"],
+                                     raw["tfs"], raw["doc_len"], raw["manifest"]["avgdl"])
+        self._loaded_mtime = mtime
+
+    def refresh(self):
+        """Reload if build_index wrote a newer index."""
+        if self.path is not None and self._manifest_mtime() != self._loaded_mtime:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._data["ids"]) if self._data else 0
+
+    def scores(self, terms, data=None) -> np.ndarray:
+        """Dense BM25 score per row for the analyzed query `terms`."""
+        data = data or self._data
+        n = len(data["ids"])
+        out = np.zeros(n, dtype=np.float32)
+        for term in set(terms):
+            tid = data["term_id"].get(term)
+            if tid is None:
+                continue
+            lo, hi = int(data["offsets"][tid]), int(data["offsets"][tid + 1])
+            rows = data["docs"][lo:hi]
+            tf = np.asarray(data["tfs"][lo:hi], dtype=np.float32)
+            df = hi - lo
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            out[rows] += idf * tf * (self.k1 + 1.0) / (tf + data["norm"][rows])
+        return out
+
+    def _mask(self, data, where: dict) -> np.ndarray:
+        key = json.dumps(where, sort_keys=True)
+        mask = data["masks"].get(key)
+        if mask is None:
+            mask = data["masks"][key] = where_mask(data["metas"], where)
+        return mask
+
+    def search(self, query: str, n_results: int = 3, where: dict = None):
+        """Top-k rows matching at least one query term: [(id, metadata, score), ...] best first."""
+        data = self._data
+        if not data or n_results <= 0:
+            return []
+        scores = self.scores(analyze(query), data)
+        matched = scores > 0
+        if where:
+            matched &= self._mask(data, where)
+        k = min(n_results, int(matched.sum()))
+        if k <= 0:
+            return []
+        scores[~matched] = -np.inf
+        rows, top = top_k(scores[None, :], k)
+        return [(data["ids"][r], data["metas"][r], float(s)) for r, s in zip(rows[0], top[0])]
+
+    def route(self, query: str) -> str:
+        """
+        "lexical" for short keyword-style queries whose terms are all in the
+        vocabulary ("missing_values", "IQR outliers"), else "hybrid".
+        """
+        data = self._data
+        words = (query or "").split()
+        if not data or not words or len(words) > LEXICAL_ROUTE_MAX_TERMS or "?" in query:
+            return "hybrid"
+        if words[0].lower() in _QUESTION_WORDS:
+            return "hybrid"
+        terms = analyze(query)
+        if terms and all(t in data["term_id"] for t in terms):
+            return "lexical"
+        return "hybrid"
+
+
+def rrf_fuse(*rankings, k: int = RRF_K):
+    """Reciprocal rank fusion of id lists: [(id, score), ...] best first, score = sum 1 / (k + rank)."""
+    scores = {}
+    for ranking in rankings:
+        for rank, cid in enumerate(ranking, start=1):
+            scores[cid] = scores.get(cid, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda kv: -kv[1])
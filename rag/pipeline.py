@@ -0,0 +1,287 @@
+"""
+Streaming ingest -> embed -> index pipeline.
+
+Every stage is a generator, so only a bounded window of the corpus is in
+memory at any time:
+
+    files -> cleaned text -> chunk rows -> embedding batches -> vector store upserts
+
+Encoding runs in the calling thread; store writes run in a writer thread fed
+through a bounded queue. When the writer falls behind, the encoder blocks on
+`queue.put` (backpressure) instead of piling up embeddings.
+"""
+import os
+import json
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from itertools import islice
+
+from rag import resources
+from rag.config import (
+    KB_DIR,
+    EMBED_BATCH_SIZE,
+    WRITE_BATCH_SIZE,
+    PIPELINE_QUEUE_SIZE,
+    INGEST_WORKERS,
+    STORE_CHUNK_TEXT,
+)
+from rag.utils_text import clean_text, chunk_spans, infer_metadata, content_hash
+
+
+# -----------------------------
+# Sources
+# -----------------------------
+def iter_kb_files(kb_dir: str = KB_DIR):
+    """Yield .txt file paths under kb_dir in a deterministic order."""
+    for root, dirs, files in os.walk(kb_dir):
+        dirs.sort()
+        for file in sorted(files):
+            if file.endswith(".txt"):
+                yield os.path.join(root, file)
+
+
+def read_file_chunks(path: str, kb_dir: str = KB_DIR):
+    """
+    Read, clean and chunk one file.
+    Returns (file_entry, rows) where file_entry records the file/chunk hashes.
+    """
+    file = os.path.basename(path)
+    rel_path = os.path.relpath(path, kb_dir).replace(os.sep, "/")
+
+    with open(path, "r", encoding="utf-8") as f:
+        raw = f.read()
+
+    cleaned = clean_text(raw)
+
+    meta = infer_metadata(file)
+    file_entry = {"path": rel_path, "hash": content_hash(raw), "chunks": {}}
+
+    rows = []
+    for i, (start, end) in enumerate(chunk_spans(cleaned)):
+        chunk = cleaned[start:end]
+        chunk_id = f"{file}_{i}"
+        chunk_hash = content_hash(chunk)
+        rows.append({
+            "id": chunk_id,
+            "text": chunk,
+            "hash": chunk_hash,
+            "metadata": {
+                **meta,
+                "file": rel_path,
+                "chunk_hash": chunk_hash,
+                # offsets into the cleaned source text (see chunk_source_text)
+                "char_start": start,
+                "char_end": end,
+            }
+        })
+        file_entry["chunks"][chunk_id] = chunk_hash
+
+    return file_entry, rows
+
+
+@lru_cache(maxsize=64)
+def _cleaned_source(path: str, mtime_ns: int) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return clean_text(f.read())
+
+
+def chunk_source_text(meta: dict, kb_dir: str = KB_DIR):
+    """
+    Rebuild a chunk's text from its source file using the stored char offsets.
+    Returns None if the metadata has no offsets or the file changed since indexing.
+    """
+    meta = meta or {}
+    rel_path, start, end = meta.get("file"), meta.get("char_start"), meta.get("char_end")
+    if rel_path is None or start is None or end is None:
+        return None
+
+    path = os.path.join(kb_dir, rel_path)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+    text = _cleaned_source(path, mtime_ns)[start:end]
+    if meta.get("chunk_hash") and content_hash(text) != meta["chunk_hash"]:
+        return None
+    return text
+
+
+def _iter_file_results(paths, kb_dir: str, workers: int):
+    """
+    Yield read_file_chunks() results in input order.
+    With workers > 1 files are parsed in a process pool; only a sliding window
+    of `workers * 4` files is in flight so memory stays bounded.
+    """
+    if workers <= 1:
+        for path in paths:
+            yield read_file_chunks(path, kb_dir)
+        return
+
+    fn = partial(read_file_chunks, kb_dir=kb_dir)
+    window = workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for path in paths:
+            pending.append(pool.submit(fn, path))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_chunks(kb_dir: str = KB_DIR, manifest: dict = None, workers: int = INGEST_WORKERS):
+    """
+    Yield chunk rows for the whole KB, one file at a time.
+    If `manifest` is given, per-file hash entries are recorded into manifest["files"].
+    Output ids and order are identical for any `workers` value.
+    """
+    for file_entry, rows in _iter_file_results(iter_kb_files(kb_dir), kb_dir, workers):
+        if manifest is not None:
+            manifest.setdefault("files", {})[file_entry.pop("path")] = file_entry
+        yield from rows
+
+
+def iter_jsonl(file_path: str):
+    """Yield chunk rows from a chunks_preview.jsonl file without loading it whole."""
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def batched(iterable, size: int):
+    """Yield lists of at most `size` items."""
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+# -----------------------------
+# Embedding
+# -----------------------------
+def embed_with_cache(docs, hashes, cache, batch_size: int = EMBED_BATCH_SIZE):
+    """Return one embedding per doc, encoding only the hashes missing from the cache."""
+    cached = cache.get_many(hashes)
+
+    missing = {}
+    for d, h in zip(docs, hashes):
+        if h not in cached and h not in missing:
+            missing[h] = d
+
+    if missing:
+        new_hashes = list(missing)
+        vectors = resources.encode([missing[h] for h in new_hashes], batch_size=batch_size)
+        cache.put_many(new_hashes, vectors)
+        cached.update(zip(new_hashes, vectors))
+
+    return [cached[h].tolist() for h in hashes], len(missing)
+
+
+# -----------------------------
+# Index writer
+# -----------------------------
+def index_rows(
+    rows,
+    store,
+    cache,
+    indexed: dict = None,
+    embed_batch_size: int = EMBED_BATCH_SIZE,
+    write_batch_size: int = WRITE_BATCH_SIZE,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    store_text: bool = STORE_CHUNK_TEXT,
+):
+    """
+    Stream chunk rows into `store` (a rag.vector_store.VectorStore).
+
+    Rows whose (id, hash) already match `indexed` are skipped. The rest are
+    embedded in fixed-size batches and upserted in write batches by a
+    background writer thread. With store_text=False only embeddings and
+    metadata are written; readers rebuild the text via chunk_source_text().
+
+    Returns a stats dict including `seen_ids`, the set of ids in the stream
+    (used by the caller to delete stale chunks).
+    """
+    indexed = indexed or {}
+    stats = {"seen": 0, "upserted": 0, "encoded": 0, "seen_ids": set()}
+
+    q = queue.Queue(maxsize=max(1, queue_size))
+    errors = []
+
+    def writer():
+        buf = {"ids": [], "embeddings": [], "metadatas": []}
+        if store_text:
+            buf["documents"] = []
+
+        def flush():
+            if buf["ids"]:
+                store.upsert(**buf)
+                stats["upserted"] += len(buf["ids"])
+                for v in buf.values():
+                    v.clear()
+
+        done = False
+        try:
+            while True:
+                item = q.get()
+                if item is None:
+                    done = True
+                    break
+                for key, values in item.items():
+                    buf[key].extend(values)
+                if len(buf["ids"]) >= write_batch_size:
+                    flush()
+            flush()
+        except Exception as e:  # re-raised in the producer thread below
+            errors.append(e)
+            # keep draining so the producer never blocks on a full queue
+            while not done and q.get() is not None:
+                pass
+
+    t = threading.Thread(target=writer, name="index-writer", daemon=True)
+    t.start()
+
+    try:
+        for batch in batched(rows, embed_batch_size):
+            if errors:
+                break
+
+            todo = []
+            for row in batch:
+                stats["seen"] += 1
+                stats["seen_ids"].add(row["id"])
+                chunk_hash = row.get("hash") or content_hash(row["text"])
+                if indexed.get(row["id"]) != chunk_hash:
+                    todo.append((row, chunk_hash))
+
+            if not todo:
+                continue
+
+            docs = [r["text"] for r, _ in todo]
+            hashes = [h for _, h in todo]
+            embeddings, encoded = embed_with_cache(docs, hashes, cache, batch_size=embed_batch_size)
+            stats["encoded"] += encoded
+
+            item = {
+                "ids": [r["id"] for r, _ in todo],
+                "embeddings": embeddings,
+                "metadatas": [{**r["metadata"], "chunk_hash": h} for r, h in todo],
+            }
+            if store_text:
+                item["documents"] = docs
+            q.put(item)
+    finally:
+        q.put(None)
+        t.join()
+
+    if errors:
+        raise errors[0]
+
+    return stats
+
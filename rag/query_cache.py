@@ -0,0 +1,82 @@
+"""
+Small in-process caches for the retrieval layer.
+
+Two levels are used by rag.retrieve.run_queries:
+  1) normalized query text -> query embedding   (skips the model encode)
+  2) (embedding, where filter, k, index version) -> hits   (skips the HNSW query)
+
+Both are bounded LRU maps with an optional TTL and hit/miss counters.
+"""
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    t = re.sub(r"\s+", " ", (text or "").lower()).strip()
+    return t.rstrip("?!.;: ")
+
+
+def embedding_key(emb) -> str:
+    """Stable digest of an embedding vector (list or array of floats)."""
+    h = hashlib.sha1()
+    h.update(",".join(f"{x:.6f}" for x in emb).encode("ascii"))
+    return h.hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU cache with optional per-entry TTL (seconds)."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,235 @@
+"""
+Shared, process-wide RAG resources.
+
+Loading the SentenceTransformer weights and opening the Chroma persistent
+client are by far the most expensive steps of a retrieval call. This module
+keeps one instance of each per process (lazy, thread-safe singletons) so the
+agent tools, the retrieval scripts and the index builder all reuse them.
+
+Typical use in a long-running process:
+
+    from rag import resources
+    resources.warm_up()          # optional: pay the load cost up front
+    ...
+    resources.shutdown()         # optional: release model + client
+
+Heavy dependencies (torch / sentence_transformers or onnxruntime, chromadb, numpy) are only
+imported on first use, so importing this module is cheap. If a warm worker
+is running (python -m rag.warm_worker start), encode() is served by it and
+this process never loads the model at all.
+"""
+import os
+import time
+import threading
+
+from rag.config import (
+    CHROMA_DIR,
+    COLLECTION_NAME,
+    EMBED_MODEL_NAME,
+    EMBED_MODEL_ID,
+    INDEX_VERSION_PATH,
+    LEXICAL_INDEX_DIR,
+    EMBED_BACKEND,
+    VECTOR_STORE_BACKEND,
+    USE_WARM_WORKER,
+    WARM_WORKER_SOCKET,
+)
+
+
+_lock = threading.RLock()
+_encode_lock = threading.Lock()
+
+_model = None
+_client = None
+_collections = {}
+_stores = {}
+_lexical = None
+_index_version = (None, "0")  # (file mtime_ns, version)
+
+
+# -----------------------------
+# Embedding model
+# -----------------------------
+def get_embedder():
+    """Return the shared encoder for EMBED_BACKEND (see rag/encoders.py; loaded on first use)."""
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                from rag.encoders import make_encoder
+                _model = make_encoder(EMBED_BACKEND, model_name=EMBED_MODEL_NAME)
+    return _model
+
+
+def _use_warm_worker() -> bool:
+    if _model is not None or USE_WARM_WORKER == "never":
+        return False
+    return USE_WARM_WORKER == "always" or os.path.exists(WARM_WORKER_SOCKET)
+
+
+def encode(texts, **kwargs):
+    """
+    Encode texts with the shared model (or the warm worker, if one is running).
+    Calls are serialized so concurrent tool calls don't fight over the same weights.
+    """
+    if _use_warm_worker():
+        from rag import warm_worker
+        vectors = warm_worker.remote_encode(texts, path=WARM_WORKER_SOCKET, model=EMBED_MODEL_ID, **kwargs)
+        if vectors is not None:
+            return vectors
+        # worker not reachable or serving another model -> fall back to loading the model here
+
+    model = get_embedder()
+    with _encode_lock:
+        return model.encode(texts, **kwargs)
+
+
+# -----------------------------
+# Chroma client / collection
+# -----------------------------
+def get_client():
+    """Return the shared Chroma PersistentClient for CHROMA_DIR."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import chromadb
+                _client = chromadb.PersistentClient(path=CHROMA_DIR)
+    return _client
+
+
+def get_collection(name: str = COLLECTION_NAME, create: bool = False):
+    """
+    Return a cached collection handle.
+    With create=True the collection is created if it does not exist yet (index build).
+    """
+    col = _collections.get(name)
+    if col is not None:
+        return col
+
+    with _lock:
+        col = _collections.get(name)
+        if col is None:
+            client = get_client()
+            if create:
+                # cosine distance (1 - cosine similarity), the same scale NumpyStore reports
+                col = client.get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
+            else:
+                col = client.get_collection(name=name)
+            _collections[name] = col
+    return col
+
+
+def reset_collection_cache():
+    """Forget cached collection handles (e.g. after a collection was dropped/recreated)."""
+    with _lock:
+        _collections.clear()
+        _stores.pop("chroma", None)
+
+
+# -----------------------------
+# Vector store (backend-agnostic)
+# -----------------------------
+def get_store(backend: str = None, create: bool = False):
+    """
+    Return the shared VectorStore for `backend` ("chroma", "numpy" or "snapshot", default from config).
+    The NumPy store re-maps its files if another process rebuilt them; the snapshot store
+    switches to a newly published snapshot (in-flight queries finish on the old one).
+    """
+    backend = backend or VECTOR_STORE_BACKEND
+    store = _stores.get(backend)
+    if store is None:
+        with _lock:
+            store = _stores.get(backend)
+            if store is None:
+                from rag.vector_store import ChromaStore, NumpyStore
+                if backend == "chroma":
+                    store = ChromaStore(get_collection(create=create))
+                elif backend == "numpy":
+                    store = NumpyStore()
+                elif backend == "snapshot":
+                    from rag.snapshot import SnapshotStore
+                    store = SnapshotStore()
+                else:
+                    raise ValueError(f"Unknown vector store backend: {backend!r}")
+                _stores[backend] = store
+    elif backend in ("numpy", "snapshot"):
+        store.refresh()
+    return store
+
+
+# -----------------------------
+# Lexical (BM25) index
+# -----------------------------
+def get_lexical_index(store=None):
+    """
+    Return the shared rag.lexical.LexicalIndex, or None if build_index has not written one yet.
+    Re-mapped automatically when a rebuild writes a newer index.
+    A snapshot store (rag.snapshot) carries its own BM25 index, which is returned instead
+    so vectors and postings always come from the same build.
+    """
+    global _lexical
+    if store is not None and hasattr(store, "lexical"):
+        lexical = store.lexical
+        return lexical if lexical is not None and len(lexical) else None
+    if _lexical is None:
+        with _lock:
+            if _lexical is None:
+                if not os.path.exists(os.path.join(LEXICAL_INDEX_DIR, "manifest.json")):
+                    return None
+                from rag.lexical import LexicalIndex
+                _lexical = LexicalIndex()
+    else:
+        _lexical.refresh()
+    return _lexical if len(_lexical) else None
+
+
+# -----------------------------
+# Index version
+# -----------------------------
+def index_version() -> str:
+    """
+    Current index version (changes whenever build_index modifies the collection).
+    Cheap to call per query: the version file is only re-read when its mtime changes.
+    """
+    global _index_version
+    try:
+        mtime_ns = os.stat(INDEX_VERSION_PATH).st_mtime_ns
+    except OSError:
+        return "0"
+    if _index_version[0] != mtime_ns:
+        with open(INDEX_VERSION_PATH, "r", encoding="utf-8") as f:
+            _index_version = (mtime_ns, f.read().strip() or "0")
+    return _index_version[1]
+
+
+def bump_index_version() -> str:
+    """Write a new index version (atomic replace) and return it."""
+    version = f"{time.time_ns():x}"
+    os.makedirs(os.path.dirname(INDEX_VERSION_PATH), exist_ok=True)
+    tmp = INDEX_VERSION_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp, INDEX_VERSION_PATH)
+    return version
+
+
+# -----------------------------
+# Lifecycle hooks
+# -----------------------------
+def warm_up(collection: bool = True):
+    """Eagerly load the embedding model (and optionally open the vector store)."""
+    get_embedder()
+    if collection:
+        get_store()
+
+
+def shutdown():
+    """Drop the shared model and client so their memory can be reclaimed."""
+    global _model, _client, _lexical
+    with _lock:
+        _collections.clear()
+        _stores.clear()
+        _lexical = None
+        _model = None
+        _client = None
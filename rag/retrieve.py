@@ -1,37 +1,366 @@
 import os
-import chromadb
-from sentence_transformers import SentenceTransformer
+import json
+import time
 
-from rag.config import CHROMA_DIR, COLLECTION_NAME, EMBED_MODEL_NAME, OUTPUT_DIR
+from rag import resources
+from rag.config import (
+    OUTPUT_DIR,
+    RETRIEVAL_MODE,
+    SELECT_CANDIDATES,
+    QUERY_EMBED_CACHE_SIZE,
+    QUERY_RESULT_CACHE_SIZE,
+    QUERY_CACHE_TTL_S,
+)
+from rag.pipeline import chunk_source_text
+from rag.query_cache import LRUCache, normalize_query, embedding_key
+from rag.select import select_hits
+from rag.lexical import rrf_fuse
 
 
-def _run_query(collection, model, query: str, where=None, k: int = 3):
-    """Return top-k hits with text + metadata."""
-    q_emb = model.encode([query]).tolist()
-    res = collection.query(
-        query_embeddings=q_emb,
-        n_results=k,
-        where=where
-    )
-
+def _hits_from_result(res, qi: int, k: int):
+    """Turn row `qi` of a store.query() result into hit dicts."""
     hits = []
     if not res or "documents" not in res or not res["documents"]:
         return hits
 
-    docs = res["documents"][0]
-    metas = res.get("metadatas", [[]])[0]
-    ids = res.get("ids", [[]])[0]
+    docs = res["documents"][qi]
+    metas = (res.get("metadatas") or [[]] * (qi + 1))[qi] or []
+    ids = (res.get("ids") or [[]] * (qi + 1))[qi] or []
+    dists = (res.get("distances") or [[]] * (qi + 1))[qi]
+    embs = res["embeddings"][qi] if res.get("embeddings") is not None else None
 
     for i in range(min(len(docs), k)):
-        hits.append({
+        meta = metas[i] if i < len(metas) else {}
+        hit = {
             "rank": i + 1,
             "id": ids[i] if i < len(ids) else None,
-            "text": docs[i],
-            "meta": metas[i] if i < len(metas) else {}
-        })
+            # text may not be stored in Chroma (STORE_CHUNK_TEXT=False) -> read it from the source
+            "text": docs[i] if docs[i] is not None else (chunk_source_text(meta) or ""),
+            "meta": meta
+        }
+        if dists is not None and i < len(dists):
+            hit["distance"] = float(dists[i])
+        if embs is not None:
+            hit["embedding"] = embs[i]  # only requested for budgeted selection
+        hits.append(hit)
+    return hits
+
+
+# query text -> embedding, and (embedding, filter, k, index version) -> hits
+_EMBED_CACHE = LRUCache(QUERY_EMBED_CACHE_SIZE, ttl=QUERY_CACHE_TTL_S)
+_RESULT_CACHE = LRUCache(QUERY_RESULT_CACHE_SIZE, ttl=QUERY_CACHE_TTL_S)
+_cache_version = None
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters of the retrieval caches."""
+    return {"embeddings": _EMBED_CACHE.stats(), "results": _RESULT_CACHE.stats()}
+
+
+def clear_caches():
+    _EMBED_CACHE.clear()
+    _RESULT_CACHE.clear()
+
+
+def _copy_hits(hits):
+    return [{**h, "meta": dict(h.get("meta") or {})} for h in hits]
+
+
+def _route(q: dict, lexical) -> str:
+    """"vector", "lexical" or "hybrid" for one query (q["mode"] overrides RETRIEVAL_MODE)."""
+    mode = q.get("mode") or RETRIEVAL_MODE
+    if lexical is None or mode == "vector":
+        return "vector"
+    if mode == "auto":
+        return lexical.route(q["query"])
+    if mode not in ("lexical", "hybrid"):
+        raise ValueError(f"Unknown retrieval mode: {mode!r}")
+    return mode
+
+
+def _result_key(q: dict, route: str, emb, version):
+    """Result cache key; BM25-backed paths are keyed by query text so they can be checked before BM25 runs."""
+    what = embedding_key(emb) if route == "vector" else normalize_query(q["query"])
+    return (route, what, json.dumps(q.get("where"), sort_keys=True), int(q.get("k", 3)), q.get("budget"), version)
+
+
+def _pin(store):
+    """One version of a hot-swappable store for the whole call (see SnapshotStore.pin)."""
+    return store.pin() if hasattr(store, "pin") else store
+
+
+def _prepare(store, queries, use_cache: bool, timings: dict = None):
+    """
+    Route the queries, answer what the result cache and the BM25 index can, and look up
+    cached query embeddings for the rest.
+    Returns (version, routes, lexical results by query index, results, embs, todo: norm -> query indexes);
+    results[qi] is already final for cache hits and lexical-only queries, which are never encoded.
+    """
+    global _cache_version
+    version = resources.index_version()
+    if use_cache and version != _cache_version:
+        _RESULT_CACHE.clear()
+        _cache_version = version
+
+    lexical = resources.get_lexical_index(store) if hasattr(store, "fetch") else None
+    routes = [_route(q, lexical) for q in queries]
+    results = [None] * len(queries)
+    if use_cache:
+        for qi, q in enumerate(queries):
+            if routes[qi] != "vector":
+                cached = _RESULT_CACHE.get(_result_key(q, routes[qi], None, version))
+                if cached is not None:
+                    results[qi] = _copy_hits(cached)
+
+    lex_results = {}
+    pending = [qi for qi in range(len(queries)) if routes[qi] != "vector" and results[qi] is None]
+    if pending:
+        t_lex = time.perf_counter()
+        for qi in pending:
+            q = queries[qi]
+            if routes[qi] == "hybrid":
+                lex_results[qi] = lexical.search(q["query"], _n_fetch(q), where=q.get("where"))
+                continue
+            hits = _lexical_hits(store, lexical, q, _n_fetch(q), include_embeddings=bool(q.get("budget")))
+            if not hits:
+                # no term matched, or the store has none of the matches: fall back to embeddings
+                routes[qi] = "vector"
+                continue
+            # keyword query: answered from the inverted index, no encode / vector query
+            results[qi] = _finish(q, hits, None)
+            if use_cache:
+                _RESULT_CACHE.put(_result_key(q, "lexical", None, version), _copy_hits(results[qi]))
+        if timings is not None:
+            timings["lexical"] = (t_lex, time.perf_counter() - t_lex)
+
+    embs = [None] * len(queries)
+    todo = {}
+    for qi, q in enumerate(queries):
+        if results[qi] is not None:
+            continue
+        norm = normalize_query(q["query"])
+        emb = _EMBED_CACHE.get(norm) if use_cache else None
+        if emb is None:
+            todo.setdefault(norm, []).append(qi)
+        else:
+            embs[qi] = emb
+    return version, routes, lex_results, results, embs, todo
+
+
+def _fill_embeddings(embs, todo, new_embs, use_cache: bool):
+    for (norm, idxs), emb in zip(todo.items(), new_embs):
+        if use_cache:
+            _EMBED_CACHE.put(norm, emb)
+        for qi in idxs:
+            embs[qi] = emb
+
+
+def _n_fetch(q: dict) -> int:
+    k = int(q.get("k", 3))
+    return max(k, SELECT_CANDIDATES) if q.get("budget") else k
+
+
+def _resolve(store, ids, n: int, include_embeddings: bool = False):
+    """
+    Hits for the first `n` of `ids` (in rank order) that the store has; ids it doesn't
+    know are skipped and the next ones fetched instead, n at a time.
+    """
+    hits = []
+    for start in range(0, len(ids), max(1, n)):
+        batch = ids[start:start + max(1, n)]
+        hits.extend(_hits_from_result(store.fetch(batch, include_embeddings=include_embeddings), 0, len(batch)))
+        if len(hits) >= n:
+            break
+    return hits[:n]
+
+
+def _lexical_hits(store, lexical, q: dict, n: int, include_embeddings: bool = False):
+    """
+    Top n BM25 hits of `q` that the store can return (text and vectors come from it), each
+    with its BM25 "score". Searches deeper while matches are missing from the store.
+    """
+    depth = n
+    while True:
+        lex = lexical.search(q["query"], depth, where=q.get("where"))
+        hits = _resolve(store, [cid for cid, _, _ in lex], n, include_embeddings)
+        if len(hits) >= n or len(lex) < depth:
+            break
+        depth *= 4
+    scores = {cid: score for cid, _, score in lex}
+    for rank, h in enumerate(hits, start=1):
+        h["rank"] = rank
+        h["score"] = scores[h["id"]]
     return hits
 
 
+def _fuse(store, vector_hits, lex, n: int, include_embeddings: bool = False):
+    """
+    Reciprocal rank fusion of vector hits and BM25 results: the top n the store can
+    return, each with its fused "score" (BM25-only ids missing from the store are skipped).
+    """
+    ranking = rrf_fuse([h["id"] for h in vector_hits], [cid for cid, _, _ in lex])
+    by_id = {h["id"]: h for h in vector_hits}
+    out, pos = [], 0
+    while len(out) < n and pos < len(ranking):
+        window = ranking[pos:pos + n - len(out)]
+        pos += len(window)
+        missing = [cid for cid, _ in window if cid not in by_id]
+        if missing:
+            by_id.update((h["id"], h) for h in _resolve(store, missing, len(missing), include_embeddings))
+        for cid, score in window:
+            if cid in by_id:
+                out.append({**by_id[cid], "rank": len(out) + 1, "score": score})
+    return out
+
+
+def _finish(q: dict, hits, emb):
+    """Budgeted selection (rag.select) or plain top-k without the stored vectors."""
+    if q.get("budget"):
+        relevance = None
+        if hits and all("score" in h for h in hits):
+            top = max(h["score"] for h in hits) or 1.0
+            relevance = [h["score"] / top for h in hits]  # fused / BM25 order instead of cosine
+        hits, _ = select_hits(hits, budget_chars=int(q["budget"]), query_embedding=emb, relevance=relevance)
+    else:
+        for h in hits:
+            h.pop("embedding", None)
+    return hits
+
+
+def _search(store, queries, embs, version, use_cache: bool, routes=None, lex_results=None, results=None):
+    """Result cache lookup, then one store.query per filter group for the queries still open."""
+    routes = routes or ["vector"] * len(queries)
+    lex_results = lex_results or {}
+    results = list(results) if results is not None else [None] * len(queries)
+    keys = [None] * len(queries)
+    groups = {}
+    for qi, q in enumerate(queries):
+        if results[qi] is not None:
+            continue  # answered in _prepare (cache hit or lexical-only)
+        if use_cache:
+            keys[qi] = _result_key(q, routes[qi], embs[qi], version)
+            cached = _RESULT_CACHE.get(keys[qi]) if routes[qi] == "vector" else None
+            if cached is not None:
+                results[qi] = _copy_hits(cached)
+                continue
+        # group by filter (dicts aren't hashable -> canonical json key)
+        groups.setdefault(json.dumps(q.get("where"), sort_keys=True), []).append(qi)
+
+    for key, idxs in groups.items():
+        n_fetch = [_n_fetch(queries[qi]) for qi in idxs]
+        kwargs = {}
+        if any(queries[qi].get("budget") for qi in idxs):
+            kwargs["include_embeddings"] = True  # for MMR in select_hits
+        res = store.query(
+            query_embeddings=[embs[qi] for qi in idxs],
+            n_results=max(n_fetch),
+            where=queries[idxs[0]].get("where"),
+            **kwargs
+        )
+        for row, qi in enumerate(idxs):
+            hits = _hits_from_result(res, row, n_fetch[row])
+            if routes[qi] == "hybrid":
+                hits = _fuse(store, hits, lex_results[qi], n_fetch[row], bool(queries[qi].get("budget")))
+            hits = _finish(queries[qi], hits, embs[qi])
+            if use_cache:
+                _RESULT_CACHE.put(keys[qi], _copy_hits(hits))
+            results[qi] = hits
+    return results
+
+
+def run_queries(store, queries, model=None, use_cache: bool = True, timings: dict = None):
+    """
+    Batched retrieval for several queries.
+
+    `queries` is a list of dicts: {"query": str, "where": dict | None, "k": int}, optionally
+    with "budget": int (characters). Budgeted queries fetch SELECT_CANDIDATES candidates and
+    return merged, MMR-diversified passages filling the budget (rag.select) instead of top k.
+    All query texts are encoded in one batched encode call, and queries sharing the
+    same `where` filter are sent as a single store.query(query_embeddings=[...]).
+    `store` is a rag.vector_store.VectorStore (a raw Chroma collection also works).
+    Returns one hit list per query, in input order. `model=None` uses the shared encoder.
+
+    When build_index has written the BM25 index (rag.lexical), each query takes one path
+    ("mode": "auto" | "vector" | "lexical" | "hybrid", default RETRIEVAL_MODE): in "auto",
+    short keyword queries are answered from the inverted index alone (no encode) and the
+    rest fuse vector and BM25 rankings with reciprocal rank fusion (hits get a "score").
+
+    With the shared encoder, embeddings and results are cached (see rag.query_cache);
+    cached results are dropped automatically when the index version changes.
+
+    If `timings` is a dict it receives {"encode": (start, seconds), "query": (start, seconds)}
+    (perf_counter based), plus "lexical" when BM25 ran, so callers can trace where the time went.
+    """
+    if not queries:
+        return []
+
+    use_cache = use_cache and model is None
+    store = _pin(store)
+    version, routes, lex_results, results, embs, todo = _prepare(store, queries, use_cache, timings)
+
+    # 1) embeddings (one batched encode for all cache misses)
+    t_encode = time.perf_counter()
+    if todo:
+        texts = [queries[idxs[0]]["query"] for idxs in todo.values()]
+        if model is None:
+            new_embs = resources.encode(texts).tolist()
+        else:
+            new_embs = model.encode(texts).tolist()
+        _fill_embeddings(embs, todo, new_embs, use_cache)
+    t_query = time.perf_counter()
+
+    # 2) results
+    results = _search(store, queries, embs, version, use_cache, routes, lex_results, results)
+
+    if timings is not None:
+        t_end = time.perf_counter()
+        if any(r != "lexical" for r in routes):
+            timings["encode"] = (t_encode, t_query - t_encode)
+        timings["query"] = (t_query, t_end - t_query)
+
+    return results
+
+
+async def arun_queries(store, queries, batcher=None, use_cache: bool = True, timings: dict = None):
+    """
+    Async run_queries() for the serving mode (agent/serve.py).
+
+    Cache misses are encoded through the event loop's EncodeBatcher, so encodes from
+    concurrent sessions are merged into one model call; the store query runs in a
+    worker thread. Same return value and `timings` as run_queries().
+    """
+    import asyncio
+    from rag.encode_batcher import get_batcher
+
+    if not queries:
+        return []
+
+    batcher = batcher or get_batcher()
+    store = _pin(store)
+    version, routes, lex_results, results, embs, todo = _prepare(store, queries, use_cache, timings)
+
+    t_encode = time.perf_counter()
+    if todo:
+        texts = [queries[idxs[0]]["query"] for idxs in todo.values()]
+        _fill_embeddings(embs, todo, await batcher.encode(texts), use_cache)
+    t_query = time.perf_counter()
+
+    results = await asyncio.to_thread(_search, store, queries, embs, version, use_cache, routes, lex_results, results)
+
+    if timings is not None:
+        t_end = time.perf_counter()
+        if any(r != "lexical" for r in routes):
+            timings["encode"] = (t_encode, t_query - t_encode)
+        timings["query"] = (t_query, t_end - t_query)
+
+    return results
+
+
+def _run_query(store, model, query: str, where=None, k: int = 3):
+    """Return top-k hits with text + metadata. `model=None` uses the shared encoder."""
+    return run_queries(store, [{"query": query, "where": where, "k": k}], model=model)[0]
+
+
 def _format_hit_md(hit: dict, max_chars: int = 450) -> str:
     meta = hit.get("meta", {}) or {}
     source = meta.get("source", "unknown")
@@ -75,9 +404,9 @@ def _write_retrieval_test_md(out_path: str, tests: list, all_results: list):
 
 def main():
     # Load DB + embedding model
-    client = chromadb.PersistentClient(path=CHROMA_DIR)
-    collection = client.get_collection(name=COLLECTION_NAME)
-    model = SentenceTransformer(EMBED_MODEL_NAME)
+    resources.warm_up()
+    store = resources.get_store()
+    model = resources.get_embedder()
 
     # ✅ 3 required tests (one includes metadata filtering)
     tests = [
@@ -99,10 +428,11 @@ def main():
         }
     ]
 
-    all_results = []
-    for t in tests:
-        hits = _run_query(collection, model, t["query"], where=t.get("where"), k=3)
-        all_results.append(hits)
+    all_results = run_queries(
+        store,
+        [{"query": t["query"], "where": t.get("where"), "k": 3} for t in tests],
+        model=model
+    )
 
     # Write the required markdown file
     out_md = os.path.join(OUTPUT_DIR, "retrieval_test.md")
@@ -143,7 +473,7 @@ def main():
 
             q = real_q
 
-        hits = _run_query(collection, model, q, where=where, k=3)
+        hits = _run_query(store, model, q, where=where, k=3)
         if not hits:
             print("\nNo results.\n")
             continue
@@ -0,0 +1,167 @@
+"""
+Post-retrieval selection: fill a character budget with non-redundant text.
+
+Chunks overlap by OVERLAP_CHARS, so neighbouring chunks of one file often
+come back together and the LLM would read the same sentences twice. Given
+the candidates of one query (with their stored embeddings), select_hits():
+
+  1. orders candidates by MMR (relevance vs. similarity to what is already
+     picked), using the embeddings returned by the store, so near-duplicates
+     from different files are pushed back
+  2. walks that order and merges each candidate into an already picked
+     passage of the same file when their char spans overlap or touch; only
+     the new characters count against the budget, and spans that are fully
+     contained cost nothing and are dropped
+  3. stops when the budget (characters, or tokens * CHARS_PER_TOKEN) is full
+
+Merged text is rebuilt from the chunk texts and their offsets into the
+cleaned source (chunk text == cleaned[char_start:char_end]).
+"""
+import numpy as np
+
+from rag.config import MMR_LAMBDA, CHARS_PER_TOKEN
+
+
+def _unit(mat: np.ndarray) -> np.ndarray:
+    return mat / np.maximum(np.linalg.norm(mat, axis=1, keepdims=True), 1e-12)
+
+
+def mmr_order(relevance, embeddings, lambda_: float = MMR_LAMBDA):
+    """Indexes of all candidates in maximal-marginal-relevance order."""
+    n = len(relevance)
+    if n == 0:
+        return []
+    emb = _unit(np.asarray(embeddings, dtype=np.float32))
+    sim = emb @ emb.T
+    rel = np.asarray(relevance, dtype=np.float32)
+
+    order = [int(np.argmax(rel))]
+    max_sim = sim[order[0]].copy()
+    remaining = np.ones(n, dtype=bool)
+    remaining[order[0]] = False
+    while remaining.any():
+        score = lambda_ * rel - (1.0 - lambda_) * max_sim
+        score[~remaining] = -np.inf
+        i = int(np.argmax(score))
+        order.append(i)
+        remaining[i] = False
+        max_sim = np.maximum(max_sim, sim[i])
+    return order
+
+
+def _span(hit):
+    m = hit.get("meta") or {}
+    start, end = m.get("char_start"), m.get("char_end")
+    if m.get("file") is None or start is None or end is None:
+        return None
+    return m["file"], int(start), int(end)
+
+
+def _touches(passage: dict, file, start: int, end: int) -> bool:
+    return passage["file"] == file and start <= passage["end"] and end >= passage["start"]
+
+
+def _merge_into(passage: dict, text: str, start: int, end: int, ids) -> int:
+    """Extend `passage` by an overlapping/touching span. Returns the number of added chars."""
+    old_len = len(passage["text"])
+    if start < passage["start"]:  # extends to the left
+        passage["text"] = text[: passage["start"] - start] + passage["text"]
+        passage["start"] = start
+    if end > passage["end"]:      # extends to the right
+        passage["text"] = passage["text"] + text[len(text) - (end - passage["end"]):]
+        passage["end"] = end
+    passage["ids"].extend(ids)
+    return len(passage["text"]) - old_len
+
+
+def _coalesce(passages, p) -> int:
+    """After `p` grew, fold other passages it now overlaps into it. Returns chars saved."""
+    saved = 0
+    for q in [q for q in passages if q is not p and _touches(p, q["file"], q["start"], q["end"])]:
+        added = _merge_into(p, q["text"], q["start"], q["end"], q["ids"])
+        saved += len(q["text"]) - added
+        p["rel"] = max(p["rel"], q["rel"])
+        passages.remove(q)
+    return saved
+
+
+def select_hits(hits, budget_chars: int = None, budget_tokens: int = None, query_embedding=None,
+                lambda_: float = MMR_LAMBDA, relevance=None):
+    """
+    Returns (passages, stats). Passages are hit dicts (rank, id, text, meta, distance);
+    merged passages have id "a+b+..." and meta char_start/char_end of the merged span.
+
+    Relevance is the cosine similarity to `query_embedding` when hits carry embeddings
+    (backend-independent: Chroma and the NumPy store report different distance metrics);
+    otherwise hits are taken in store order. An explicit `relevance` (one score per hit,
+    higher = better, e.g. fused lexical + vector scores) replaces the cosine similarity.
+    """
+    if budget_chars is None:
+        budget_chars = budget_tokens * CHARS_PER_TOKEN if budget_tokens else sum(len(h.get("text") or "") for h in hits)
+
+    stats = {"candidates": len(hits), "merged": 0, "dropped_overlap": 0, "skipped_budget": 0,
+             "chars_in": sum(len(h.get("text") or "") for h in hits)}
+    if not hits:
+        stats.update(selected=0, chars_out=0)
+        return [], stats
+
+    has_embeddings = all(h.get("embedding") is not None for h in hits)
+    if has_embeddings and (relevance is not None or query_embedding is not None):
+        emb = _unit(np.asarray([h["embedding"] for h in hits], dtype=np.float32))
+        if relevance is None:
+            relevance = (emb @ _unit(np.asarray(query_embedding, dtype=np.float32)[None, :])[0]).tolist()
+        order = mmr_order(relevance, emb, lambda_)
+    elif relevance is not None:
+        order = sorted(range(len(hits)), key=lambda i: -relevance[i])
+    else:
+        relevance = [-float(i) for i in range(len(hits))]  # store order = relevance order
+        order = list(range(len(hits)))
+
+    passages = []
+    used = 0
+    for i in order:
+        hit = hits[i]
+        span = _span(hit)
+        text = hit.get("text") or ""
+
+        p = next((p for p in passages if _touches(p, *span)), None) if span is not None else None
+        if p is not None:
+            # cost = only the characters this chunk adds to the passage
+            extra = max(0, p["start"] - span[1]) + max(0, span[2] - p["end"])
+            if extra == 0:
+                stats["dropped_overlap"] += 1
+            elif used + extra <= budget_chars:
+                used += _merge_into(p, text, span[1], span[2], [hit.get("id")])
+                p["rel"] = max(p["rel"], relevance[i])
+                used -= _coalesce(passages, p)
+                stats["merged"] += 1
+            else:
+                stats["skipped_budget"] += 1
+            continue
+
+        if used + len(text) > budget_chars:
+            stats["skipped_budget"] += 1
+            continue
+        used += len(text)
+        file, start, end = span if span is not None else (None, None, None)
+        passages.append({"hit": hit, "rel": relevance[i], "file": file, "start": start, "end": end,
+                         "text": text, "ids": [hit.get("id")]})
+
+    # most relevant first
+    passages.sort(key=lambda p: -p["rel"])
+    out = []
+    for rank, p in enumerate(passages, start=1):
+        meta = dict(p["hit"].get("meta") or {})
+        if len(p["ids"]) > 1:
+            meta["char_start"], meta["char_end"] = p["start"], p["end"]
+            meta.pop("chunk_hash", None)  # no longer one chunk
+        out.append({
+            "rank": rank,
+            "id": "+".join(str(x) for x in p["ids"]),
+            "text": p["text"],
+            "meta": meta,
+            "distance": p["hit"].get("distance"),
+        })
+
+    stats.update(selected=len(out), chars_out=used)
+    return out, stats
@@ -0,0 +1,545 @@
+"""
+Immutable, versioned single-file index snapshots with atomic hot reload.
+
+build_index writes its vector store as before, then publishes a snapshot
+of it to SNAPSHOT_DIR. Readers never touch a store that is being rebuilt:
+
+    snapshots/
+      snap-<version>.bin   one file per published version, never modified
+      CURRENT              name of the live snapshot (replaced atomically)
+
+A snapshot file is a small JSON header (the manifest: version, model, count,
+dim, fingerprint, sha256 and section offsets) followed by 64-byte aligned
+sections that are memory-mapped as they are:
+
+    vectors       float32 (count, dim), L2-normalized
+    doc_offsets   int64 (count + 1) byte offsets into `docs`
+    doc_present   uint8 (count) 0 = text not stored (STORE_CHUNK_TEXT=False)
+    docs          utf-8 chunk texts, decoded only for returned hits
+    ids           JSON list
+    metadatas     JSON list
+    lex_*         the BM25 index of the same build (rag/lexical.py), postings
+                  re-keyed to the snapshot's rows: terms (JSON), offsets,
+                  docs, tfs, doc_len. Rolling back or hot-swapping a snapshot
+                  therefore switches vectors and lexical index together.
+
+Opening one is a header read, one mmap and two small JSON parses, so a new
+process can serve its first query well under a second. SnapshotStore
+(VECTOR_STORE_BACKEND="snapshot") re-reads CURRENT on every get_store() call
+and, when it changed, opens the new file and swaps its reader in one
+assignment: queries already running finish on the old mapping, the next ones
+see the new version. Older files beyond SNAPSHOT_KEEP are removed on publish
+(a process still mapping one keeps reading it until it switches).
+
+    python -m rag.snapshot publish                 # snapshot the current store
+    python -m rag.snapshot list
+    python -m rag.snapshot use <version>           # roll back / forward
+    python -m rag.snapshot cold-open --backends snapshot,chroma
+"""
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import hashlib
+import argparse
+import threading
+import subprocess
+
+import numpy as np
+
+from rag.config import (
+    BASE_DIR, SNAPSHOT_DIR, SNAPSHOT_KEEP, EMBED_MODEL_ID, SNAPSHOT_BUILD_BACKEND, LEXICAL_INDEX_DIR,
+)
+from rag.lexical import LexicalIndex, read_index
+from rag.vector_store import VectorStore, NumpyStore, _empty_result
+
+MAGIC = b"DISNAP1\n"
+ALIGN = 64
+POINTER = "CURRENT"
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def snapshot_name(version: str) -> str:
+    return f"snap-{version}.bin"
+
+
+def _version_of(name: str) -> str:
+    return name[len("snap-"):-len(".bin")]
+
+
+# -----------------------------
+# File format
+# -----------------------------
+def fingerprint(ids, metas, model: str = EMBED_MODEL_ID, lexical: bool = True) -> str:
+    """Content id of an index: model + ids + metadata (which carries each chunk_hash) + whether BM25 is included."""
+    h = hashlib.sha256(model.encode("utf-8"))
+    if lexical:
+        h.update(b"+bm25")
+    for cid, m in zip(ids, metas):
+        h.update(cid.encode("utf-8"))
+        h.update(json.dumps(m, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def write_snapshot(path: str, ids, vectors, metas, docs, manifest: dict, extra: dict = None) -> dict:
+    """
+    Write one snapshot file (via a temp file + rename); returns its header.
+    `extra` adds named sections (NumPy arrays or bytes), e.g. the lex_* BM25 sections.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors.reshape(len(ids), -1) if len(ids) else np.zeros((0, 0), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = np.ascontiguousarray(vectors / np.maximum(norms, 1e-12), dtype=np.float32)
+
+    encoded = [(d or "").encode("utf-8") for d in docs]
+    doc_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=doc_offsets[1:])
+    payloads = {
+        "vectors": vectors,
+        "doc_offsets": doc_offsets,
+        "doc_present": np.array([d is not None for d in docs], dtype=np.uint8),
+        "docs": b"".join(encoded),
+        "ids": json.dumps(list(ids)).encode("utf-8"),
+        "metadatas": json.dumps(list(metas)).encode("utf-8"),
+        **(extra or {}),
+    }
+
+    sections, offset = {}, 0
+    for name, data in payloads.items():
+        size = data.nbytes if isinstance(data, np.ndarray) else len(data)
+        sections[name] = {"offset": offset, "length": size}
+        if isinstance(data, np.ndarray):
+            sections[name].update(dtype=data.dtype.str, shape=list(data.shape))
+        offset = _align(offset + size)
+
+    digest = hashlib.sha256()
+    for data in payloads.values():
+        digest.update(memoryview(data).cast("B") if isinstance(data, np.ndarray) else data)
+    header = {**manifest, "count": len(ids), "dim": int(vectors.shape[1]) if len(ids) else 0,
+              "sha256": digest.hexdigest(), "sections": sections}
+    head = json.dumps(header).encode("utf-8")
+    data_start = _align(len(MAGIC) + 8 + len(head))
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(head)))
+        f.write(head)
+        f.write(b"\0" * (data_start - f.tell()))
+        for name, data in payloads.items():
+            f.write(memoryview(data).cast("B") if isinstance(data, np.ndarray) else data)
+            f.write(b"\0" * (data_start + _align(sections[name]["offset"] + sections[name]["length"]) - f.tell()))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return header
+
+
+def lexical_sections(ids, lexical_dir: str = LEXICAL_INDEX_DIR):
+    """
+    The BM25 index in `lexical_dir` as lex_* sections for a snapshot of `ids`: postings
+    are re-keyed from the lexical rows to the snapshot rows, and rows the snapshot
+    doesn't have are dropped. Returns ({} , None) if there is no lexical index.
+    """
+    try:
+        lex = read_index(lexical_dir)
+    except (OSError, ValueError):
+        return {}, None
+    pos = {cid: i for i, cid in enumerate(ids)}
+    to_row = np.array([pos.get(cid, -1) for cid in lex["ids"]], dtype=np.int64)
+    offsets = np.asarray(lex["offsets"], dtype=np.int64)
+
+    term_of = np.repeat(np.arange(len(lex["vocab"]), dtype=np.int64), np.diff(offsets))
+    docs = to_row[np.asarray(lex["docs"], dtype=np.int64)] if len(to_row) else np.zeros(0, dtype=np.int64)
+    keep = docs >= 0
+    term_of, docs = term_of[keep], docs[keep]  # still grouped by term
+    new_offsets = np.zeros(len(lex["vocab"]) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_of, minlength=len(lex["vocab"])), out=new_offsets[1:])
+    doc_len = np.zeros(len(ids), dtype=np.int32)
+    known = to_row >= 0
+    doc_len[to_row[known]] = np.asarray(lex["doc_len"])[known]
+
+    sections = {
+        "lex_terms": json.dumps(lex["vocab"]).encode("utf-8"),
+        "lex_offsets": new_offsets,
+        "lex_docs": docs.astype(np.int32),
+        "lex_tfs": np.asarray(lex["tfs"], dtype=np.uint16)[keep],
+        "lex_doc_len": doc_len,
+    }
+    info = {"terms": len(lex["vocab"]), "postings": int(len(docs)),
+            "avgdl": float(doc_len.mean()) if len(doc_len) else 0.0, "dropped_rows": int((~known).sum())}
+    return sections, info
+
+
+def read_header(path: str) -> dict:
+    """Manifest of a snapshot file (plus "data_start", the file offset of the sections)."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an index snapshot")
+        (n,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(n))
+    header["data_start"] = _align(len(MAGIC) + 8 + n)
+    return header
+
+
+def verify(path: str) -> bool:
+    """Recompute the section checksum (reads the whole file)."""
+    header = read_header(path)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for sec in header["sections"].values():
+            f.seek(header["data_start"] + sec["offset"])
+            digest.update(f.read(sec["length"]))
+    return digest.hexdigest() == header["sha256"]
+
+
+class _Texts:
+    """Chunk texts of a snapshot, decoded from the mapped blob on access (None = not stored)."""
+
+    def __init__(self, blob, offsets, present):
+        self._blob = blob
+        self._offsets = offsets
+        self._present = present
+
+    def __len__(self) -> int:
+        return len(self._present)
+
+    def __getitem__(self, i):
+        if not self._present[i]:
+            return None
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class SnapshotReader(NumpyStore):
+    """
+    One opened snapshot file: the NumPy store's exact search over its mapped sections (read-only).
+    Raises ValueError for a snapshot built with another embedding model than EMBED_MODEL_ID,
+    whose vectors can't be compared with this process's query embeddings.
+    """
+
+    def __init__(self, path: str):
+        # not NumpyStore.__init__: there is no directory of .npy files to load
+        self.path = path
+        self.quantization = "none"
+        self.oversample = 1
+        self._staged = None
+        self.manifest = read_header(path)
+        self.version = self.manifest["version"]
+        if self.manifest.get("model") != EMBED_MODEL_ID:
+            raise ValueError(f"snapshot {self.version} was built with {self.manifest.get('model')}, "
+                             f"this process encodes queries with {EMBED_MODEL_ID}")
+
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        start, secs = self.manifest["data_start"], self.manifest["sections"]
+
+        def array(name):
+            sec = secs[name]
+            dtype = np.dtype(sec["dtype"])
+            count = int(np.prod(sec["shape"]))
+            return np.frombuffer(self._mmap, dtype=dtype, count=count, offset=start + sec["offset"]).reshape(sec["shape"])
+
+        def blob(name):
+            sec = secs[name]
+            return self._mmap[start + sec["offset"]:start + sec["offset"] + sec["length"]]
+
+        docs = _Texts(np.frombuffer(self._mmap, dtype=np.uint8, count=secs["docs"]["length"],
+                                    offset=start + secs["docs"]["offset"]),
+                      array("doc_offsets"), array("doc_present"))
+        ids, metas = json.loads(blob("ids")), json.loads(blob("metadatas"))
+        self._data = self._rows(ids, metas, docs, array("vectors"))
+        self._loaded_mtime = os.stat(path).st_mtime_ns
+
+        # BM25 index of the same build (None for snapshots published without one)
+        self.lexical = None
+        if "lex_offsets" in secs:
+            self.lexical = LexicalIndex.from_arrays(
+                json.loads(blob("lex_terms")), ids, metas, array("lex_offsets"), array("lex_docs"),
+                array("lex_tfs"), array("lex_doc_len"), self.manifest["lexical"]["avgdl"],
+            )
+
+    def refresh(self):
+        """Snapshots never change; SnapshotStore switches between them instead."""
+
+    def _read_only(self, *args, **kwargs):
+        raise ValueError("Index snapshots are immutable; run build_index to publish a new one.")
+
+    upsert = delete = reset = flush = rebuild = _read_only
+
+
+# -----------------------------
+# Publishing + retention
+# -----------------------------
+def current_name(root: str = SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(root, POINTER), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def list_snapshots(root: str = SNAPSHOT_DIR):
+    """Snapshot file names, newest first."""
+    if not os.path.isdir(root):
+        return []
+    names = [n for n in os.listdir(root) if n.startswith("snap-") and n.endswith(".bin")]
+    return sorted(names, key=_version_of, reverse=True)
+
+
+def set_current(name: str, root: str = SNAPSHOT_DIR):
+    """Point CURRENT at `name` (atomic rename; readers switch on their next get_store())."""
+    if not os.path.exists(os.path.join(root, name)):
+        raise FileNotFoundError(f"No snapshot {name} in {root}")
+    tmp = os.path.join(root, POINTER + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(root, POINTER))
+
+
+def gc(root: str = SNAPSHOT_DIR, keep: int = SNAPSHOT_KEEP):
+    """Delete all but the `keep` newest snapshots (never the current one). Returns removed names."""
+    current = current_name(root)
+    removed = []
+    for name in list_snapshots(root)[max(1, keep):]:
+        if name != current:
+            os.remove(os.path.join(root, name))
+            removed.append(name)
+    return removed
+
+
+def publish(store, root: str = SNAPSHOT_DIR, keep: int = SNAPSHOT_KEEP, force: bool = False,
+            lexical_dir: str = LEXICAL_INDEX_DIR) -> dict:
+    """
+    Snapshot `store` (any VectorStore) plus the BM25 index in `lexical_dir` and make it
+    current, unless its content fingerprint equals the current snapshot's.
+    Returns {"published", "version", "removed", ...}.
+    """
+    ids, vectors, metas = store.export()
+    lex_sections, lex_info = lexical_sections(ids, lexical_dir)
+    fp = fingerprint(ids, metas, lexical=lex_info is not None)
+    current = current_name(root)
+    if current and not force:
+        try:
+            header = read_header(os.path.join(root, current))
+        except (OSError, ValueError):
+            header = {}
+        if header.get("fingerprint") == fp:
+            return {"published": False, "version": header["version"], "count": header["count"], "removed": []}
+
+    docs = []
+    for i in range(0, len(ids), 1000):
+        docs.extend(store.fetch(ids[i:i + 1000])["documents"][0])
+
+    os.makedirs(root, exist_ok=True)
+    version = f"{time.time_ns():x}"
+    name = snapshot_name(version)
+    header = write_snapshot(os.path.join(root, name), ids, vectors, metas, docs, {
+        "version": version,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model": EMBED_MODEL_ID,
+        "source_backend": store.backend,
+        "fingerprint": fp,
+        "lexical": lex_info,
+    }, extra=lex_sections)
+    set_current(name, root)
+    return {"published": True, "version": version, "count": header["count"],
+            "bytes": os.path.getsize(os.path.join(root, name)), "removed": gc(root, keep)}
+
+
+# -----------------------------
+# Read side (VECTOR_STORE_BACKEND="snapshot")
+# -----------------------------
+class SnapshotStore(VectorStore):
+    """
+    Serves the CURRENT snapshot and hot-swaps to a newly published one on refresh().
+    Methods read self._reader once, since a concurrent refresh() may swap it. A snapshot
+    of another embedding model is refused (the previous one, if any, keeps serving).
+    """
+
+    backend = "snapshot"
+
+    def __init__(self, root: str = SNAPSHOT_DIR):
+        self.root = root
+        self._reader = None
+        self._pointer_mtime = None
+        self._lock = threading.Lock()
+        self.refresh()
+
+    @property
+    def version(self):
+        reader = self._reader
+        return reader.version if reader is not None else None
+
+    @property
+    def lexical(self):
+        """BM25 index of the current snapshot (None if it has none)."""
+        reader = self._reader
+        return reader.lexical if reader is not None else None
+
+    def pin(self):
+        """
+        The current snapshot as a read-only store: vectors, texts and BM25 index of one
+        version, unaffected by later swaps (rag.retrieve uses one per call).
+        """
+        reader = self._reader
+        return reader if reader is not None else self
+
+    def refresh(self):
+        """Switch to the snapshot named by CURRENT if it changed (cheap stat otherwise)."""
+        try:
+            mtime = os.stat(os.path.join(self.root, POINTER)).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._pointer_mtime:
+            return
+        with self._lock:
+            if mtime == self._pointer_mtime:
+                return
+            name = current_name(self.root)
+            reader = self._reader
+            if name and (reader is None or os.path.basename(reader.path) != name):
+                # opened next to the old reader; one assignment swaps them for new queries
+                try:
+                    self._reader = SnapshotReader(os.path.join(self.root, name))
+                except ValueError as e:
+                    print(f"⚠️  Not switching to {name}: {e}", file=sys.stderr)
+            self._pointer_mtime = mtime
+
+    def query(self, query_embeddings, n_results: int = 3, where: dict = None, include_embeddings: bool = False) -> dict:
+        reader = self._reader
+        if reader is None:
+            return _empty_result(len(query_embeddings), include_embeddings)
+        return reader.query(query_embeddings, n_results=n_results, where=where, include_embeddings=include_embeddings)
+
+    def fetch(self, ids, include_embeddings: bool = False) -> dict:
+        reader = self._reader
+        if reader is None:
+            res = _empty_result(1, include_embeddings)
+            del res["distances"]
+            return res
+        return reader.fetch(ids, include_embeddings=include_embeddings)
+
+    def indexed_hashes(self) -> dict:
+        reader = self._reader
+        return reader.indexed_hashes() if reader is not None else {}
+
+    def count(self) -> int:
+        reader = self._reader
+        return reader.count() if reader is not None else 0
+
+    def export(self):
+        reader = self._reader
+        if reader is None:
+            return [], np.zeros((0, 0), dtype=np.float32), []
+        return reader.export()
+
+    def _read_only(self, *args, **kwargs):
+        raise ValueError("The snapshot backend is read-only; build_index writes SNAPSHOT_BUILD_BACKEND and publishes.")
+
+    upsert = delete = reset = _read_only
+
+
+# -----------------------------
+# Cold-open measurement
+# -----------------------------
+_COLD_OPEN = """
+import sys, json, time
+t0 = time.perf_counter()
+import numpy
+from rag import resources
+t1 = time.perf_counter()
+store = resources.get_store(sys.argv[1])
+t2 = time.perf_counter()
+store.query(query_embeddings=[[1.0] * int(sys.argv[2])], n_results=3)
+t3 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1e3, "open_ms": (t2 - t1) * 1e3, "first_query_ms": (t3 - t2) * 1e3}))
+"""
+
+
+def measure_cold_open(backend: str = "snapshot", dim: int = 384, runs: int = 3) -> dict:
+    """
+    Open `backend` + run one query in fresh processes (process-cold; the OS page cache
+    stays warm). Returns the median of each phase in ms.
+    """
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", _COLD_OPEN, backend, str(dim)], cwd=BASE_DIR,
+                             capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {key: round(float(np.median([s[key] for s in samples])), 2) for key in samples[0]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Versioned index snapshots")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_pub = sub.add_parser("publish", help="snapshot the built store and make it current")
+    p_pub.add_argument("--backend", choices=["chroma", "numpy"], default=SNAPSHOT_BUILD_BACKEND)
+    p_pub.add_argument("--force", action="store_true", help="publish even if the content is unchanged")
+    sub.add_parser("list", help="list snapshots (newest first)")
+    p_info = sub.add_parser("info", help="print a snapshot manifest")
+    p_info.add_argument("version", nargs="?", default=None, help="default: current")
+    p_info.add_argument("--verify", action="store_true", help="recompute the checksum")
+    p_use = sub.add_parser("use", help="make an existing snapshot current (rollback)")
+    p_use.add_argument("version")
+    p_gc = sub.add_parser("gc", help="apply the retention policy")
+    p_gc.add_argument("--keep", type=int, default=SNAPSHOT_KEEP)
+    p_cold = sub.add_parser("cold-open", help="time opening a store + first query in a fresh process")
+    p_cold.add_argument("--backends", default="snapshot")
+    p_cold.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        from rag import resources
+
+        info = publish(resources.get_store(args.backend), force=args.force)
+        if info["published"]:
+            resources.bump_index_version()
+            print(f"✅ Published snapshot {info['version']} ({info['count']} chunks, {info['bytes'] / 1e6:.1f} MB), "
+                  f"removed {len(info['removed'])} old")
+        else:
+            print(f"✅ Store unchanged; current snapshot is {info['version']}")
+    elif args.command == "list":
+        current = current_name()
+        for name in list_snapshots():
+            h = read_header(os.path.join(SNAPSHOT_DIR, name))
+            mark = "*" if name == current else " "
+            bm25 = f"{h['lexical']['terms']} terms" if h.get("lexical") else "no BM25"
+            print(f"{mark} {h['version']}  {h['created']}  {h['count']:>7} chunks  {bm25:<12}  {h['model']}")
+    elif args.command == "info":
+        name = snapshot_name(args.version) if args.version else current_name()
+        if not name:
+            raise SystemExit("No current snapshot; run `python -m rag.build_index` first.")
+        path = os.path.join(SNAPSHOT_DIR, name)
+        header = read_header(path)
+        print(json.dumps(header, indent=2))
+        if args.verify:
+            print("✅ checksum ok" if verify(path) else "❌ checksum mismatch")
+    elif args.command == "use":
+        from rag import resources
+
+        model = read_header(os.path.join(SNAPSHOT_DIR, snapshot_name(args.version))).get("model")
+        if model != EMBED_MODEL_ID:
+            raise SystemExit(f"Snapshot {args.version} was built with {model}, not {EMBED_MODEL_ID}.")
+        set_current(snapshot_name(args.version))
+        resources.bump_index_version()  # cached results belong to the previous snapshot
+        print(f"✅ Current snapshot is now {args.version}")
+    elif args.command == "gc":
+        removed = gc(keep=args.keep)
+        print(f"✅ Removed {len(removed)} snapshot(s)")
+    elif args.command == "cold-open":
+        name = current_name()
+        dim = read_header(os.path.join(SNAPSHOT_DIR, name))["dim"] if name else 384
+        for backend in args.backends.split(","):
+            r = measure_cold_open(backend, dim=dim, runs=args.runs)
+            print(f"{backend:<9} import {r['import_ms']:>8} ms   open {r['open_ms']:>8} ms   "
+                  f"first query {r['first_query_ms']:>8} ms")
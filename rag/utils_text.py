@@ -1,9 +1,15 @@
 import re
-from bs4 import BeautifulSoup
+import hashlib
+from rag.config import MAX_CHARS, OVERLAP_CHARS, MIN_CHUNK_CHARS
+
+def content_hash(text: str) -> str:
+    """Stable content hash used for incremental (re)indexing."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 def clean_text(text: str) -> str:
     # remove html if present
     if "<html" in text.lower():
+        from bs4 import BeautifulSoup  # only needed for html sources
         soup = BeautifulSoup(text, "html.parser")
         text = soup.get_text(separator="\n")
 
@@ -13,22 +19,74 @@ def clean_text(text: str) -> str:
 
     return text.strip()
 
-def chunk_text(text, max_chars=1200, overlap=200):
-    paragraphs = text.split("\n\n")
-    chunks = []
-    current = ""
+_PARA_BREAK = re.compile(r"\n\n")
+_WS = re.compile(r"\s")
+
+def _strip_span(text, start, end):
+    """Shrink [start, end) so it does not begin/end with whitespace."""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+def chunk_spans(text, max_chars=MAX_CHARS, overlap=OVERLAP_CHARS, min_chars=MIN_CHUNK_CHARS):
+    """
+    Split text into overlapping chunks and return their (start, end) character offsets.
+
+    - Cuts at the last paragraph break that fits in max_chars, otherwise at the
+      last whitespace (oversized paragraphs are hard-split, never kept whole).
+    - Chunks are not cut shorter than min_chars (before trimming whitespace at
+      the edges); a short trailing fragment is folded into the previous chunk
+      when the result still fits in max_chars, else it is kept as its own chunk.
+    - Consecutive chunks overlap by up to `overlap` chars, starting on a word boundary.
+
+    Every character is visited a bounded number of times, so this is O(len(text)).
+    """
+    n = len(text)
+    min_chars = min(min_chars, max_chars)
+    para_ends = [m.start() for m in _PARA_BREAK.finditer(text)]
 
-    for para in paragraphs:
-        if len(current) + len(para) < max_chars:
-            current += "\n\n" + para
+    spans = []
+    start, _ = _strip_span(text, 0, n)
+    j = 0  # para_ends[:j] are all <= the current limit (only moves forward)
+
+    while start < n:
+        limit = start + max_chars
+        if limit >= n:
+            end = n
         else:
-            chunks.append(current.strip())
-            current = current[-overlap:] + "\n\n" + para
+            while j < len(para_ends) and para_ends[j] <= limit:
+                j += 1
+            end = para_ends[j - 1] if j and para_ends[j - 1] >= start + min_chars else -1
+            if end < 0:
+                # no paragraph break in range: hard split at the last whitespace
+                cut = max(text.rfind(" ", start + min_chars, limit), text.rfind("\n", start + min_chars, limit))
+                end = cut if cut > start else limit
+
+        s, e = _strip_span(text, start, end)
+        if e > s:
+            spans.append((s, e))
+        if end >= n:
+            break
+
+        nxt = end - overlap
+        if nxt <= start:
+            nxt = end
+        else:
+            # begin the overlap on a word boundary
+            m = _WS.search(text, nxt, end)
+            nxt = m.end() if m else end
+        start, _ = _strip_span(text, nxt, n)
+
+    if len(spans) > 1 and spans[-1][1] - spans[-1][0] < min_chars and spans[-1][1] - spans[-2][0] <= max_chars:
+        tail = spans.pop()
+        spans[-1] = (spans[-1][0], tail[1])
 
-    if current:
-        chunks.append(current.strip())
+    return spans
 
-    return chunks
+def chunk_text(text, max_chars=MAX_CHARS, overlap=OVERLAP_CHARS, min_chars=MIN_CHUNK_CHARS):
+    return [text[s:e] for s, e in chunk_spans(text, max_chars, overlap, min_chars)]
 
 def infer_metadata(filename):
     name = filename.lower()
@@ -0,0 +1,567 @@
+"""
+Pluggable vector stores behind one small, collection-like interface.
+
+Both backends accept the same calls the code already makes on a Chroma
+collection (upsert / delete / query with `where`), and `query` returns the
+same nested-list result shape, so build_index, retrieve and the agent tools
+don't care which one is configured (VECTOR_STORE_BACKEND in rag/config.py).
+
+- ChromaStore: thin wrapper around a Chroma collection (SQLite + HNSW, cosine space).
+- NumpyStore:  normalized embeddings in a memory-mapped .npy matrix plus a
+               compact metadata array; exact top-k with argpartition and
+               precomputed row masks for `where` filters. Optionally searches a
+               float16 / int8 copy first and re-scores candidates at full precision.
+
+Both report cosine distance (1 - cosine similarity), so distances and
+thresholds are comparable across backends.
+"""
+import os
+import re
+import json
+import time
+
+import numpy as np
+
+from rag.config import NUMPY_STORE_DIR, NUMPY_STORE_QUANTIZATION, QUANT_OVERSAMPLE
+
+
+def _normalize(mat: np.ndarray) -> np.ndarray:
+    mat = np.asarray(mat, dtype=np.float32)
+    if mat.ndim == 1:
+        mat = mat[None, :]
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+def quantize(vectors: np.ndarray, mode: str):
+    """
+    Compress normalized float32 vectors.
+    Returns (compact, scales): float16 -> (float16 matrix, None);
+    int8 -> (int8 matrix, float32 per-row scale) with v ~= compact * scale.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if mode == "float16":
+        return vectors.astype(np.float16), None
+    if mode == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.zeros(0, dtype=np.float32)
+        scales[scales == 0] = 1.0
+        compact = np.round(vectors / scales[:, None]).astype(np.int8)
+        return compact, scales.astype(np.float32)
+    raise ValueError(f"Unknown quantization mode: {mode!r}")
+
+
+def top_k(scores: np.ndarray, k: int):
+    """Row-wise top-k of a (n_q, N) score matrix, sorted by score. Returns (indices, scores)."""
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+def where_mask(metas, where: dict) -> np.ndarray:
+    """Boolean row mask for a Chroma-style equality filter ({"k": v}, {"k": {"$eq": v}}, {"$and": [...]})."""
+    mask = np.ones(len(metas), dtype=bool)
+    if "$and" in where:
+        for sub in where["$and"]:
+            mask &= where_mask(metas, sub)
+        return mask
+    for field, cond in where.items():
+        value = cond.get("$eq") if isinstance(cond, dict) else cond
+        mask &= np.fromiter(((m or {}).get(field) == value for m in metas), dtype=bool, count=len(metas))
+    return mask
+
+
+def _topic_masks(metas) -> dict:
+    """Precomputed where_mask() for every {"topic": ...} filter (the agent's common case)."""
+    topics = {}
+    for i, m in enumerate(metas):
+        topics.setdefault((m or {}).get("topic"), []).append(i)
+    masks = {}
+    for topic, rows in topics.items():
+        mask = np.zeros(len(metas), dtype=bool)
+        mask[rows] = True
+        masks[json.dumps({"topic": topic})] = mask
+    return masks
+
+
+def _empty_result(n_queries: int, include_embeddings: bool = False) -> dict:
+    res = {
+        "ids": [[] for _ in range(n_queries)],
+        "documents": [[] for _ in range(n_queries)],
+        "metadatas": [[] for _ in range(n_queries)],
+        "distances": [[] for _ in range(n_queries)],
+    }
+    if include_embeddings:
+        res["embeddings"] = [[] for _ in range(n_queries)]
+    return res
+
+
+class VectorStore:
+    """Interface shared by all backends."""
+
+    backend = "base"
+
+    def upsert(self, ids, embeddings, metadatas=None, documents=None):
+        raise NotImplementedError
+
+    def delete(self, ids):
+        raise NotImplementedError
+
+    def query(self, query_embeddings, n_results: int = 3, where: dict = None, include_embeddings: bool = False) -> dict:
+        """
+        Return a Chroma-shaped result: {"ids": [[...]], "documents": [[...]], ...}.
+        With include_embeddings=True it also has "embeddings" (stored vectors of the hits).
+        """
+        raise NotImplementedError
+
+    def fetch(self, ids, include_embeddings: bool = False) -> dict:
+        """
+        Look rows up by id: a one-row query()-shaped result in the order of `ids`
+        (unknown ids are skipped). Used for hits that come from the lexical index.
+        """
+        raise NotImplementedError
+
+    def indexed_hashes(self) -> dict:
+        """Return {id: chunk_hash} for everything stored."""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def export(self):
+        """Return (ids, float32 embeddings matrix, metadatas) for everything stored."""
+        raise NotImplementedError
+
+    def reset(self):
+        """Remove everything from the store."""
+        raise NotImplementedError
+
+    def flush(self):
+        """Persist pending writes (no-op for backends that write through)."""
+
+
+# -----------------------------
+# Chroma backend
+# -----------------------------
+class ChromaStore(VectorStore):
+    backend = "chroma"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def upsert(self, ids, embeddings, metadatas=None, documents=None):
+        kwargs = {"ids": ids, "embeddings": embeddings, "metadatas": metadatas}
+        if documents is not None:
+            kwargs["documents"] = documents
+        self.collection.upsert(**kwargs)
+
+    def delete(self, ids):
+        if ids:
+            self.collection.delete(ids=list(ids))
+
+    def query(self, query_embeddings, n_results: int = 3, where: dict = None, include_embeddings: bool = False) -> dict:
+        kwargs = {}
+        if include_embeddings:
+            kwargs["include"] = ["documents", "metadatas", "distances", "embeddings"]
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where,
+            **kwargs
+        )
+
+    def fetch(self, ids, include_embeddings: bool = False) -> dict:
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        got = self.collection.get(ids=list(ids), include=include) if ids else {"ids": []}
+        pos = {cid: i for i, cid in enumerate(got.get("ids") or [])}
+        res = _empty_result(1, include_embeddings)
+        del res["distances"]
+        for cid in ids:
+            i = pos.get(cid)
+            if i is None:
+                continue
+            res["ids"][0].append(cid)
+            res["documents"][0].append((got.get("documents") or [None] * len(pos))[i])
+            res["metadatas"][0].append((got.get("metadatas") or [{}] * len(pos))[i])
+            if include_embeddings:
+                res["embeddings"][0].append(np.asarray(got["embeddings"][i], dtype=np.float32))
+        return res
+
+    def indexed_hashes(self, page_size: int = 1000) -> dict:
+        # paged so metadata is read in bounded slices
+        out = {}
+        offset = 0
+        while True:
+            got = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            ids = got.get("ids") or []
+            if not ids:
+                break
+            for i, m in zip(ids, got.get("metadatas") or []):
+                out[i] = (m or {}).get("chunk_hash")
+            if len(ids) < page_size:
+                break
+            offset += page_size
+        return out
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def export(self, page_size: int = 1000):
+        ids, embs, metas = [], [], []
+        offset = 0
+        while True:
+            got = self.collection.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+            page_ids = got.get("ids") or []
+            if not page_ids:
+                break
+            ids.extend(page_ids)
+            embs.extend(np.asarray(e, dtype=np.float32) for e in got["embeddings"])
+            metas.extend(m or {} for m in got.get("metadatas") or [{}] * len(page_ids))
+            if len(page_ids) < page_size:
+                break
+            offset += page_size
+        dim = len(embs[0]) if embs else 0
+        return ids, np.array(embs, dtype=np.float32).reshape(len(ids), dim), metas
+
+    def reset(self):
+        ids = list(self.indexed_hashes())
+        for i in range(0, len(ids), 1000):
+            self.collection.delete(ids=ids[i:i + 1000])
+
+
+# -----------------------------
+# NumPy exact-search backend
+# -----------------------------
+_GENERATION_FILE = re.compile(r"^(vectors|vectors_q|scales|rows)(?:-([0-9a-f]+))?\.(npy|jsonl)$")
+
+
+class NumpyStore(VectorStore):
+    """
+    Files under `path` (<gen> = generation of one flush):
+      vectors-<gen>.npy    (N, dim) normalized float32 embeddings, memory-mapped on load
+      vectors_q-<gen>.npy  optional float16 / int8 copy used for the first search pass
+      scales-<gen>.npy     per-row scales for the int8 copy
+      rows-<gen>.jsonl     one {"id", "metadata", "document"} per row, same order as vectors
+      manifest.json        generation / count / dim / quantization, replaced last on flush
+    Writes are staged in memory and only become visible to queries after flush().
+    A flush never overwrites the files the manifest points at, so a reader always
+    loads one generation; the previous one is kept for readers that are mid-load.
+
+    With quantization enabled only the compact copy is held in RAM; the top
+    `k * oversample` candidates are re-scored against the float32 rows read from
+    the memory-mapped file.
+
+    Everything a query reads lives in one dict (`_data`) that is built completely
+    and then swapped in with a single assignment, so a query running while
+    refresh() loads a new version sees either the old rows or the new ones.
+    """
+
+    backend = "numpy"
+
+    def __init__(
+        self,
+        path: str = NUMPY_STORE_DIR,
+        quantization: str = NUMPY_STORE_QUANTIZATION,
+        oversample: int = QUANT_OVERSAMPLE,
+    ):
+        self.path = path
+        self.quantization = quantization or "none"
+        self.oversample = max(1, oversample)
+        self._loaded_mtime = None
+        self._staged = None  # id -> (vector, metadata, document) while writing
+        self._data = self._rows([], [], [], np.zeros((0, 0), dtype=np.float32))
+        self.load()
+
+    # ---- persistence ----
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _gen_file(self, name: str, generation) -> str:
+        """Path of data file `name` ("vectors.npy") for a generation (None = files of older stores)."""
+        if generation is None:
+            return self._file(name)
+        stem, ext = os.path.splitext(name)
+        return self._file(f"{stem}-{generation}{ext}")
+
+    def _manifest_mtime(self):
+        try:
+            return os.stat(self._file("manifest.json")).st_mtime_ns
+        except OSError:
+            return None
+
+    @staticmethod
+    def _rows(ids, metas, docs, vectors, qvectors=None, scales=None) -> dict:
+        """Read-only state of one store version (never mutated after it is swapped in, except the mask cache)."""
+        if len(ids) != len(metas) or len(ids) != len(docs) or len(ids) != vectors.shape[0]:
+            raise ValueError(f"Store rows don't match: {len(ids)} ids, {vectors.shape[0]} vectors")
+        return {
+            "ids": ids,
+            "metas": metas,
+            "docs": docs,
+            "vectors": vectors,
+            "row": {cid: i for i, cid in enumerate(ids)},
+            "masks": _topic_masks(metas),
+            "qvectors": qvectors,  # compact search copy (None = search the float32 rows)
+            "scales": scales,
+        }
+
+    def load(self):
+        """Map the flushed files; raises ValueError if they are not one consistent version."""
+        mtime = self._manifest_mtime()
+        if mtime is None:
+            return
+        with open(self._file("manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        gen = manifest.get("generation")
+        ids, metas, docs = [], [], []
+        with open(self._gen_file("rows.jsonl", gen), "r", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                ids.append(row["id"])
+                metas.append(row.get("metadata") or {})
+                docs.append(row.get("document"))
+        vectors = np.load(self._gen_file("vectors.npy", gen), mmap_mode="r")
+        if manifest.get("count", len(ids)) != len(ids):
+            raise ValueError(f"{self.path}: manifest says {manifest['count']} rows, rows file has {len(ids)}")
+        qvectors, scales = self._load_quantized(manifest, vectors)
+        # built completely first: one assignment switches queries to the new version
+        self._data = self._rows(ids, metas, docs, vectors, qvectors, scales)
+        self._loaded_mtime = mtime
+
+    def _load_quantized(self, manifest: dict, vectors):
+        """(compact copy, scales) of `vectors` for self.quantization, or (None, None)."""
+        if self.quantization == "none":
+            return None, None
+
+        gen = manifest.get("generation")
+        stored_mode = manifest.get("quantization", "none")
+        if stored_mode == self.quantization and os.path.exists(self._gen_file("vectors_q.npy", gen)):
+            qvectors = np.load(self._gen_file("vectors_q.npy", gen))
+            scales = np.load(self._gen_file("scales.npy", gen)) if self.quantization == "int8" else None
+            if len(qvectors) != len(vectors):
+                raise ValueError(f"{self.path}: quantized copy has {len(qvectors)} rows, vectors {len(vectors)}")
+            return qvectors, scales
+        # store was written with another mode: quantize on load
+        return quantize(vectors, self.quantization)
+
+    def memory_bytes(self) -> int:
+        """Bytes held in RAM by the arrays scanned on every query."""
+        data = self._data
+        if data["qvectors"] is not None:
+            return int(data["qvectors"].nbytes + (data["scales"].nbytes if data["scales"] is not None else 0))
+        return int(data["vectors"].nbytes)
+
+    def refresh(self):
+        """Reload if another process flushed a newer version of the store."""
+        if self._staged is None and self._manifest_mtime() != self._loaded_mtime:
+            try:
+                self.load()
+            except (OSError, ValueError):
+                # caught a writer between files: keep serving the loaded version, retry next time
+                pass
+
+    def _atomic_write(self, path: str, write_fn):
+        tmp = path + ".tmp"
+        write_fn(tmp)
+        os.replace(tmp, path)
+
+    def _remove_old_generations(self, keep):
+        """Delete data files of generations not in `keep` (None = the unsuffixed files)."""
+        for name in os.listdir(self.path):
+            m = _GENERATION_FILE.match(name)
+            if m and m.group(2) not in keep:
+                try:
+                    os.remove(self._file(name))
+                except OSError:
+                    pass
+
+    def flush(self):
+        if self._staged is None:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        try:
+            with open(self._file("manifest.json"), "r", encoding="utf-8") as f:
+                previous = json.load(f).get("generation")
+        except (OSError, ValueError):
+            previous = None
+        gen = f"{time.time_ns():x}"
+
+        ids = list(self._staged)
+        metas = [self._staged[cid][1] for cid in ids]
+        docs = [self._staged[cid][2] for cid in ids]
+        dim = len(self._staged[ids[0]][0]) if ids else 0
+        vectors = np.zeros((len(ids), dim), dtype=np.float32)
+        for i, cid in enumerate(ids):
+            vectors[i] = self._staged[cid][0]
+
+        def write_array(arr):
+            def write(tmp):
+                with open(tmp, "wb") as f:
+                    np.save(f, arr)
+            return write
+
+        def write_rows(tmp):
+            with open(tmp, "w", encoding="utf-8") as f:
+                for cid, m, d in zip(ids, metas, docs):
+                    f.write(json.dumps({"id": cid, "metadata": m, "document": d}) + "\n")
+
+        def write_manifest(tmp):
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"generation": gen, "count": len(ids), "dim": dim, "quantization": self.quantization}, f)
+
+        self._atomic_write(self._gen_file("vectors.npy", gen), write_array(vectors))
+        if self.quantization != "none":
+            compact, scales = quantize(vectors, self.quantization)
+            self._atomic_write(self._gen_file("vectors_q.npy", gen), write_array(compact))
+            if scales is not None:
+                self._atomic_write(self._gen_file("scales.npy", gen), write_array(scales))
+        self._atomic_write(self._gen_file("rows.jsonl", gen), write_rows)
+        self._atomic_write(self._file("manifest.json"), write_manifest)  # last: switches readers to `gen`
+        self._remove_old_generations({gen, previous})
+
+        self._staged = None
+        self.load()
+
+    def rebuild(self, quantization: str):
+        """Rewrite the store files with another quantization mode (no re-embedding)."""
+        self._stage()
+        self.quantization = quantization or "none"
+        self.flush()
+
+    # ---- writes ----
+    def _stage(self):
+        if self._staged is None:
+            data = self._data
+            self._staged = {
+                cid: (np.asarray(data["vectors"][i], dtype=np.float32), data["metas"][i], data["docs"][i])
+                for i, cid in enumerate(data["ids"])
+            }
+        return self._staged
+
+    def upsert(self, ids, embeddings, metadatas=None, documents=None):
+        staged = self._stage()
+        vectors = _normalize(embeddings)
+        for i, cid in enumerate(ids):
+            staged[cid] = (
+                vectors[i],
+                (metadatas[i] if metadatas else None) or {},
+                documents[i] if documents else None,
+            )
+
+    def delete(self, ids):
+        staged = self._stage()
+        for cid in ids:
+            staged.pop(cid, None)
+
+    def reset(self):
+        self._staged = {}
+
+    # ---- reads ----
+    def indexed_hashes(self) -> dict:
+        if self._staged is not None:
+            return {cid: (m or {}).get("chunk_hash") for cid, (_, m, _) in self._staged.items()}
+        data = self._data
+        return {cid: (m or {}).get("chunk_hash") for cid, m in zip(data["ids"], data["metas"])}
+
+    def count(self) -> int:
+        return len(self._data["ids"])
+
+    def fetch(self, ids, include_embeddings: bool = False) -> dict:
+        data = self._data  # read once: a concurrent refresh() may swap it
+        res = _empty_result(1, include_embeddings)
+        del res["distances"]
+        for cid in ids:
+            r = data["row"].get(cid)
+            if r is None:
+                continue
+            res["ids"][0].append(cid)
+            res["documents"][0].append(data["docs"][r])
+            res["metadatas"][0].append(data["metas"][r])
+            if include_embeddings:
+                res["embeddings"][0].append(np.asarray(data["vectors"][r], dtype=np.float32))
+        return res
+
+    def export(self):
+        data = self._data
+        return list(data["ids"]), np.asarray(data["vectors"], dtype=np.float32), list(data["metas"])
+
+    @staticmethod
+    def _mask(data: dict, where: dict):
+        """Cached where_mask() for the rows of `data`."""
+        key = json.dumps(where, sort_keys=True)
+        mask = data["masks"].get(key)
+        if mask is not None:
+            return mask
+
+        mask = where_mask(data["metas"], where)
+        data["masks"][key] = mask
+        return mask
+
+    @staticmethod
+    def _approx_scores(data: dict, q: np.ndarray, block: int = 8192) -> np.ndarray:
+        """Scores against the compact copy, upcast block by block to bound temp memory."""
+        qvectors, scales = data["qvectors"], data["scales"]
+        n = qvectors.shape[0]
+        scores = np.empty((len(q), n), dtype=np.float32)
+        for start in range(0, n, block):
+            chunk = qvectors[start:start + block].astype(np.float32)
+            scores[:, start:start + block] = q @ chunk.T
+        if scales is not None:
+            scores *= scales[None, :]
+        return scores
+
+    def _search(self, data: dict, q: np.ndarray, n_results: int, where: dict = None):
+        """Top-k by inner product. Returns (rows, scores) arrays of shape (n_q, k)."""
+        vectors = data["vectors"]
+        if data["qvectors"] is None:
+            scores = q @ np.asarray(vectors, dtype=np.float32).T
+        else:
+            scores = self._approx_scores(data, q)
+
+        n_valid = scores.shape[1]
+        if where:
+            mask = self._mask(data, where)
+            n_valid = int(mask.sum())
+            scores[:, ~mask] = -np.inf
+
+        k = min(n_results, n_valid)
+        if k <= 0:
+            return np.zeros((len(q), 0), dtype=np.int64), np.zeros((len(q), 0), dtype=np.float32)
+
+        if data["qvectors"] is None:
+            return top_k(scores, k)
+
+        # re-score oversampled candidates with the full-precision rows from disk
+        cand, _ = top_k(scores, min(n_valid, k * self.oversample))
+        exact = np.empty(cand.shape, dtype=np.float32)
+        for qi in range(len(q)):
+            rows = np.sort(cand[qi])  # sorted -> sequential reads from the memmap
+            cand[qi] = rows
+            exact[qi] = np.asarray(vectors[rows], dtype=np.float32) @ q[qi]
+
+        idx, top_scores = top_k(exact, k)
+        return np.take_along_axis(cand, idx, axis=1), top_scores
+
+    def query(self, query_embeddings, n_results: int = 3, where: dict = None, include_embeddings: bool = False) -> dict:
+        q = _normalize(query_embeddings)
+        data = self._data  # read once: a concurrent refresh() may swap it
+        if not data["ids"]:
+            return _empty_result(len(q), include_embeddings)
+
+        rows, scores = self._search(data, q, n_results, where)
+
+        res = _empty_result(len(q), include_embeddings)
+        for qi in range(len(q)):
+            if include_embeddings:
+                order = np.argsort(rows[qi])  # sorted -> sequential reads from the memmap
+                vecs = np.empty((len(order), data["vectors"].shape[1]), dtype=np.float32)
+                vecs[order] = data["vectors"][rows[qi][order]]
+                res["embeddings"][qi] = vecs
+            for r, s in zip(rows[qi], scores[qi]):
+                res["ids"][qi].append(data["ids"][r])
+                res["documents"][qi].append(data["docs"][r])
+                res["metadatas"][qi].append(data["metas"][r])
+                # cosine distance, same as the Chroma collection ("hnsw:space": "cosine")
+                res["distances"][qi].append(float(1.0 - s))
+        return res
@@ -0,0 +1,194 @@
+"""
+Warm worker: a local daemon that keeps the embedding model loaded.
+
+CLI invocations (agent runs, retrieve.py, build_index) otherwise pay the
+torch + SentenceTransformer load on every start. With the worker running,
+rag.resources.encode() sends texts over a Unix socket and gets embeddings
+back, so the calling process never imports the model.
+
+    python -m rag.warm_worker start     # foreground; Ctrl+C / SIGTERM to stop
+    python -m rag.warm_worker status
+    python -m rag.warm_worker stop
+
+Wire format: 4-byte big-endian length + JSON body, both directions.
+Embeddings are returned as base64 float32 bytes plus their shape.
+Encode requests carry the caller's EMBED_MODEL_ID; a worker running another
+model (or backend, e.g. torch vs onnx-int8) refuses them, so the caller falls
+back to its own model instead of mixing vectors from two encoders.
+"""
+import os
+import sys
+import json
+import base64
+import signal
+import socket
+import struct
+import argparse
+import threading
+import socketserver
+
+from rag.config import EMBED_MODEL_ID, WARM_WORKER_SOCKET, WARM_WORKER_TIMEOUT_S
+
+# encode() kwargs that are forwarded to the worker (others, e.g. show_progress_bar, are dropped)
+_FORWARDED_KWARGS = ("batch_size", "normalize_embeddings")
+
+
+# -----------------------------
+# Framing
+# -----------------------------
+def _send(sock, obj: dict):
+    body = json.dumps(obj).encode("utf-8")
+    sock.sendall(struct.pack(">I", len(body)) + body)
+
+
+def _recv_exact(sock, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        part = sock.recv(n - len(buf))
+        if not part:
+            raise ConnectionError("connection closed")
+        buf.extend(part)
+    return bytes(buf)
+
+
+def _recv(sock) -> dict:
+    (n,) = struct.unpack(">I", _recv_exact(sock, 4))
+    return json.loads(_recv_exact(sock, n).decode("utf-8"))
+
+
+# -----------------------------
+# Client
+# -----------------------------
+def request(obj: dict, path: str = WARM_WORKER_SOCKET, timeout: float = WARM_WORKER_TIMEOUT_S) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        _send(sock, obj)
+        return _recv(sock)
+
+
+def remote_encode(texts, path: str = WARM_WORKER_SOCKET, model: str = EMBED_MODEL_ID, **kwargs):
+    """
+    Encode via the worker. Returns a float32 array shaped like model.encode()'s output,
+    or None if no worker is reachable or it serves a model other than `model`
+    (caller falls back to a local model).
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+
+    import numpy as np
+
+    single = isinstance(texts, str)
+    payload = {
+        "op": "encode",
+        "model": model,
+        "texts": [texts] if single else list(texts),
+        "kwargs": {k: kwargs[k] for k in _FORWARDED_KWARGS if k in kwargs},
+    }
+    try:
+        resp = request(payload, path=path)
+    except (OSError, ConnectionError, ValueError):
+        return None
+    if not resp.get("ok"):
+        return None
+
+    vectors = np.frombuffer(base64.b64decode(resp["data"]), dtype=np.float32).reshape(resp["shape"])
+    return vectors[0] if single else vectors
+
+
+# -----------------------------
+# Server
+# -----------------------------
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        try:
+            req = _recv(self.request)
+        except (ConnectionError, ValueError, struct.error):
+            return
+
+        op = req.get("op")
+        try:
+            if op == "ping":
+                resp = {"ok": True, "pid": os.getpid(), "model": EMBED_MODEL_ID}
+            elif op == "encode" and req.get("model") != EMBED_MODEL_ID:
+                resp = {"ok": False, "error": f"worker serves {EMBED_MODEL_ID}, not {req.get('model')}"}
+            elif op == "encode":
+                import numpy as np
+                from rag import resources
+
+                vectors = np.asarray(resources.encode(req["texts"], **req.get("kwargs", {})), dtype=np.float32)
+                resp = {
+                    "ok": True,
+                    "shape": list(vectors.shape),
+                    "data": base64.b64encode(vectors.tobytes()).decode("ascii"),
+                }
+            elif op == "shutdown":
+                resp = {"ok": True}
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+            else:
+                resp = {"ok": False, "error": f"unknown op {op!r}"}
+        except Exception as e:
+            resp = {"ok": False, "error": str(e)}
+
+        try:
+            _send(self.request, resp)
+        except OSError:
+            pass
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def is_running(path: str = WARM_WORKER_SOCKET) -> bool:
+    try:
+        return bool(request({"op": "ping"}, path=path, timeout=2.0).get("ok"))
+    except (OSError, ConnectionError, ValueError):
+        return False
+
+
+def serve(path: str = WARM_WORKER_SOCKET):
+    if is_running(path):
+        print(f"Warm worker already running on {path}")
+        return
+    if os.path.exists(path):
+        os.unlink(path)  # stale socket from a crashed worker
+
+    from rag import resources
+
+    print(f"Loading {EMBED_MODEL_ID} ...")
+    resources.warm_up(collection=False)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    server = _Server(path, _Handler)
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+    print(f"✅ Warm worker ready on {path} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+        resources.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep the embedding model loaded for fast CLI starts")
+    parser.add_argument("command", choices=["start", "stop", "status"])
+    parser.add_argument("--socket", default=WARM_WORKER_SOCKET)
+    args = parser.parse_args()
+
+    if args.command == "start":
+        serve(args.socket)
+    elif args.command == "status":
+        running = is_running(args.socket)
+        print("running" if running else "not running")
+        sys.exit(0 if running else 1)
+    else:
+        try:
+            request({"op": "shutdown"}, path=args.socket, timeout=5.0)
+            print("✅ Warm worker stopped")
+        except (OSError, ConnectionError, ValueError):
+            print("Warm worker not running")
@@ -0,0 +1,36 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+from rag import resources
+from rag.encoders import Encoder
+
+
+class HashingEncoder(Encoder):
+    """Deterministic, dependency-free encoder: hashed word counts, L2-normalized."""
+
+    backend = "hashing"
+    dim = 64
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts, batch_size: int = None, normalize_embeddings: bool = True,
+               show_progress_bar: bool = False, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                out[i, int(hashlib.md5(word.strip("?.,").encode()).hexdigest(), 16) % self.dim] += 1.0
+        out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out[0] if single else out
+
+
+@pytest.fixture
+def fake_encoder(monkeypatch):
+    """Serve resources.encode() from HashingEncoder instead of loading the sentence-transformers model."""
+    encoder = HashingEncoder()
+    monkeypatch.setattr(resources, "_model", encoder)
+    return encoder
@@ -0,0 +1,98 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+from agent.answer_cache import AnswerCache, ask, is_cacheable, mentions_data_file
+from agent.fake_llm import ScriptedChatModel
+from agent.graph import build_graph
+
+
+def _bag_of_words(texts):
+    """Deterministic stand-in for the sentence encoder: hashed word counts."""
+    out = np.zeros((len(texts), 64), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for word in text.lower().replace("?", " ").split():
+            out[i, int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1.0
+    return out
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = AnswerCache(path=str(tmp_path / "answers.sqlite3"), threshold=0.9, encode_fn=_bag_of_words)
+    yield c
+    c.close()
+
+
+def test_exact_and_semantic_hits(cache):
+    cache.put("How do I handle missing values?", "Impute or drop.", ["missing_values_handling.txt"])
+    assert cache.lookup("how do I  handle missing values?")["answer"] == "Impute or drop."
+
+    near = cache.lookup("How do I handle missing values")  # same words, no question mark
+    assert near is not None and near["matched_question"] == "How do I handle missing values?"
+    assert cache.lookup("Explain correlation strength") is None
+    assert cache.stats()["hits"] == 2
+
+
+def test_questions_about_data_files_bypass_the_cache(cache):
+    assert mentions_data_file("profile data/a.csv") and mentions_data_file("outliers in ~/x.TSV?")
+    assert not mentions_data_file("How do I profile a dataset?")
+
+    cache.put("profile data/a.csv", "a.csv has 3 columns")
+    assert cache.stats()["entries"] == 0
+    cache.put("profile data", "generic advice")
+    assert cache.lookup("profile data/b.csv") is None  # would otherwise match "profile data"
+
+
+def test_only_kb_only_runs_are_cacheable():
+    base = {"answer": "ok", "sources": []}
+    assert is_cacheable({**base, "tools": []})
+    assert is_cacheable({**base, "tools": ["search_eda_kb", "search_eda_kb_batch"]})
+    assert not is_cacheable({**base, "tools": ["search_eda_kb", "profile_csv"]})
+    assert not is_cacheable({**base, "answer": "(No final answer text produced.)", "tools": []})
+
+
+def test_runs_that_read_a_csv_are_not_stored(cache, tmp_path):
+    csv = tmp_path / "sales.csv"
+    csv.write_text("price,qty\n1,2\n3,4\n", encoding="utf-8")
+    llm = ScriptedChatModel(
+        turns=[{"content": "General advice: look at distributions first."}],
+        scripts=[{"match": r"(?i)my dataset", "turns": [
+            {"tool_calls": [{"name": "profile_csv", "args": {"path": str(csv)}}]},
+            {"content": "Your dataset has columns price and qty."},
+        ]}],
+    )
+    app = build_graph(llm=llm)
+
+    first = ask(app, "Summarize my dataset", cache=cache)
+    assert first["tools"] == ["profile_csv"] and not first["cached"]
+    csv.write_text("price,qty,region\n1,2,n\n", encoding="utf-8")
+    second = ask(app, "Summarize my dataset", cache=cache)
+    assert not second["cached"]  # re-run against the edited file
+    assert cache.stats()["entries"] == 0
+
+    ask(app, "What should I look at first?", cache=cache)
+    assert ask(app, "What should I look at first?", cache=cache)["cached"]
+
+
+def test_processes_with_other_models_share_the_file(tmp_path, monkeypatch):
+    from rag import resources
+
+    monkeypatch.setattr(resources, "index_version", lambda: "18a0")
+    path = str(tmp_path / "shared.sqlite3")
+    llama = AnswerCache(path=path, threshold=0.9, llm_model="llama", encode_fn=_bag_of_words)
+    qwen = AnswerCache(path=path, threshold=0.9, llm_model="qwen", encode_fn=_bag_of_words)
+    try:
+        llama.put("What is skewness?", "llama answer")
+        qwen.put("What is skewness?", "qwen answer")
+        llama.put("What is kurtosis?", "llama answer 2")
+        assert llama.lookup("What is skewness?")["answer"] == "llama answer"
+        assert qwen.lookup("What is skewness?")["answer"] == "qwen answer"
+
+        monkeypatch.setattr(resources, "index_version", lambda: "18b0")  # index rebuilt
+        qwen.put("What is skewness?", "qwen answer, new index")
+        assert qwen.stats()["entries"] == 1  # both models' answers for the old index are gone
+        assert llama.lookup("What is skewness?") is None
+    finally:
+        llama.close()
+        qwen.close()
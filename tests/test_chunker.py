@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from rag.utils_text import chunk_spans, chunk_text
+
+
+def _random_text(rng: random.Random, n_words: int) -> str:
+    parts = []
+    for _ in range(n_words):
+        parts.append("x" * rng.randint(1, 14))
+        parts.append(rng.choice([" ", " ", " ", "\n", "\n\n"]))
+    return "".join(parts).strip()
+
+
+@pytest.mark.parametrize("max_chars,overlap,min_chars", [
+    (120, 20, 40),
+    (120, 10, 60),   # overlap < min_chars: the short-tail fold must still respect max_chars
+    (80, 0, 30),
+    (200, 150, 50),
+    (60, 30, 60),
+])
+def test_spans_respect_max_chars_and_cover_the_text(max_chars, overlap, min_chars):
+    rng = random.Random(max_chars * 1000 + overlap * 10 + min_chars)
+    for _ in range(200):
+        text = _random_text(rng, rng.randint(1, 120))
+        spans = chunk_spans(text, max_chars=max_chars, overlap=overlap, min_chars=min_chars)
+
+        covered = [False] * len(text)
+        for s, e in spans:
+            assert 0 <= s < e <= len(text)
+            assert e - s <= max_chars
+            assert not text[s].isspace() and not text[e - 1].isspace()
+            covered[s:e] = [True] * (e - s)
+        assert all(covered[i] for i, c in enumerate(text) if not c.isspace())
+        assert [s for s, _ in spans] == sorted(s for s, _ in spans)
+
+
+def test_short_tail_is_folded_when_it_fits():
+    text = ("a" * 50 + " ") * 3 + "tail"
+    spans = chunk_spans(text, max_chars=200, overlap=0, min_chars=20)
+    assert spans == [(0, len(text))]
+
+    spans = chunk_spans(text, max_chars=110, overlap=0, min_chars=20)
+    assert text[spans[-1][0]:spans[-1][1]].endswith("tail")
+    assert all(e - s <= 110 for s, e in spans)
+
+
+def test_short_tail_stays_separate_when_folding_would_overflow():
+    # the second chunk ends at the paragraph break; folding "end" into it would exceed max_chars
+    text = "w" * 99 + "\n\n" + "v" * 97 + "\n\nend"
+    spans = chunk_spans(text, max_chars=100, overlap=10, min_chars=50)
+    assert all(e - s <= 100 for s, e in spans)
+    assert text[spans[-1][0]:spans[-1][1]] == "end"
+
+
+def test_offsets_slice_back_to_chunk_text():
+    text = "First paragraph about missing values.\n\nSecond one, on outliers and IQR.\n\n" * 20
+    spans = chunk_spans(text, max_chars=150, overlap=30, min_chars=40)
+    assert chunk_text(text, max_chars=150, overlap=30, min_chars=40) == [text[s:e] for s, e in spans]
+    # paragraph breaks are preferred cut points
+    assert sum(text[:e].endswith(".") for _, e in spans) >= len(spans) - 1
+
+
+def test_blank_text_has_no_chunks():
+    assert chunk_spans("") == []
+    assert chunk_spans(" \n\n  ") == []
@@ -0,0 +1,37 @@
+import os
+
+import numpy as np
+
+from agent.dataset_cache import Dataset, convert_csv, open_dataset
+
+
+def _write_csv(path, header, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(",".join(header) + "\n")
+        for row in rows:
+            f.write(",".join(row) + "\n")
+
+
+def test_late_text_keeps_the_original_spelling(tmp_path):
+    zips = ["02134", " 1e3 ", "", "00501", "7.50"] * 3 + ["A1B 2C3", "02134"]
+    _write_csv(tmp_path / "z.csv", ["zip", "price"], [[z, str(i)] for i, z in enumerate(zips)])
+
+    out = str(tmp_path / "entry")
+    manifest = convert_csv(str(tmp_path / "z.csv"), out, chunk_rows=4)  # the switch happens in chunk 5
+    ds = Dataset(out, manifest)
+    assert ds.kind("zip") == "string" and ds.kind("price") == "float"
+    assert ds.strings("zip").tolist() == [z.strip() for z in zips]
+    assert np.isnan(ds.numbers("zip")[2]) and ds.numbers("zip")[1] == 1000.0
+    assert ds.numbers("price").tolist() == list(range(len(zips)))
+    assert sorted(os.listdir(out)) == sorted([
+        "manifest.json", "c0.codes.npy", "c0.dict.bin", "c0.offs.npy", "c1.npy",
+    ])  # no side files left behind
+
+
+def test_numeric_columns_stay_zero_copy(tmp_path):
+    _write_csv(tmp_path / "n.csv", ["x", "label"], [[str(i / 4), "a" if i % 2 else "b"] for i in range(10)])
+    ds = open_dataset(str(tmp_path / "n.csv"), cache_dir=str(tmp_path / "cache"))
+    assert ds.numeric_columns() == ["x"]
+    assert isinstance(ds.numbers("x"), np.memmap) and ds.numbers("x")[9] == 2.25
+    assert ds.strings("label")[:3].tolist() == ["b", "a", "b"]
+    assert open_dataset(str(tmp_path / "n.csv"), cache_dir=str(tmp_path / "cache")).root == ds.root
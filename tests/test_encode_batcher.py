@@ -0,0 +1,62 @@
+import asyncio
+import gc
+import threading
+
+import pytest
+
+from rag.encode_batcher import EncodeBatcher
+
+from conftest import HashingEncoder
+
+
+def test_concurrent_requests_share_one_batch():
+    encoder = HashingEncoder()
+    calls = []
+    batcher = EncodeBatcher(lambda texts: calls.append(list(texts)) or encoder.encode(texts), window_ms=20)
+
+    async def main():
+        return await asyncio.gather(batcher.encode(["outliers"]), batcher.encode(["missing values", "skew"]))
+
+    first, second = asyncio.run(main())
+    assert calls == [["outliers", "missing values", "skew"]]
+    assert first == encoder.encode(["outliers"]).tolist()
+    assert second == encoder.encode(["missing values", "skew"]).tolist()
+    assert batcher.stats()["mean_batch"] == 3.0
+
+
+def test_in_flight_batches_survive_gc():
+    release = threading.Event()
+
+    def slow_encode(texts):
+        release.wait(5)
+        return [[float(len(t))] for t in texts]
+
+    batcher = EncodeBatcher(slow_encode, window_ms=0)
+
+    async def main():
+        waiter = asyncio.ensure_future(batcher.encode(["abc"]))
+        await asyncio.sleep(0.05)
+        assert len(batcher._tasks) == 1  # the batch task is referenced while it runs
+        gc.collect()
+        release.set()
+        result = await asyncio.wait_for(waiter, 5)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == [[3.0]]
+    assert not batcher._tasks
+
+
+@pytest.mark.parametrize("encode_fn, error", [
+    (lambda texts: (_ for _ in ()).throw(RuntimeError("model crashed")), RuntimeError),
+    (lambda texts: [[0.0]], ValueError),  # one vector for three texts
+])
+def test_every_waiter_gets_the_batch_error(encode_fn, error):
+    batcher = EncodeBatcher(encode_fn, window_ms=10)
+
+    async def main():
+        return await asyncio.gather(batcher.encode(["a"]), batcher.encode(["b", "c"]), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert [type(r) for r in results] == [error, error]
+    assert not batcher._tasks
@@ -0,0 +1,123 @@
+import pytest
+
+from rag import resources, retrieve
+from rag.lexical import LexicalIndex, LexicalIndexBuilder, analyze, rrf_fuse
+from rag.vector_store import NumpyStore
+
+CORPUS = {
+    "missing_0": ("missing_values", "Impute missing values with the median or the mean."),
+    "missing_1": ("missing_values", "Drop rows with missing values only when they are few."),
+    "outlier_0": ("outliers", "IQR outliers lie beyond the quartile fences."),
+    "outlier_1": ("outliers", "Z-score outliers are far from the mean in standard deviations."),
+    "corr_0": ("correlation", "Pearson correlation measures linear strength."),
+    "corr_1": ("correlation", "Spearman rank correlation captures monotonic trends."),
+    "viz_0": ("visualization", "Use a histogram or boxplot to see a distribution."),
+    "viz_1": ("visualization", "Scatter plots show the relation of two columns."),
+}
+# indexed by BM25 but absent from the vector store (e.g. an index from another build)
+GHOSTS = {f"ghost_{i}": ("outliers", "IQR outliers IQR outliers ghostword") for i in range(4)}
+
+
+@pytest.fixture
+def kb(tmp_path, monkeypatch, fake_encoder):
+    store = NumpyStore(path=str(tmp_path / "store"))
+    ids = list(CORPUS)
+    store.upsert(ids, fake_encoder.encode([CORPUS[i][1] for i in ids]),
+                 metadatas=[{"topic": CORPUS[i][0]} for i in ids], documents=[CORPUS[i][1] for i in ids])
+    store.flush()
+
+    builder = LexicalIndexBuilder()
+    for cid, (topic, text) in {**GHOSTS, **CORPUS}.items():
+        builder.add(cid, text, {"topic": topic})
+    builder.save(str(tmp_path / "lexical"))
+    lexical = LexicalIndex(str(tmp_path / "lexical"))
+
+    searches = []
+    real_search = lexical.search
+    monkeypatch.setattr(lexical, "search", lambda *a, **kw: searches.append(a[0]) or real_search(*a, **kw))
+    monkeypatch.setattr(resources, "get_lexical_index", lambda store=None: lexical)
+    monkeypatch.setattr(resources, "index_version", lambda: "test")
+    monkeypatch.setattr(retrieve, "_cache_version", None)
+    retrieve.clear_caches()
+    return store, lexical, searches
+
+
+def test_bm25_router_and_fusion_basics(kb):
+    _, lexical, _ = kb
+    assert analyze("The outliers, IQR!") == ["outlier", "iqr"]
+    assert lexical.route("missing values") == "lexical"
+    assert lexical.route("How do I handle missing values?") == "hybrid"
+    assert lexical.route("unknownterm") == "hybrid"
+
+    top = lexical.search("spearman correlation", 2)
+    assert top[0][0] == "corr_1" and top[0][2] > top[1][2] > 0
+    assert [cid for cid, _, _ in lexical.search("correlation", 5, where={"topic": "outliers"})] == []
+
+    fused = rrf_fuse(["a", "b", "c"], ["c", "a", "d"])
+    assert [cid for cid, _ in fused][:2] == ["a", "c"]
+
+
+def test_lexical_path_skips_ids_missing_from_the_store(kb):
+    store, _, _ = kb
+    hits = retrieve.run_queries(store, [{"query": "IQR outliers", "k": 2, "mode": "lexical"}], use_cache=False)[0]
+    assert [h["id"] for h in hits] == ["outlier_0", "outlier_1"]
+    assert [h["rank"] for h in hits] == [1, 2] and all(h["score"] > 0 for h in hits)
+
+
+def test_lexical_path_falls_back_to_vectors_when_nothing_resolves(kb):
+    store, _, _ = kb
+    timings = {}
+    hits = retrieve.run_queries(store, [{"query": "ghostword", "k": 3, "mode": "lexical"}],
+                                use_cache=False, timings=timings)[0]
+    assert len(hits) == 3 and all("distance" in h for h in hits)
+    assert "encode" in timings
+
+
+def test_hybrid_fills_k_despite_missing_lexical_ids(kb):
+    store, _, _ = kb
+    hits = retrieve.run_queries(store, [{"query": "IQR outliers quartile", "k": 4, "mode": "hybrid"}],
+                                use_cache=False)[0]
+    assert len(hits) == 4
+    assert not any(h["id"].startswith("ghost") for h in hits)
+    assert [h["rank"] for h in hits] == [1, 2, 3, 4]
+
+
+def test_cached_queries_skip_bm25(kb):
+    store, _, searches = kb
+    queries = [{"query": "IQR outliers", "k": 2, "mode": "lexical"},
+               {"query": "How do I handle missing values?", "k": 2, "mode": "hybrid"}]
+    first = retrieve.run_queries(store, queries)
+    assert len(searches) >= 2
+
+    searches.clear()
+    timings = {}
+    second = retrieve.run_queries(store, queries, timings=timings)
+    assert searches == []
+    assert "lexical" not in timings
+    assert [[h["id"] for h in hits] for hits in second] == [[h["id"] for h in hits] for hits in first]
+
+
+def test_budgeted_lexical_hits_are_mmr_ordered(tmp_path, monkeypatch, fake_encoder):
+    docs = {
+        "cap_0": "Winsorize extreme values to cap outliers.",
+        "cap_copy": "Winsorize extreme values to cap outliers.",  # same text from another file
+        "skew_0": "Winsorize skewed columns after a log transform.",
+        "corr_0": "Pearson correlation measures linear strength.",
+    }
+    store = NumpyStore(path=str(tmp_path / "store"))
+    store.upsert(list(docs), fake_encoder.encode(list(docs.values())),
+                 metadatas=[{"topic": "outliers"}] * len(docs), documents=list(docs.values()))
+    store.flush()
+    builder = LexicalIndexBuilder()
+    for cid, text in docs.items():
+        builder.add(cid, text, {"topic": "outliers"})
+    builder.save(str(tmp_path / "lexical"))
+    lexical = LexicalIndex(str(tmp_path / "lexical"))
+    monkeypatch.setattr(resources, "get_lexical_index", lambda store=None: lexical)
+
+    ranked = [cid for cid, _, _ in lexical.search("winsorize", 3)]
+    assert ranked.index("skew_0") == 2  # BM25 alone would spend the budget on both copies
+    budget = len(docs["cap_0"]) + len(docs["skew_0"]) + 1
+    hits = retrieve.run_queries(store, [{"query": "winsorize", "k": 3, "mode": "lexical", "budget": budget}],
+                                use_cache=False)[0]
+    assert sorted(h["id"] for h in hits) in (["cap_0", "skew_0"], ["cap_copy", "skew_0"])
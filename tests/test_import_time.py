@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from agent.check_import_time import DEFAULT_MODULES, ROOT, measure
+from agent.config import IMPORT_BUDGET_S
+
+
+@pytest.fixture(scope="module")
+def probe():
+    """One fresh-interpreter import of the entry points (skipped if their dependencies aren't installed)."""
+    try:
+        return measure(DEFAULT_MODULES)
+    except subprocess.CalledProcessError as e:
+        if "ModuleNotFoundError" in e.stderr:
+            pytest.skip(f"entry points can't be imported here: {e.stderr.strip().splitlines()[-1]}")
+        raise
+
+
+def test_no_heavy_modules_at_import_time(probe):
+    assert probe["loaded"] == []
+
+
+@pytest.mark.skipif(IMPORT_BUDGET_S <= 0, reason="import budget disabled (DATA_INSIGHT_IMPORT_BUDGET_S=0)")
+def test_entry_points_import_within_budget(probe):
+    assert probe["seconds"] <= IMPORT_BUDGET_S, f"import took {probe['seconds']:.3f}s, budget {IMPORT_BUDGET_S}s"
+
+
+def test_script_runs_from_any_directory(tmp_path):
+    out = subprocess.run([sys.executable, os.path.join(ROOT, "agent", "check_import_time.py"),
+                          "--budget", "60", "rag.config"], capture_output=True, text=True, cwd=tmp_path)
+    assert out.returncode == 0, out.stderr
+    assert "within budget" in out.stdout
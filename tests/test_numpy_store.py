@@ -0,0 +1,131 @@
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from rag import resources
+from rag.vector_store import ChromaStore, NumpyStore
+
+DIM = 16
+
+
+def _version_rows(version: int, n: int = DIM):
+    """Row i of `version` points along axis (i + version) % DIM, so a hit's vector identifies its id."""
+    ids = [f"v{version}-{i}" for i in range(n)]
+    vectors = np.zeros((n, DIM), dtype=np.float32)
+    for i in range(n):
+        vectors[i, (i + version) % DIM] = 1.0
+    metas = [{"topic": "t%d" % (i % 3), "row": i, "version": version} for i in range(n)]
+    return ids, vectors, metas, list(ids)
+
+
+def _write(store: NumpyStore, version: int):
+    ids, vectors, metas, docs = _version_rows(version)
+    store.reset()
+    store.upsert(ids, vectors, metadatas=metas, documents=docs)
+    store.flush()
+
+
+def test_query_fetch_and_filters(tmp_path):
+    store = NumpyStore(path=str(tmp_path))
+    _write(store, 0)
+
+    res = store.query([np.eye(DIM)[3]], n_results=2)
+    assert res["ids"][0][0] == "v0-3"
+    assert res["distances"][0][0] == pytest.approx(0.0, abs=1e-6)
+    assert res["distances"][0][1] == pytest.approx(1.0, abs=1e-6)  # orthogonal -> cosine distance 1
+
+    filtered = store.query([np.eye(DIM)[3]], n_results=DIM, where={"topic": "t1"})
+    assert filtered["ids"][0] and all(m["topic"] == "t1" for m in filtered["metadatas"][0])
+
+    got = store.fetch(["v0-5", "missing", "v0-1"], include_embeddings=True)
+    assert got["ids"][0] == ["v0-5", "v0-1"]
+    assert got["documents"][0] == ["v0-5", "v0-1"]
+    assert np.argmax(got["embeddings"][0][0]) == 5
+
+
+def test_load_rejects_rows_that_dont_match_the_vectors(tmp_path):
+    store = NumpyStore(path=str(tmp_path))
+    _write(store, 0)
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    rows_file = tmp_path / f"rows-{manifest['generation']}.jsonl"
+
+    rows = rows_file.read_text(encoding="utf-8").splitlines()
+    rows_file.write_text("\n".join(rows[:-2]) + "\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        NumpyStore(path=str(tmp_path))
+
+    # a reader that already serves a version keeps it instead of mixing files
+    (tmp_path / "manifest.json").write_text(json.dumps(manifest))
+    store.refresh()
+    assert store.count() == DIM
+    assert store.query([np.eye(DIM)[0]], n_results=1)["ids"][0] == ["v0-0"]
+
+
+def test_flush_keeps_the_previous_generation_only(tmp_path):
+    store = NumpyStore(path=str(tmp_path))
+    for version in range(4):
+        _write(store, version)
+    generations = {p.name.split("-", 1)[1].split(".")[0] for p in tmp_path.glob("vectors-*.npy")}
+    assert len(generations) == 2
+    assert json.loads((tmp_path / "manifest.json").read_text())["generation"] in generations
+
+
+def test_queries_during_reload_see_one_consistent_version(tmp_path):
+    reader = NumpyStore(path=str(tmp_path))
+    writer = NumpyStore(path=str(tmp_path))
+    _write(writer, 0)
+    reader.refresh()
+
+    errors = []
+    stop = threading.Event()
+
+    def query_loop():
+        q = np.eye(DIM)[0]
+        while not stop.is_set():
+            try:
+                reader.refresh()
+                res = reader.query([q], n_results=3)
+                for cid, doc, meta, dist in zip(res["ids"][0], res["documents"][0],
+                                                res["metadatas"][0], res["distances"][0]):
+                    assert doc == cid and cid == f"v{meta['version']}-{meta['row']}"
+                top_meta, top_dist = res["metadatas"][0][0], res["distances"][0][0]
+                # the best hit's own vector must be the one matching the query
+                assert (top_meta["row"] + top_meta["version"]) % DIM == 0 and top_dist < 1e-5
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(repr(e))
+                return
+
+    threads = [threading.Thread(target=query_loop) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for version in range(1, 25):
+        _write(writer, version % 5)
+    stop.set()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+
+def test_chroma_and_numpy_report_the_same_distances(tmp_path, monkeypatch):
+    pytest.importorskip("chromadb")
+    monkeypatch.setattr(resources, "CHROMA_DIR", str(tmp_path / "chroma"))
+    monkeypatch.setattr(resources, "_client", None)
+    monkeypatch.setattr(resources, "_collections", {})
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(20, DIM)).astype(np.float32)
+    ids = [f"c{i}" for i in range(20)]
+    chroma = ChromaStore(resources.get_collection("distance_check", create=True))
+    chroma.upsert(ids, vectors.tolist(), metadatas=[{"i": i} for i in range(20)])
+    numpy_store = NumpyStore(path=str(tmp_path / "numpy"))
+    numpy_store.upsert(ids, vectors, metadatas=[{"i": i} for i in range(20)])
+    numpy_store.flush()
+
+    q = rng.normal(size=(1, DIM)).astype(np.float32)
+    a = chroma.query(q.tolist(), n_results=5)
+    b = numpy_store.query(q, n_results=5)
+    assert a["ids"] == b["ids"]
+    np.testing.assert_allclose(a["distances"][0], b["distances"][0], atol=1e-4)
+    monkeypatch.setattr(resources, "_client", None)
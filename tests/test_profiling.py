@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from agent import profiling
+from agent.dataset_cache import open_dataset
+
+
+@pytest.fixture
+def heavy_tailed_csv(tmp_path):
+    rng = np.random.default_rng(7)
+    x = rng.standard_t(3, size=60_000)
+    path = tmp_path / "t.csv"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("x,label\n")
+        for i, v in enumerate(x):
+            f.write(f"{v:.6f},{'' if i % 97 == 0 else 'ab'[i % 2]}\n")
+    parsed = np.round(x, 6)
+    q1, q3 = np.percentile(parsed, [25, 75])
+    reference = int(np.count_nonzero((parsed < q1 - 1.5 * (q3 - q1)) | (parsed > q3 + 1.5 * (q3 - q1))))
+    return path, parsed, reference
+
+
+def test_cached_profile_has_exact_quantiles_and_outliers(heavy_tailed_csv, tmp_path):
+    path, x, reference = heavy_tailed_csv
+    ds = open_dataset(str(path), cache_dir=str(tmp_path / "cache"))
+    col = profiling.profile_dataset(ds, chunk_rows=7_000)["columns"][0]
+
+    assert col["outliers_iqr"] == reference and "outliers_iqr_approx" not in col
+    assert col["quantiles"]["p25"] == pytest.approx(np.percentile(x, 25))
+    assert col["quantiles"]["p99"] == pytest.approx(np.percentile(x, 99))
+    assert col["outlier_pct"] == round(100.0 * reference / len(x), 2)
+
+
+def test_streaming_profile_labels_the_estimate(heavy_tailed_csv):
+    path, _, reference = heavy_tailed_csv
+    summary = profiling.profile_csv(str(path), chunk_rows=7_000, workers=1)
+    col, label = summary["columns"]
+    assert "outliers_iqr" not in col
+    assert abs(col["outliers_iqr_approx"] - reference) <= 0.25 * reference
+    assert label["type"] == "categorical" and label["missing"] == 619
@@ -0,0 +1,137 @@
+import threading
+import time
+
+import pytest
+
+from rag import retrieve, snapshot
+from rag.lexical import LexicalIndexBuilder
+from rag.snapshot import SnapshotStore, list_snapshots, publish, read_header, set_current
+from rag.vector_store import NumpyStore
+
+OLD_BUILD = {
+    "skew_0": ("distribution", "Skewness measures asymmetry of a distribution."),
+    "skew_1": ("distribution", "A log transform reduces right skewness."),
+    "skew_2": ("distribution", "Kurtosis describes heavy tails of a distribution."),
+    "scale_0": ("scaling", "Standardize features before distance based models."),
+}
+NEW_BUILD = {
+    "dup_0": ("duplicates", "Drop duplicate rows after checking the key columns."),
+    "dup_1": ("duplicates", "Near duplicate rows differ only in whitespace."),
+    "type_0": ("dtypes", "Parse date columns and cast numeric strings."),
+}
+
+
+def _publish_build(tmp_path, fake_encoder, name, docs, root):
+    """Write one build (vector store + BM25 index) the way build_index does, then publish it."""
+    store = NumpyStore(path=str(tmp_path / name / "store"))
+    ids = list(docs)
+    texts = [docs[i][1] for i in ids]
+    store.upsert(ids, fake_encoder.encode(texts), metadatas=[{"topic": docs[i][0]} for i in ids], documents=texts)
+    store.flush()
+    builder = LexicalIndexBuilder()
+    for cid, (topic, text) in docs.items():
+        builder.add(cid, text, {"topic": topic})
+    builder.save(str(tmp_path / name / "lexical"))
+    info = publish(store, root=root, keep=5, lexical_dir=str(tmp_path / name / "lexical"))
+    assert info["published"]
+    return info
+
+
+def _lexical(snap, query, k):
+    hits = retrieve.run_queries(snap, [{"query": query, "k": k, "mode": "lexical"}], use_cache=False)[0]
+    return [h["id"] for h in hits]
+
+
+@pytest.fixture
+def two_builds(tmp_path, fake_encoder):
+    root = str(tmp_path / "snapshots")
+    old = _publish_build(tmp_path, fake_encoder, "old", OLD_BUILD, root)
+    time.sleep(0.01)  # distinct CURRENT mtimes, so SnapshotStore.refresh() notices each switch
+    new = _publish_build(tmp_path, fake_encoder, "new", NEW_BUILD, root)
+    return root, old, new
+
+
+def test_snapshot_carries_its_own_bm25_index(two_builds):
+    root, old, new = two_builds
+    names = list_snapshots(root)
+    assert len(names) == 2
+    header = read_header(f"{root}/{names[1]}")
+    assert header["version"] == old["version"] and header["lexical"]["postings"] > 0
+
+    snap = SnapshotStore(root)
+    assert snap.version == new["version"]
+    assert sorted(_lexical(snap, "duplicate rows", 2)) == ["dup_0", "dup_1"]
+    assert _lexical(snap, "skewness", 2) != ["skew_0", "skew_1"]  # no such terms in the new build
+
+
+def test_rollback_switches_vectors_and_lexical_index_together(two_builds):
+    root, old, _ = two_builds
+    snap = SnapshotStore(root)
+
+    time.sleep(0.01)
+    set_current(f"snap-{old['version']}.bin", root)
+    snap.refresh()
+    assert snap.version == old["version"]
+
+    hits = retrieve.run_queries(snap, [{"query": "skewness distribution", "k": 3, "mode": "lexical"}],
+                                use_cache=False)[0]
+    assert len(hits) == 3 and all(h["id"].startswith("skew_") for h in hits)
+    assert all(h["score"] > 0 for h in hits)  # answered by BM25, not the vector fallback
+    fused = retrieve.run_queries(snap, [{"query": "How skewed is the distribution?", "k": 3, "mode": "hybrid"}],
+                                 use_cache=False)[0]
+    assert {h["id"] for h in fused} <= set(OLD_BUILD)
+
+
+def test_queries_during_hot_swaps_see_one_build(two_builds):
+    root, old, new = two_builds
+    snap = SnapshotStore(root)
+    names = [f"snap-{new['version']}.bin", f"snap-{old['version']}.bin"]
+    queries = [{"query": "duplicate rows skewness", "k": 3, "mode": "lexical"},
+               {"query": "How do I fix skewed or duplicate data?", "k": 3, "mode": "hybrid"}]
+    mixed, stop = [], threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            for hits in retrieve.run_queries(snap, queries, use_cache=False):
+                ids = {h["id"] for h in hits}
+                if not hits or not (ids <= set(OLD_BUILD) or ids <= set(NEW_BUILD)):
+                    mixed.append(ids)
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for i in range(20):
+        time.sleep(0.01)
+        set_current(names[i % 2], root)
+        snap.refresh()
+    stop.set()
+    for t in threads:
+        t.join()
+    assert mixed == []
+
+
+def test_unchanged_build_is_not_republished(tmp_path, fake_encoder, two_builds):
+    root, _, new = two_builds
+    store = NumpyStore(path=str(tmp_path / "new" / "store"))
+    again = publish(store, root=root, lexical_dir=str(tmp_path / "new" / "lexical"))
+    assert not again["published"] and again["version"] == new["version"]
+
+    without_bm25 = publish(store, root=root, lexical_dir=str(tmp_path / "missing"))
+    assert without_bm25["published"]  # a different fingerprint: no lex_* sections
+    assert SnapshotStore(root).lexical is None
+
+
+def test_snapshot_of_another_model_is_refused(two_builds, tmp_path, fake_encoder, monkeypatch, capsys):
+    root, _, new = two_builds
+    snap = SnapshotStore(root)
+    with monkeypatch.context() as m:
+        m.setattr(snapshot, "EMBED_MODEL_ID", "other-model@onnx-int8")
+        time.sleep(0.01)
+        other = _publish_build(tmp_path, fake_encoder, "other", OLD_BUILD, root)
+
+    with pytest.raises(ValueError, match="other-model@onnx-int8"):
+        snapshot.SnapshotReader(f"{root}/snap-{other['version']}.bin")
+    snap.refresh()
+    assert snap.version == new["version"]  # keeps serving the last compatible snapshot
+    assert "Not switching" in capsys.readouterr().err
+    assert SnapshotStore(root).count() == 0  # a fresh reader has nothing compatible to serve
@@ -0,0 +1,68 @@
+import asyncio
+
+from agent.fake_llm import ScriptedChatModel
+from agent.graph import build_graph
+from agent.streaming import JsonToolCallSniffer, astream_events, stream_events
+
+PLAN_CALL = '{"name": "create_eda_plan", "arguments": {"goal": "find {braces} and \\"quotes\\""}}'
+
+
+def _feed(sniffer, text, size):
+    shown = "".join(sniffer.feed(text[i:i + size]) for i in range(0, len(text), size))
+    rest, call = sniffer.finish()
+    return shown + rest, call
+
+
+def test_sniffer_holds_back_json_tool_calls_split_anywhere():
+    for size in (1, 3, 7, len(PLAN_CALL)):
+        shown, call = _feed(JsonToolCallSniffer(), "  \n" + PLAN_CALL + "\n", size)
+        assert shown == "" and call["name"] == "create_eda_plan"
+
+
+def test_sniffer_passes_prose_through_without_buffering():
+    sniffer = JsonToolCallSniffer()
+    assert sniffer.feed("  ") == ""  # undecided until the first visible character
+    assert sniffer.feed("Use {x} here") == "  Use {x} here"
+    assert sniffer.feed(" and more") == " and more"
+    assert sniffer.finish() == ("", None)
+
+
+def test_sniffer_releases_json_that_is_not_a_lone_tool_call():
+    text = '{"a": 1} is a dict literal.'
+    assert _feed(JsonToolCallSniffer(), text, 4) == (text, None)
+    assert _feed(JsonToolCallSniffer(), '{"rows": [1, 2]}', 5) == ('{"rows": [1, 2]}', None)
+
+    long_json = '{"name": "x", "arguments": {"pad": "' + "z" * 64
+    sniffer = JsonToolCallSniffer(max_hold=32)
+    assert sniffer.feed(long_json[:20]) == ""
+    assert sniffer.feed(long_json[20:]) == long_json  # over max_hold: shown as text
+
+
+def _plan_app():
+    return build_graph(llm=ScriptedChatModel(scripts=[], turns=[
+        {"json_tool_call": {"name": "create_eda_plan",
+                            "arguments": {"goal": "{question}", "dataset_columns": ["age", "city"]}}},
+        {"content": "Here is your plan: profile age and city first."},
+    ]))
+
+
+def test_stream_events_hides_the_json_call_and_reports_the_tool():
+    events = list(stream_events(_plan_app(), "Plan EDA for my table"))
+    text = "".join(e["text"] for e in events if e["type"] == "token")
+    assert text == "Here is your plan: profile age and city first."
+    assert "create_eda_plan" in [e["name"] for e in events if e["type"] == "tool_start"]
+    assert [e["name"] for e in events if e["type"] == "tool_end"] == ["create_eda_plan"]
+
+    final = events[-1]
+    assert final["type"] == "final" and final["text"] == text
+    assert final["ttft_ms"] is not None and final["ttft_ms"] <= final["total_ms"]
+
+
+def test_async_stream_matches_sync():
+    async def collect():
+        return [e async for e in astream_events(_plan_app(), "Plan EDA for my table")]
+
+    events = asyncio.run(collect())
+    kinds = [e["type"] for e in events]
+    assert kinds.index("tool_end") < kinds.index("token")
+    assert events[-1]["text"] == "Here is your plan: profile age and city first."
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
+from pydantic import BaseModel, Field
+
+from agent.tool_exec import ToolExecutor, memo_key, merge_memo
+
+CALLS = []
+_calls_lock = threading.Lock()
+
+
+class LookupInput(BaseModel):
+    term: str = Field(..., min_length=1)
+    limit: int = 3
+
+
+@tool("lookup", args_schema=LookupInput)
+def lookup(term: str, limit: int = 3) -> str:
+    """Slow lookup used to observe concurrency and memo hits."""
+    with _calls_lock:
+        CALLS.append(term)
+    time.sleep(0.2)
+    if term == "boom":
+        raise RuntimeError("lookup failed")
+    return f"{term}:{limit}"
+
+
+class FileInput(BaseModel):
+    path: str
+
+
+@tool("line_count", args_schema=FileInput)
+def line_count(path: str) -> str:
+    """Count lines of a file."""
+    with open(os.path.abspath(os.path.expanduser(path)), encoding="utf-8") as f:
+        return str(sum(1 for _ in f))
+
+
+@pytest.fixture(autouse=True)
+def _reset_calls():
+    CALLS.clear()
+
+
+def _state(*calls, memo=None):
+    msg = AIMessage(content="", tool_calls=[
+        {"name": name, "args": args, "id": f"c{i}"} for i, (name, args) in enumerate(calls)
+    ])
+    return {"messages": [HumanMessage(content="q"), msg], "tool_memo": memo or {}}
+
+
+def test_memo_key_normalizes_args_and_paths(tmp_path, monkeypatch):
+    assert memo_key(lookup, {"term": "a  b "}) == memo_key(lookup, {"limit": 3, "term": "a b"})
+    assert memo_key(lookup, {"term": ""}) is None  # invalid args: the tool reports the error
+
+    data = tmp_path / "data.csv"
+    data.write_text("x\n1\n", encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("HOME", str(tmp_path))
+    keys = {memo_key(line_count, {"path": p}) for p in ("data.csv", "./data.csv", "~/data.csv", str(data))}
+    assert len(keys) == 1 and None not in keys
+
+    data.write_text("x\n1\n2\n", encoding="utf-8")
+    assert memo_key(line_count, {"path": "data.csv"}) not in keys
+    assert memo_key(line_count, {"path": "missing.csv"}) is None
+
+
+def test_distinct_calls_run_concurrently_and_duplicates_once():
+    ex = ToolExecutor([lookup], max_workers=4)
+    start = time.perf_counter()
+    out = ex.invoke(_state(("lookup", {"term": "a"}), ("lookup", {"term": "b"}),
+                           ("lookup", {"term": " a"}), ("lookup", {"term": "c"})))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.5  # three distinct 0.2 s calls in parallel
+    assert sorted(CALLS) == ["a", "b", "c"]
+    assert [m.tool_call_id for m in out["messages"]] == ["c0", "c1", "c2", "c3"]
+    assert [m.content for m in out["messages"]] == ["a:3", "b:3", "a:3", "c:3"]
+    assert len(out["tool_memo"]) == 3
+
+
+def test_memo_answers_later_turns_but_never_stores_errors():
+    ex = ToolExecutor([lookup], max_workers=2)
+    first = ex.invoke(_state(("lookup", {"term": "a"}), ("lookup", {"term": "boom"})))
+    assert first["messages"][1].status == "error"
+    memo = merge_memo({}, first["tool_memo"])
+    assert len(memo) == 1
+
+    CALLS.clear()
+    second = ex.invoke(_state(("lookup", {"term": "a", "limit": 3}), ("lookup", {"term": "boom"}),
+                              ("nope", {}), memo=memo))
+    assert CALLS == ["boom"]  # the error is retried, "a" comes from the memo
+    assert second["messages"][0].content == "a:3"
+    assert second["messages"][2].status == "error" and "nope is not a valid tool" in second["messages"][2].content
+
+
+def test_async_path_matches_sync():
+    ex = ToolExecutor([lookup], max_workers=3)
+    state = _state(("lookup", {"term": "x"}), ("lookup", {"term": "y"}), ("lookup", {"term": "x"}))
+    start = time.perf_counter()
+    out = asyncio.run(ex.ainvoke(state))
+    assert time.perf_counter() - start < 0.4
+    assert [m.content for m in out["messages"]] == ["x:3", "y:3", "x:3"]
+    assert sorted(CALLS) == ["x", "y"]
+
+
+def test_memo_can_be_disabled():
+    ex = ToolExecutor([lookup], max_workers=1, memo=False)
+    out = ex.invoke(_state(("lookup", {"term": "a"}), ("lookup", {"term": "a"})))
+    assert CALLS == ["a", "a"] and "tool_memo" not in out
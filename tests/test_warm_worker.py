@@ -0,0 +1,46 @@
+import socket
+import threading
+
+import pytest
+
+from rag import resources, warm_worker
+from rag.config import EMBED_MODEL_ID
+
+from conftest import HashingEncoder
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="the warm worker uses Unix sockets")
+
+
+@pytest.fixture
+def other_model_worker(tmp_path, monkeypatch):
+    """A worker that reports another model id (e.g. started with a different EMBED_BACKEND)."""
+    path = str(tmp_path / "w.sock")
+    monkeypatch.setattr(warm_worker, "EMBED_MODEL_ID", "other-model@torch")
+    server = warm_worker._Server(path, warm_worker._Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield path
+    server.shutdown()
+    server.server_close()
+
+
+def test_worker_refuses_encodes_for_another_model(other_model_worker):
+    assert warm_worker.request({"op": "ping"}, path=other_model_worker)["model"] == "other-model@torch"
+    resp = warm_worker.request({"op": "encode", "model": EMBED_MODEL_ID, "texts": ["x"]}, path=other_model_worker)
+    assert not resp["ok"] and "other-model@torch" in resp["error"]
+    assert warm_worker.remote_encode(["x"], path=other_model_worker, model=EMBED_MODEL_ID) is None
+
+
+def test_encode_falls_back_to_the_local_model(other_model_worker, monkeypatch):
+    local = HashingEncoder()
+    loads, replies = [], []
+    real_request = warm_worker.request
+    monkeypatch.setattr(warm_worker, "request", lambda *a, **kw: replies.append(real_request(*a, **kw)) or replies[-1])
+    monkeypatch.setattr(resources, "_model", None)
+    monkeypatch.setattr(resources, "USE_WARM_WORKER", "always")
+    monkeypatch.setattr(resources, "WARM_WORKER_SOCKET", other_model_worker)
+    monkeypatch.setattr(resources, "get_embedder", lambda: loads.append(1) or local)
+
+    vectors = resources.encode(["missing values", "outliers"])
+    assert [r["ok"] for r in replies] == [False] and loads == [1]
+    assert (vectors == local.encode(["missing values", "outliers"])).all()